@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:48:15 2026
+
+@author: ToupinC
+
+Vectorized aggregation of decklists into card and card pair statistics.
+
+The decks of a format are stored as a sparse deck x card matrix X of quantities, in compressed sparse row form. The
+statistics of a pair of cards are entries of the Gram matrix of X: its count (number of decks containing both cards)
+is the entry of B^T.B, where B is X binarized, and its total (sum over those decks of the product of their quantities)
+is the entry of X^T.X. Only the upper triangle is computed, one group of decks of equal size at a time, so the whole
+aggregation is a handful of numpy operations per format. The 'All' format is the sum of every format's statistics.
+
+When the date of every deck is known, the statistics are also aggregated per period (see history.py), one deck matrix
+of the decks of each period at a time, so that formats can be viewed over any window of time.
+"""
+import json
+import uuid
+
+import numpy as np
+
+from graph import Adjacency, CardTable
+from history import History, period_range, period_start
+from metagame import ArrayMetagame, ArrayFormat, CARD_ID_NAMESPACE, DEFAULT_MIN_EDGE_COUNT
+
+ALL_FORMATS = 'All'
+# Number of card pairs sliced out of the decks before they are summed. Bounds the memory used by the pairs of large formats.
+PAIR_CHUNK_SIZE = 2**22
+# Largest number of card pairs summed in dense card x card arrays. Decks of more distinct cards than its square root are
+# aggregated by sorting their pairs instead, which is slower but only holds the distinct pairs in memory.
+DENSE_PAIR_LIMIT = 2**24
+
+# Sums the statistics of repeated card pairs, returning one (source, target, count, total) entry per pair
+def _reduce_pairs(n_cards, source, target, count, total):
+    keys, inverse = np.unique(source.astype(np.int64)*n_cards + target, return_inverse=True)
+    return (keys // n_cards, keys % n_cards,
+            np.bincount(inverse, weights=count, minlength=len(keys)).astype(np.int64),
+            np.bincount(inverse, weights=total, minlength=len(keys)).astype(np.int64))
+
+class DeckMatrix:
+    '''A deck matrix is a sparse deck x card matrix of card quantities in compressed sparse row form: the cards of
+    deck i are indices[indptr[i]:indptr[i+1]], sorted, with their quantities in quantities.'''
+    def __init__(self, n_cards, indptr, indices, quantities):
+        self.n_cards = n_cards
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.quantities = np.asarray(quantities, dtype=np.int64)
+        return
+
+    # Builds a deck matrix from decklists of the form {name: {'qty': quantity, ...}}, given a dict of card name to index
+    @classmethod
+    def from_decks(cls, decks, card_index):
+        lengths = [len(deck) for deck in decks]
+        indices = np.array([card_index[name] for deck in decks for name in deck], dtype=np.int64)
+        quantities = np.array([card['qty'] for deck in decks for card in deck.values()], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        # Sort the cards of every deck by index, so that pairs come out with source < target
+        rows = np.repeat(np.arange(len(decks)), lengths)
+        order = np.lexsort((indices, rows))
+        return cls(len(card_index), indptr, indices[order], quantities[order])
+
+    # Number of decks
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    # Returns a deck matrix of only the decks where deck_mask is True
+    def subset(self, deck_mask):
+        starts = self.indptr[:-1][deck_mask]
+        lengths = np.diff(self.indptr)[deck_mask]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return DeckMatrix(self.n_cards, np.concatenate([[0], np.cumsum(lengths)]), self.indices[positions], self.quantities[positions])
+
+    # Number of decks each card appears in
+    def card_counts(self):
+        return np.bincount(self.indices, minlength=self.n_cards)
+
+    # Number of copies of each card over all decks
+    def card_totals(self):
+        return np.bincount(self.indices, weights=self.quantities, minlength=self.n_cards).astype(np.int64)
+
+    # Yields the source, target and total arrays of the pairs of cards of the decks, a chunk of decks at a time. Decks
+    # with the same number of cards form a dense block whose pairs are all sliced out at once.
+    def _pair_chunks(self):
+        lengths = np.diff(self.indptr)
+        for length in np.unique(lengths[lengths > 1]).tolist():
+            starts = self.indptr[:-1][lengths == length]
+            upper_i, upper_j = np.triu_indices(length, 1)
+            chunk_size = max(PAIR_CHUNK_SIZE // len(upper_i), 1)
+            for k in range(0, len(starts), chunk_size):
+                positions = starts[k:k+chunk_size, None] + np.arange(length)
+                cards, quantities = self.indices[positions], self.quantities[positions]
+                yield cards[:, upper_i].ravel(), cards[:, upper_j].ravel(), (quantities[:, upper_i]*quantities[:, upper_j]).ravel()
+
+    def cooccurrence(self):
+        """Return the source, target, count and total arrays of every pair of cards that appear in a deck together,
+        with source < target. These are the nonzero upper triangle entries of B^T.B and X^T.X."""
+        # The pairs of each chunk are summed as they are sliced out, so that only the distinct pairs and one chunk are
+        # held in memory rather than every pair of every deck
+        cards = np.unique(self.indices)
+        if len(cards)**2 > DENSE_PAIR_LIMIT:
+            return self._sparse_cooccurrence()
+        # Dense card x card accumulators over the cards of the decks, flattened
+        local = np.searchsorted(cards, self.indices)
+        matrix = DeckMatrix(len(cards), self.indptr, local, self.quantities)
+        count = np.zeros(len(cards)**2, dtype=np.int64)
+        total = np.zeros(len(cards)**2)
+        for source, target, pair_total in matrix._pair_chunks():
+            keys = source*len(cards) + target
+            count += np.bincount(keys, minlength=len(count))
+            total += np.bincount(keys, weights=pair_total, minlength=len(total))
+        keys = np.flatnonzero(count)
+        return cards[keys // len(cards)], cards[keys % len(cards)], count[keys], total[keys].astype(np.int64)
+
+    # cooccurrence for decks of too many distinct cards for dense accumulators: the pairs are summed with _reduce_pairs
+    # whenever PAIR_CHUNK_SIZE of them are pending
+    def _sparse_cooccurrence(self):
+        pairs = tuple([np.zeros(0, dtype=np.int64) for _ in range(4)])
+        pending, n_pending = [], 0
+        for chunk in self._pair_chunks():
+            pending.append(chunk)
+            n_pending += len(chunk[0])
+            if n_pending >= PAIR_CHUNK_SIZE:
+                pairs = self._merge_pairs(pairs, pending)
+                pending, n_pending = [], 0
+        return self._merge_pairs(pairs, pending) if pending else pairs
+
+    # Sums pending (source, target, total) pairs, one deck each, into the reduced pairs of the decks before them
+    def _merge_pairs(self, pairs, pending):
+        source, target, total = [np.concatenate([pair_arrays[k] for pair_arrays in pending]) for k in range(3)]
+        return _reduce_pairs(self.n_cards, np.concatenate([pairs[0], source]), np.concatenate([pairs[1], target]),
+                             np.concatenate([pairs[2], np.ones(len(source), dtype=np.int64)]), np.concatenate([pairs[3], total]))
+
+class Cooccurrence:
+    '''The card and card pair statistics of the decks of several formats, as arrays. Cards are indexed in name order,
+    so every pair has its alphabetically first card as source, as in the scraper's JSON output.'''
+    def __init__(self, names, types, formats, card_count, card_total, edges, deck_counts, histories = None):
+        self.names = list(names)
+        self.types = list(types)
+        # Formats in order, ending with 'All', which are the columns of card_count and card_total
+        self.formats = list(formats)
+        self.card_count = card_count
+        self.card_total = card_total
+        # Source, target, count and total arrays of the card pairs of each format
+        self.edges = edges
+        # Number of decks of each format
+        self.deck_counts = deck_counts
+        # History of each format, if the dates of the decks are known
+        self.histories = histories or {}
+        return
+
+    def to_metagame(self, min_count = DEFAULT_MIN_EDGE_COUNT):
+        """Return an ArrayMetagame of these statistics, without edges that appear in fewer than min_count decks"""
+        card_table = CardTable([str(uuid.uuid5(CARD_ID_NAMESPACE, name)) for name in self.names], self.names, self.types,
+                               self.card_count, self.card_total, self.formats)
+        metagame = ArrayMetagame(card_table = card_table)
+        for format_name in self.formats:
+            adjacency = Adjacency(len(card_table), *self.edges[format_name])
+            keep = adjacency.count >= min_count
+            metagame.formats[format_name] = ArrayFormat(metagame, format_name, adjacency.filtered(keep))
+            metagame.formats[format_name].n_decks = self.deck_counts[format_name]
+            if format_name in self.histories:
+                metagame.formats[format_name].history = self.histories[format_name].filtered(keep)
+        return metagame
+
+    def to_json(self, card_json_fp, edge_json_fp):
+        """Write the card and edge JSON files read by Metagame.from_json"""
+        cards = {name: {'count': {format_name: int(self.card_count[i, j]) for j, format_name in enumerate(self.formats) if self.card_count[i, j]},
+                        'total': {format_name: int(self.card_total[i, j]) for j, format_name in enumerate(self.formats) if self.card_count[i, j]},
+                        'card_type': self.types[i]}
+                 for i, name in enumerate(self.names)}
+        edges = {format_name: [{'key': [self.names[source], self.names[target]], 'value': {'count': count, 'total': total}}
+                               for source, target, count, total in zip(*[array.tolist() for array in self.edges[format_name]])]
+                 for format_name in self.formats}
+        with open(card_json_fp, 'w') as card_file:
+            json.dump(cards, card_file)
+        with open(edge_json_fp, 'w') as edge_file:
+            json.dump(edges, edge_file)
+        return
+
+# Per period statistics of a format: the deck counts and copies of each of its edges, with source and target arrays
+# sorted by pair as returned by _reduce_pairs, and of each card, given the period of each deck of its deck matrix
+def _period_statistics(matrix, deck_periods, n_periods, source, target):
+    keys = source*matrix.n_cards + target
+    edge_count = np.zeros((len(keys), n_periods), dtype=np.int64)
+    edge_total = np.zeros((len(keys), n_periods), dtype=np.int64)
+    card_count = np.zeros((matrix.n_cards, n_periods), dtype=np.int64)
+    card_total = np.zeros((matrix.n_cards, n_periods), dtype=np.int64)
+    for period in np.unique(deck_periods[deck_periods >= 0]).tolist():
+        period_matrix = matrix.subset(deck_periods == period)
+        period_source, period_target, count, total = period_matrix.cooccurrence()
+        rows = np.searchsorted(keys, period_source*matrix.n_cards + period_target)
+        edge_count[rows, period] = count
+        edge_total[rows, period] = total
+        card_count[:, period] = period_matrix.card_counts()
+        card_total[:, period] = period_matrix.card_totals()
+    return edge_count, edge_total, card_count, card_total, np.bincount(deck_periods[deck_periods >= 0], minlength=n_periods)
+
+def aggregate_formats(decks_by_format, dates_by_format = None):
+    """Aggregate decklists into card and card pair statistics, adding an 'All' format summing every format
+
+    Parameters
+    ------------
+    decks_by_format: dict{str: list}
+        decklists of each format, each of the form {name: {'qty': quantity, 'type': card type}}
+    dates_by_format: dict{str: list}
+        ISO date of each deck of each format, to also aggregate the statistics per week. Decks without a date are only
+        counted in the totals.
+    """
+    # The type of a card is the type it was listed under in the last deck it appears in
+    card_types = {}
+    for decks in decks_by_format.values():
+        for deck in decks:
+            for name, card in deck.items():
+                card_types[name] = card['type']
+    names = sorted(card_types)
+    card_index = {name: i for i, name in enumerate(names)}
+    formats = [format_name for format_name in decks_by_format if format_name != ALL_FORMATS] + [ALL_FORMATS]
+    card_count = np.zeros((len(names), len(formats)), dtype=np.int64)
+    card_total = np.zeros((len(names), len(formats)), dtype=np.int64)
+    edges = {}
+    deck_counts = {}
+    dates = sorted(set([date for dates in (dates_by_format or {}).values() for date in dates if date]))
+    periods = period_range(dates[0], dates[-1]) if dates else []
+    period_index = {period: i for i, period in enumerate(periods)}
+    period_statistics = {}
+    for j, format_name in enumerate(formats[:-1]):
+        matrix = DeckMatrix.from_decks(decks_by_format[format_name], card_index)
+        card_count[:, j] = matrix.card_counts()
+        card_total[:, j] = matrix.card_totals()
+        edges[format_name] = matrix.cooccurrence()
+        deck_counts[format_name] = len(matrix)
+        if periods:
+            deck_periods = np.array([period_index[period_start(date)] if date else -1 for date in dates_by_format.get(format_name, [None]*len(matrix))],
+                                    dtype=np.int64)
+            period_statistics[format_name] = _period_statistics(matrix, deck_periods, len(periods), *edges[format_name][:2])
+    card_count[:, -1] = card_count[:, :-1].sum(axis=1)
+    card_total[:, -1] = card_total[:, :-1].sum(axis=1)
+    deck_counts[ALL_FORMATS] = sum(deck_counts.values())
+    format_edges = [edges[format_name] for format_name in formats[:-1]]
+    edges[ALL_FORMATS] = _reduce_pairs(len(names), *[np.concatenate([np.zeros(0, dtype=np.int64)] + [edge_arrays[k] for edge_arrays in format_edges])
+                                                     for k in range(4)])
+    histories = {}
+    if periods:
+        # The edges of every format are a subset of the edges of 'All', whose history is the sum of theirs
+        all_keys = edges[ALL_FORMATS][0]*len(names) + edges[ALL_FORMATS][1]
+        all_statistics = [np.zeros((len(all_keys), len(periods)), dtype=np.int64), np.zeros((len(all_keys), len(periods)), dtype=np.int64),
+                          np.zeros((len(names), len(periods)), dtype=np.int64), np.zeros((len(names), len(periods)), dtype=np.int64),
+                          np.zeros(len(periods), dtype=np.int64)]
+        for format_name, statistics in period_statistics.items():
+            histories[format_name] = History.from_periods(periods, *statistics)
+            rows = np.searchsorted(all_keys, edges[format_name][0]*len(names) + edges[format_name][1])
+            all_statistics[0][rows] += statistics[0]
+            all_statistics[1][rows] += statistics[1]
+            for k in range(2, 5):
+                all_statistics[k] += statistics[k]
+        histories[ALL_FORMATS] = History.from_periods(periods, *all_statistics)
+    return Cooccurrence(names, [card_types[name] for name in names], formats, card_count, card_total, edges, deck_counts, histories)
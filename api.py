@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:12:08 2026
+
+@author: ToupinC
+
+Read-only JSON API over a metagame, for tools that query the graph without the Dash app. register_api mounts it on a
+Flask server, such as mavis.app.server, under /api:
+
+    GET /api/formats                                        every format with its statistics
+    GET /api/formats/<format>                               statistics of one format
+    GET /api/formats/<format>/cards?by=<metric>             cards with edges, most important first (see DETAIL_METRICS)
+    GET /api/formats/<format>/cards/<card_id>               a card's counts, degree statistics and centralities
+    GET /api/formats/<format>/cards/<card_id>/neighbourhood cards at most hops edges away, nearest first
+    GET /api/formats/<format>/cards/<card_id>/edges         edges at a card, played in the most decks first
+    GET /api/formats/<format>/cards/<card_id>/related       cards played with a card, strongest pairs first
+    GET /api/formats/<format>/cards/<card_id>/similar       cards played like a card (see similarity.py)
+    GET /api/formats/<format>/edges/<card_id>/<card_id>     the edge between two cards
+    GET /api/cards?q=<text>                                 cards by name search, best match first, or every card
+    GET /api/cards/<card_id>                                a card's counts in every format
+
+Format endpoints take the format over a window of time with start and end (period indices, see history.py) and pruned
+with pruning (see pruning.PRUNING_PRESETS). Lists are paginated with offset and limit, and give the total number of
+items and the URL of the next page.
+
+The metagame must not change once the API is registered: responses are cached by URL, and every response has an ETag
+so clients can revalidate it with If-None-Match and get an empty 304 response when it has not changed. Responses are
+gzipped for clients that accept it.
+"""
+from collections import OrderedDict
+from urllib.parse import urlencode
+import gzip
+import hashlib
+import json
+import threading
+import numpy as np
+from flask import Blueprint, Response, request
+
+from centrality import CENTRALITY_METRICS
+from metagame import DETAIL_METRICS, DEFAULT_MIN_EDGE_COUNT
+from pruning import MEASURES, PRUNING_PRESETS
+from similarity import SIMILARITY_MEASURES, DEFAULT_SIMILARITY_MEASURE, DEFAULT_NEIGHBOURS
+
+API_PREFIX = '/api'
+# Number of items in a page of a list when no limit is given, and the largest limit allowed
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Largest number of hops of a neighbourhood query
+MAX_HOPS = 3
+# Number of responses remembered, by URL
+RESPONSE_CACHE_SIZE = 4096
+# Responses smaller than this many bytes are not worth gzipping
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Clients may reuse a response for this many seconds before revalidating it
+MAX_AGE = 60
+# Edge measure related cards are ranked by when none is given
+DEFAULT_RELATED_MEASURE = 'lift'
+
+class ApiError(Exception):
+    '''An error returned to the client as a JSON object with an error message and the given HTTP status'''
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ResponseCache:
+    '''The most recently requested responses, with their ETags and gzipped bodies, most recently used last.'''
+    def __init__(self, max_size = RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last = False)
+
+class CachedResponse:
+    '''A JSON response body with its ETag. The gzipped body is compressed the first time a client accepts it.'''
+    __slots__ = ('body', 'etag', '_gzipped')
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size = 16).hexdigest()
+        self._gzipped = None
+
+    @property
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, GZIP_LEVEL)
+        return self._gzipped
+
+# JSON value of a number, None for infinite and undefined scores
+def _number(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def _int_arg(name, default, minimum = 0, maximum = None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, "'{}' must be an integer.".format(name))
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ApiError(400, "'{}' must be between {} and {}.".format(name, minimum, maximum if maximum is not None else 'infinity'))
+    return value
+
+def _choice_arg(name, choices, default):
+    value = request.args.get(name, default)
+    if value not in choices:
+        raise ApiError(400, "'{}' must be one of {}.".format(name, ', '.join(choices)))
+    return value
+
+# Slice of a list of items for the offset and limit of the request, with the total number of items and the URL of the
+# next page, or None on the last page. items may be a function of the (start, stop) slice, so that only the items of the
+# page are built.
+def _page(items, total = None):
+    offset = _int_arg('offset', 0)
+    limit = _int_arg('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    total = len(items) if total is None else total
+    page = items(offset, offset + limit) if callable(items) else items[offset:offset + limit]
+    next_url = None
+    if offset + limit < total:
+        next_url = request.path + '?' + urlencode({**request.args.to_dict(), 'offset': offset + limit})
+    return {'total': total, 'offset': offset, 'limit': limit, 'next': next_url, 'items': list(page)}
+
+class MetagameApi:
+    '''Queries of a metagame answered as JSON serializable dicts, for the views of the API'''
+    def __init__(self, metagame):
+        self.metagame = metagame
+
+    def base_format(self, format_name):
+        meta_format = self.metagame.get_format(format_name)
+        if meta_format is None:
+            raise ApiError(404, "Unknown format '{}'.".format(format_name))
+        return meta_format
+
+    # The (first period, last period) window of time of the request in a format's history, or None for all of it
+    def window(self, meta_format):
+        if 'start' not in request.args and 'end' not in request.args:
+            return None
+        if meta_format.history is None:
+            raise ApiError(400, "Format '{}' has no history.".format(meta_format.name))
+        last = len(meta_format.history.periods) - 1
+        start = _int_arg('start', 0, 0, last)
+        return start, _int_arg('end', last, start, last)
+
+    # The format of the given name over the window of time and with the pruning of the request
+    def format_view(self, format_name):
+        meta_format = self.base_format(format_name)
+        window = self.window(meta_format)
+        if window is not None:
+            meta_format = meta_format.windowed(*window, min_count = DEFAULT_MIN_EDGE_COUNT)
+        _, measure, threshold, top_k = PRUNING_PRESETS[_choice_arg('pruning', list(PRUNING_PRESETS), 'none')]
+        return meta_format.pruned(measure, threshold, top_k)
+
+    # First day of every period of a format's history in the window of time of the request
+    def periods(self, format_name):
+        meta_format = self.base_format(format_name)
+        if meta_format.history is None:
+            return []
+        start, end = self.window(meta_format) or (0, len(meta_format.history.periods) - 1)
+        return [str(period) for period in meta_format.history.periods[start:end + 1]]
+
+    def card_index(self, card_id):
+        if card_id not in self.metagame.card_index:
+            raise ApiError(404, "Unknown card '{}'.".format(card_id))
+        return self.metagame.card_index[card_id]
+
+    def card(self, i):
+        card = self.metagame.card_at(i)
+        return {'id': card.id, 'name': card.name, 'type': card.type}
+
+    # Deck count and copies of every card of a format, its number of decks and its edge scores under every measure,
+    # looked up once per request and shared by every item of the response
+    @staticmethod
+    def counts(meta_format):
+        return {'decks': meta_format.card_counts(),
+                'copies': meta_format.card_totals(),
+                'n_decks': meta_format.deck_count() or 1,
+                'scores': {measure: meta_format.edge_scores(measure) for measure in MEASURES}}
+
+    # A card with its deck and copy counts in a format and its share of the format's decks, given the format's counts
+    def format_card(self, counts, i):
+        decks = int(counts['decks'][i])
+        return {**self.card(i),
+                'decks': decks,
+                'copies': int(counts['copies'][i]),
+                'deck_share': decks/counts['n_decks']}
+
+    # An edge of a format's arrays with its counts and its score under every edge measure, given the format's counts
+    def edge(self, meta_format, counts, e):
+        arrays = meta_format.arrays
+        return {'source': self.card(int(arrays.source[e])),
+                'target': self.card(int(arrays.target[e])),
+                'decks': int(arrays.count[e]),
+                'copies': int(arrays.total[e]),
+                'deck_share': int(arrays.count[e])/counts['n_decks'],
+                'scores': {measure: _number(scores[e]) for measure, scores in counts['scores'].items()}}
+
+    def format_stats(self, meta_format, periods):
+        degree = meta_format.arrays.degree()
+        n_cards = int(np.count_nonzero(degree))
+        n_edges = len(meta_format.arrays)
+        return {'name': meta_format.name,
+                'decks': int(meta_format.deck_count()),
+                'cards': n_cards,
+                'edges': n_edges,
+                'density': 2*n_edges/(n_cards*(n_cards - 1)) if n_cards > 1 else 0.0,
+                'mean_degree': float(degree[degree > 0].mean()) if n_cards else 0.0,
+                'archetypes': len(meta_format.archetype_names()),
+                'periods': periods}
+
+    def format_card_stats(self, meta_format, i):
+        card_id = self.metagame.card_ids[i]
+        stats = meta_format.stats_at(card_id)
+        communities = meta_format.communities()
+        return {**self.format_card(self.counts(meta_format), i),
+                'degree': int(stats['degree']),
+                'two_hop_reach': int(stats['two_hop_reach']),
+                'weighted_degree': float(stats['weighted_degree_count']),
+                'clustering': float(stats['clustering']),
+                'archetype': meta_format.archetype_names()[communities[card_id]] if card_id in communities else None,
+                'centrality': {metric: _number(meta_format.centrality(metric)[i]) for metric in CENTRALITY_METRICS}}
+
+    def neighbourhood(self, meta_format, i, hops, min_count):
+        distances, _ = meta_format.arrays.bfs([i], hops, min_count)
+        reached = np.flatnonzero(distances >= 0)
+        counts = self.counts(meta_format)
+        # Nearest first, then most played
+        reached = reached[np.lexsort((reached, -counts['decks'][reached], distances[reached]))]
+        return _page(lambda start, stop: [{**self.format_card(counts, j), 'hops': int(distances[j])} for j in reached[start:stop].tolist()],
+                     len(reached))
+
+    def edges_at(self, meta_format, i):
+        edges = meta_format.arrays.edges_at(i)
+        edges = edges[np.lexsort((edges, -meta_format.arrays.count[edges]))]
+        counts = self.counts(meta_format)
+        return _page(lambda start, stop: [self.edge(meta_format, counts, e) for e in edges[start:stop].tolist()], len(edges))
+
+    def related(self, meta_format, i, measure):
+        arrays = meta_format.arrays
+        edges = arrays.edges_at(i)
+        neighbours = arrays.neighbours(i)
+        keep = neighbours != i
+        edges, neighbours = edges[keep], neighbours[keep]
+        counts = self.counts(meta_format)
+        scores = np.nan_to_num(counts['scores'][measure][edges], nan = -np.inf)
+        order = np.lexsort((neighbours, -scores))
+        return _page(lambda start, stop: [{**self.format_card(counts, int(neighbours[k])), 'score': _number(scores[k]),
+                                           'decks_together': int(arrays.count[edges[k]])} for k in order[start:stop].tolist()],
+                     len(order))
+
+    def similar(self, meta_format, i, measure):
+        cards, scores = meta_format.similarity_index(measure).similar(i, DEFAULT_NEIGHBOURS)
+        counts = self.counts(meta_format)
+        return _page(lambda start, stop: [{**self.format_card(counts, j), 'similarity': score}
+                                          for j, score in zip(cards[start:stop].tolist(), scores[start:stop].tolist())],
+                     len(cards))
+
+def register_api(server, metagame, prefix = API_PREFIX):
+    """Mount the JSON API over a metagame on a Flask server and return its blueprint
+
+    Parameters
+    ------------
+    server: flask.Flask
+        server to mount the API on, such as the server of a Dash app
+    metagame: metagame.Metagame
+        metagame to query, which must not change afterwards
+    prefix: str
+        URL prefix of every endpoint
+    """
+    api = MetagameApi(metagame)
+    cache = ResponseCache()
+    blueprint = Blueprint('api', __name__, url_prefix = prefix)
+
+    # Serves the JSON of a view, computed once per URL, as a 304 response when the client already has it and gzipped
+    # when the client accepts it
+    def json_view(view):
+        def wrapper(**kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi = True))))
+            entry = cache.get(key)
+            if entry is None:
+                entry = CachedResponse(json.dumps(view(**kwargs), separators = (',', ':')).encode('utf-8'))
+                cache.set(key, entry)
+            headers = {'Cache-Control': 'public, max-age={}'.format(MAX_AGE), 'Vary': 'Accept-Encoding'}
+            if request.if_none_match.contains_weak(entry.etag):
+                response = Response(status = 304, headers = headers)
+            elif len(entry.body) >= GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+                response = Response(entry.gzipped, mimetype = 'application/json', headers = {**headers, 'Content-Encoding': 'gzip'})
+            else:
+                response = Response(entry.body, mimetype = 'application/json', headers = headers)
+            response.set_etag(entry.etag, weak = True)
+            return response
+        wrapper.__name__ = view.__name__
+        return wrapper
+
+    @blueprint.errorhandler(ApiError)
+    def api_error(error):
+        return Response(json.dumps({'error': error.message}), status = error.status, mimetype = 'application/json')
+
+    @blueprint.route('/formats')
+    @json_view
+    def formats():
+        return {'formats': [api.format_stats(api.format_view(format_name), api.periods(format_name)) for format_name in metagame.formats]}
+
+    @blueprint.route('/formats/<format_name>')
+    @json_view
+    def format_stats(format_name):
+        return api.format_stats(api.format_view(format_name), api.periods(format_name))
+
+    @blueprint.route('/formats/<format_name>/cards')
+    @json_view
+    def format_cards(format_name):
+        meta_format = api.format_view(format_name)
+        order = meta_format.detail_order(_choice_arg('by', list(DETAIL_METRICS), 'deck_count'))
+        counts = api.counts(meta_format)
+        return _page(lambda start, stop: [api.format_card(counts, i) for i in order[start:stop].tolist()], len(order))
+
+    @blueprint.route('/formats/<format_name>/cards/<card_id>')
+    @json_view
+    def format_card(format_name, card_id):
+        return api.format_card_stats(api.format_view(format_name), api.card_index(card_id))
+
+    @blueprint.route('/formats/<format_name>/cards/<card_id>/neighbourhood')
+    @json_view
+    def neighbourhood(format_name, card_id):
+        meta_format = api.format_view(format_name)
+        return api.neighbourhood(meta_format, api.card_index(card_id), _int_arg('hops', 1, 1, MAX_HOPS), _int_arg('min_count', None, 1))
+
+    @blueprint.route('/formats/<format_name>/cards/<card_id>/edges')
+    @json_view
+    def card_edges(format_name, card_id):
+        return api.edges_at(api.format_view(format_name), api.card_index(card_id))
+
+    @blueprint.route('/formats/<format_name>/cards/<card_id>/related')
+    @json_view
+    def related(format_name, card_id):
+        meta_format = api.format_view(format_name)
+        return api.related(meta_format, api.card_index(card_id), _choice_arg('measure', list(MEASURES), DEFAULT_RELATED_MEASURE))
+
+    @blueprint.route('/formats/<format_name>/cards/<card_id>/similar')
+    @json_view
+    def similar(format_name, card_id):
+        meta_format = api.format_view(format_name)
+        return api.similar(meta_format, api.card_index(card_id), _choice_arg('measure', list(SIMILARITY_MEASURES), DEFAULT_SIMILARITY_MEASURE))
+
+    @blueprint.route('/formats/<format_name>/edges/<card_a>/<card_b>')
+    @json_view
+    def edge(format_name, card_a, card_b):
+        meta_format = api.format_view(format_name)
+        e = meta_format.arrays.edge_between(api.card_index(card_a), api.card_index(card_b))
+        if e < 0:
+            raise ApiError(404, "No edge between '{}' and '{}' in format '{}'.".format(card_a, card_b, format_name))
+        return api.edge(meta_format, api.counts(meta_format), e)
+
+    @blueprint.route('/cards')
+    @json_view
+    def cards():
+        query = request.args.get('q')
+        if query:
+            indices = [metagame.card_index[card_id] for card_id in metagame.search(query, MAX_PAGE_SIZE)]
+            return _page(lambda start, stop: [api.card(i) for i in indices[start:stop]], len(indices))
+        return _page(lambda start, stop: [api.card(i) for i in range(start, min(stop, len(metagame.card_ids)))], len(metagame.card_ids))
+
+    @blueprint.route('/cards/<card_id>')
+    @json_view
+    def card(card_id):
+        card = metagame.card_at(api.card_index(card_id))
+        return {**api.card(api.card_index(card_id)), 'decks': card.count, 'copies': card.total}
+
+    server.register_blueprint(blueprint)
+    return blueprint
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:31 2026
+
+@author: ToupinC
+
+Startup benchmark for format construction. Builds synthetic metagames that grow either by the number of
+formats or by the number of weeks of data (more decks, hence more edges per format) and times how long it
+takes to construct every Format. Run with `python benchmark_startup.py`; the time per edge should stay flat
+as the metagame grows if format construction is linear.
+"""
+import random
+import time
+
+from graph import Card, Edge
+from metagame import Metagame
+
+BASE_CARDS = 1000
+# Roughly the number of edges with count > 5 observed per format in a two week window
+EDGES_PER_WEEK = 300
+
+def synthetic_metagame(n_formats, n_weeks, seed = 0):
+    rng = random.Random(seed)
+    format_names = ['Format {}'.format(i) for i in range(n_formats)]
+    cards = [Card('Card {}'.format(i), 'Creature',
+                  {name: 1 for name in format_names},
+                  {name: 4 for name in format_names}) for i in range(BASE_CARDS)]
+    metagame = Metagame(*cards)
+    format_edges = {}
+    for name in format_names:
+        edges = []
+        for _ in range(EDGES_PER_WEEK*n_weeks):
+            source, target = rng.sample(cards, 2)
+            edges.append(Edge(source, target, rng.randint(6, 100), rng.randint(6, 400)))
+        format_edges[name] = edges
+    return metagame, format_edges
+
+def time_format_construction(n_formats, n_weeks, repeats = 3):
+    metagame, format_edges = synthetic_metagame(n_formats, n_weeks)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for name, edges in format_edges.items():
+            metagame.new_format(name, *edges)
+        best = min(best, time.perf_counter() - start)
+    n_edges = sum([len(edges) for edges in format_edges.values()])
+    return n_edges, best
+
+def run(scales = (1, 2, 4, 8)):
+    print('{:>8} {:>8} {:>10} {:>12} {:>14}'.format('formats', 'weeks', 'edges', 'seconds', 'us per edge'))
+    for n_formats, n_weeks in [(scale, 1) for scale in scales] + [(1, scale) for scale in scales[1:]]:
+        n_edges, seconds = time_format_construction(n_formats, n_weeks)
+        print('{:>8} {:>8} {:>10} {:>12.4f} {:>14.2f}'.format(n_formats, n_weeks, n_edges, seconds, 1e6*seconds/n_edges))
+
+if __name__ == '__main__':
+    run()
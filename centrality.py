@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:34:51 2026
+
+@author: ToupinC
+
+Centrality metrics of the cards of a format, computed for every card at once on the compressed sparse row arrays of an
+Adjacency. Products of a matrix of card values with the adjacency matrix are sums over each card's row of neighbours,
+so every metric is a few numpy operations per iteration whatever the number of cards:
+
+    pagerank        stationary probability of a random walk that follows edges in proportion to their deck count,
+                    jumping to a random card with probability 1 - damping at every step
+    eigenvector     principal eigenvector of the adjacency matrix weighted by deck count, found by power iteration
+    betweenness     number of shortest paths between other cards that go through the card, estimated from the shortest
+                    paths of a sample of source cards on large formats
+    core_number     largest k such that the card is in a subgraph where every card has at least k neighbours
+
+Loops are ignored by every metric.
+"""
+import numpy as np
+
+CENTRALITY_METRICS = {'pagerank': 'PageRank',
+                      'eigenvector': 'Eigenvector Centrality',
+                      'betweenness': 'Betweenness',
+                      'core_number': 'Core Number'}
+# Probability of following an edge at each step of the PageRank random walk
+DAMPING = 0.85
+# Power iterations stop once the values change by less than this in total, or after MAX_ITERATIONS iterations
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 1000
+# Betweenness is computed from the shortest paths of every card of formats with at most this many cards, and from a
+# sample of this many source cards otherwise
+BETWEENNESS_SAMPLES = 256
+BETWEENNESS_SEED = 0
+# Number of source cards whose shortest paths are followed at once
+BATCH_SIZE = 64
+
+# Products of a matrix with one row of values per card by the adjacency matrix with the given weight of every entry of
+# the adjacency's rows
+def _spmm(adjacency, values, weights):
+    degree = adjacency.degree()
+    result = np.zeros(values.shape)
+    if len(adjacency.indices):
+        result[..., degree > 0] = np.add.reduceat(values[..., adjacency.indices]*weights, adjacency.indptr[:-1][degree > 0], axis=-1)
+    return result
+
+# Sums, for every (row, card) pair given with a value, the value times the weight of each of the card's edges into the
+# card's neighbour in that row of a rows x cards result. Only the given cards' edges are visited, so this is much faster
+# than _spmm when few cards have values.
+def _propagate(adjacency, rows, cards, values, weights, n_rows):
+    counts = adjacency.degree()[cards]
+    entries = np.repeat(adjacency.indptr[cards] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    keys = np.repeat(rows, counts)*adjacency.n_cards + adjacency.indices[entries]
+    return np.bincount(keys, weights=np.repeat(values, counts)*weights[entries],
+                       minlength=n_rows*adjacency.n_cards).reshape(n_rows, adjacency.n_cards)
+
+# Weight of every entry of the adjacency's rows, 0 for loops
+def _row_weights(adjacency, weights):
+    rows = np.repeat(np.arange(adjacency.n_cards), adjacency.degree())
+    return np.where(rows != adjacency.indices, np.asarray(weights, dtype=float)[adjacency.edge_index], 0)
+
+def pagerank(adjacency, damping = DAMPING):
+    """Return the weighted PageRank of every card of an adjacency, 0 for cards without edges"""
+    weights = _row_weights(adjacency, adjacency.count)
+    strength = _spmm(adjacency, np.ones(adjacency.n_cards), weights)
+    active = strength > 0
+    n = active.sum()
+    rank = np.where(active, 1/max(n, 1), 0)
+    # The walk leaves every card in proportion to the weights of its edges, so a card's rank is shared by its edges
+    # relative to its strength. Every card has edges, so no rank leaks out of the walk.
+    for _ in range(MAX_ITERATIONS):
+        new_rank = np.where(active, (1 - damping)/max(n, 1) + damping*_spmm(adjacency, np.divide(rank, strength, out=np.zeros(len(rank)), where=active), weights), 0)
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if change < TOLERANCE:
+            break
+    return rank
+
+def eigenvector_centrality(adjacency):
+    """Return the eigenvector centrality of every card of an adjacency, weighted by deck count and scaled to a maximum
+    of 1. Cards without edges have 0."""
+    weights = _row_weights(adjacency, adjacency.count)
+    centrality = (adjacency.degree() > 0).astype(float)
+    if not centrality.any():
+        return centrality
+    for _ in range(MAX_ITERATIONS):
+        # Adding the current values keeps the iteration from oscillating on bipartite parts of the graph
+        new_centrality = centrality + _spmm(adjacency, centrality, weights)
+        new_centrality /= np.abs(new_centrality).max() or 1
+        change = np.abs(new_centrality - centrality).sum()
+        centrality = new_centrality
+        if change < TOLERANCE:
+            break
+    return centrality
+
+def betweenness(adjacency, samples = BETWEENNESS_SAMPLES, seed = BETWEENNESS_SEED):
+    """Return the betweenness of every card of an adjacency, counting every edge as one step. On adjacencies with more
+    than samples cards with edges, it is estimated from the shortest paths of a random sample of that many cards.
+
+    Shortest paths are counted by Brandes' algorithm, for a batch of source cards at a time: a breadth first search from
+    every source counts the shortest paths to every card level by level, and the dependency of every source on every
+    card is then accumulated from the farthest level back. Every card is on one level per source, so each batch visits
+    every edge twice per source."""
+    weights = _row_weights(adjacency, np.ones(len(adjacency)))
+    cards = np.flatnonzero(adjacency.degree())
+    sources = cards
+    if len(cards) > samples:
+        sources = np.sort(np.random.default_rng(seed).choice(cards, samples, replace=False))
+    centrality = np.zeros(adjacency.n_cards)
+    for start in range(0, len(sources), BATCH_SIZE):
+        batch = sources[start:start + BATCH_SIZE]
+        rows = np.arange(len(batch))
+        # Number of shortest paths from each source to each card, and the cards at each distance from each source
+        paths = np.zeros((len(batch), adjacency.n_cards))
+        paths[rows, batch] = 1
+        reached = paths > 0
+        levels = [(rows, batch)]
+        while True:
+            level_rows, level_cards = levels[-1]
+            incoming = _propagate(adjacency, level_rows, level_cards, paths[level_rows, level_cards], weights, len(batch))
+            level = (incoming > 0) & ~reached
+            if not level.any():
+                break
+            paths[level] = incoming[level]
+            reached |= level
+            levels.append(np.nonzero(level))
+        dependency = np.zeros(paths.shape)
+        for (level_rows, level_cards), (previous_rows, previous_cards) in zip(levels[:0:-1], levels[-2::-1]):
+            share = _propagate(adjacency, level_rows, level_cards,
+                               (1 + dependency[level_rows, level_cards])/paths[level_rows, level_cards], weights, len(batch))
+            dependency[previous_rows, previous_cards] += paths[previous_rows, previous_cards]*share[previous_rows, previous_cards]
+        dependency[rows, batch] = 0
+        centrality += dependency.sum(axis=0)
+    # Every path is counted from both of its ends
+    return centrality/2*(len(cards)/len(sources) if len(sources) else 0)
+
+def core_number(adjacency):
+    """Return the core number of every card of an adjacency, 0 for cards without edges"""
+    weights = _row_weights(adjacency, np.ones(len(adjacency)))
+    degree = _spmm(adjacency, np.ones(adjacency.n_cards), weights)
+    core = np.zeros(adjacency.n_cards, dtype=np.int64)
+    remaining = degree > 0
+    k = 0
+    while remaining.any():
+        k = max(k, int(degree[remaining].min()))
+        # Peel every card left with at most k neighbours until none is, as peeling lowers the degree of its neighbours
+        while True:
+            peeled = remaining & (degree <= k)
+            if not peeled.any():
+                break
+            core[peeled] = k
+            remaining &= ~peeled
+            peeled_cards = np.flatnonzero(peeled)
+            degree -= _propagate(adjacency, np.zeros(len(peeled_cards), dtype=np.int64), peeled_cards,
+                                 np.ones(len(peeled_cards)), weights, 1)[0]
+    return core
+
+def centrality(adjacency, metric):
+    """Return the given metric (see CENTRALITY_METRICS) of every card of an adjacency"""
+    if metric == 'pagerank':
+        return pagerank(adjacency)
+    if metric == 'eigenvector':
+        return eigenvector_centrality(adjacency)
+    if metric == 'betweenness':
+        return betweenness(adjacency)
+    if metric == 'core_number':
+        return core_number(adjacency)
+    raise ValueError("Unknown centrality metric '{}'.".format(metric))
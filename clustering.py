@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:12:27 2026
+
+@author: ToupinC
+
+Community detection on weighted card graphs, used to group the cards of a format into archetypes. Communities are
+found with the Louvain method, which greedily maximises the modularity
+
+    Q = 1/2m sum_ij (W_ij - resolution*k_i*k_j/2m) [c_i = c_j]
+
+where W is the weighted adjacency matrix, k_i the weighted degree of card i and 2m the sum of all weights. Each level
+moves every node to the neighbouring community with the best modularity gain until no move improves it, then merges
+every community into a single node and starts over on the merged graph, until a level moves nothing.
+
+Graphs are dense weight matrices, as for the node statistics, so each move only takes a couple of numpy operations.
+"""
+import numpy as np
+
+# Seed of the order nodes are visited in
+CLUSTERING_SEED = 0
+# Moves must improve the modularity by more than this to be made, so rounding errors cannot make nodes cycle
+MIN_GAIN = 1e-12
+
+# One level of the Louvain method: moves nodes between communities until no move improves the modularity. Returns
+# each node's community and whether any node moved.
+def _local_moves(weights, resolution, rng):
+    n = len(weights)
+    degree = weights.sum(axis=1)
+    total = degree.sum()
+    community = np.arange(n)
+    community_degree = degree.copy()
+    moved = False
+    improved = True
+    while improved:
+        improved = False
+        for i in rng.permutation(n).tolist():
+            current = community[i]
+            # Weight of the links from node i to every community, not counting its own loop
+            links = np.bincount(community, weights=weights[i], minlength=n)
+            links[current] -= weights[i, i]
+            community_degree[current] -= degree[i]
+            gain = links - resolution*community_degree*degree[i]/total
+            best = int(np.argmax(gain))
+            if gain[best] <= gain[current] + MIN_GAIN:
+                best = current
+            community_degree[best] += degree[i]
+            if best != current:
+                community[i] = best
+                improved = moved = True
+    return community, moved
+
+def louvain(weights, resolution = 1.0, seed = CLUSTERING_SEED):
+    """Return the community of every node of a weighted graph, numbered from 0 by decreasing size
+
+    Parameters
+    ------------
+    weights: numpy.ndarray
+        symmetric matrix of the weight of the edge between every pair of nodes
+    resolution: float
+        higher resolutions give more, smaller communities
+    seed: int
+        seed of the order nodes are visited in, so the same graph always gets the same communities
+    """
+    weights = np.asarray(weights, dtype=float)
+    n = len(weights)
+    if n == 0 or weights.sum() <= 0:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    # The community of every original node, and the merged graph whose nodes are the current communities
+    labels = np.arange(n)
+    while True:
+        community, moved = _local_moves(weights, resolution, rng)
+        if not moved:
+            break
+        _, community = np.unique(community, return_inverse=True)
+        labels = community[labels]
+        # Merge every community into one node, whose loop holds the weight inside the community
+        members = np.zeros((len(weights), community.max() + 1))
+        members[np.arange(len(weights)), community] = 1
+        weights = members.T @ weights @ members
+    # Number communities by decreasing size, then by their first node, so the numbering is stable
+    sizes = np.bincount(labels)
+    first = np.full(len(sizes), n)
+    np.minimum.at(first, labels, np.arange(n))
+    order = np.lexsort((first, -sizes))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[labels]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:02:44 2026
+
+@author: curti
+
+On-disk cache of scraped decks, so that a scrape only fetches decks it has not seen before and an interrupted scrape
+can resume where it stopped. Past tournaments never change, so the cache keeps
+
+    decks           the parsed decklist of every deck page, by deck URL
+    events          the deck links of every event page, by event URL
+    search pages    the event links and dates of every search result page, and whether the page was fully consumed,
+                    i.e. all of its events and all of their decks are cached
+
+Search pages that were fully consumed are not fetched again. The card and edge statistics of the cached decks can be
+recomputed without any network access. The date of a deck is the date of its event, as listed on the search page.
+"""
+import json
+import sqlite3
+import threading
+
+class DeckCache:
+    '''A SQLite deck cache. Safe to use from several threads, each of which gets its own connection.'''
+    def __init__(self, fp):
+        self.fp = fp
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS decks (url TEXT PRIMARY KEY, format TEXT, cards TEXT);
+                CREATE TABLE IF NOT EXISTS events (url TEXT PRIMARY KEY, format TEXT);
+                CREATE TABLE IF NOT EXISTS event_decks (event_url TEXT, deck_url TEXT, PRIMARY KEY (event_url, deck_url));
+                CREATE TABLE IF NOT EXISTS search_pages (url TEXT PRIMARY KEY, format TEXT, consumed INTEGER DEFAULT 0);
+                CREATE TABLE IF NOT EXISTS search_events (page_url TEXT, event_url TEXT, date TEXT, PRIMARY KEY (page_url, event_url));
+                CREATE INDEX IF NOT EXISTS decks_format ON decks (format);
+            ''')
+            # Caches created before event dates were kept have no date column. Their events have no date until their
+            # search pages are fetched again.
+            if 'date' not in [row[1] for row in connection.execute('PRAGMA table_info(search_events)')]:
+                connection.execute('ALTER TABLE search_events ADD COLUMN date TEXT')
+            connection.execute('CREATE INDEX IF NOT EXISTS search_events_event ON search_events (event_url)')
+
+    def _connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = sqlite3.connect(self.fp, timeout = 30)
+            self._local.connection.execute('PRAGMA journal_mode=WAL')
+        return self._local.connection
+
+    def deck(self, url):
+        """Return the cached decklist of a deck page, or None if it is not cached"""
+        row = self._connection().execute('SELECT cards FROM decks WHERE url = ?', (url,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def add_deck(self, url, mtg_format, cards):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO decks (url, format, cards) VALUES (?, ?, ?)',
+                               (url, mtg_format, json.dumps(cards)))
+
+    def event_decks(self, url):
+        """Return the cached deck links of an event page, or None if it is not cached"""
+        connection = self._connection()
+        if connection.execute('SELECT 1 FROM events WHERE url = ?', (url,)).fetchone() is None:
+            return None
+        return [row[0] for row in connection.execute('SELECT deck_url FROM event_decks WHERE event_url = ? ORDER BY rowid', (url,))]
+
+    def add_event(self, url, mtg_format, deck_urls):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO events (url, format) VALUES (?, ?)', (url, mtg_format))
+            connection.executemany('INSERT OR IGNORE INTO event_decks (event_url, deck_url) VALUES (?, ?)',
+                                   [(url, deck_url) for deck_url in deck_urls])
+
+    def consumed_search_page(self, url):
+        """Return the (event link, date) pairs of a search page if it was fully consumed, or None if it has to be fetched"""
+        connection = self._connection()
+        if connection.execute('SELECT 1 FROM search_pages WHERE url = ? AND consumed = 1', (url,)).fetchone() is None:
+            return None
+        return [tuple(row) for row in connection.execute('SELECT event_url, date FROM search_events WHERE page_url = ? ORDER BY rowid', (url,))]
+
+    def add_search_page(self, url, mtg_format, events):
+        with self._connection() as connection:
+            connection.execute('INSERT OR IGNORE INTO search_pages (url, format) VALUES (?, ?)', (url, mtg_format))
+            connection.executemany('INSERT OR REPLACE INTO search_events (page_url, event_url, date) VALUES (?, ?, ?)',
+                                   [(url, event_url, date) for event_url, date in events])
+
+    def mark_consumed(self):
+        """Mark every search page whose events and decks are all cached as fully consumed"""
+        with self._connection() as connection:
+            connection.execute('''
+                UPDATE search_pages SET consumed = 1
+                WHERE consumed = 0
+                AND NOT EXISTS (SELECT 1 FROM search_events
+                                LEFT JOIN events ON events.url = search_events.event_url
+                                WHERE search_events.page_url = search_pages.url AND events.url IS NULL)
+                AND NOT EXISTS (SELECT 1 FROM search_events
+                                JOIN event_decks ON event_decks.event_url = search_events.event_url
+                                LEFT JOIN decks ON decks.url = event_decks.deck_url
+                                WHERE search_events.page_url = search_pages.url AND decks.url IS NULL)
+            ''')
+
+    def decks(self, mtg_format = None, with_dates = False):
+        """Return every cached decklist, as {format: [deck]}, optionally only those of one format. With dates, also
+        return the date of every deck, as {format: [date]}, None for decks whose event date is unknown."""
+        query = '''SELECT format, cards, (SELECT MIN(search_events.date) FROM event_decks
+                                          JOIN search_events ON search_events.event_url = event_decks.event_url
+                                          WHERE event_decks.deck_url = decks.url)
+                   FROM decks''' + (' WHERE format = ?' if mtg_format else '') + ' ORDER BY rowid'
+        decks = {}
+        dates = {}
+        for deck_format, cards, date in self._connection().execute(query, (mtg_format,) if mtg_format else ()):
+            decks.setdefault(deck_format, []).append(json.loads(cards))
+            dates.setdefault(deck_format, []).append(date)
+        return (decks, dates) if with_dates else decks
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM decks').fetchone()[0]
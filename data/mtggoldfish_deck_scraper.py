@@ -3,148 +3,399 @@
 Created on Tue Sep 19 01:55:46 2023
 
 @author: curti
+
+Scrapes challenge decklists from MTGGoldfish and writes the card and edge JSON files read by Metagame.from_json.
+
+Search pages, event pages and deck pages are fetched by a pool of worker threads sharing one keep-alive HTTP session.
+Requests to each host are limited in concurrency and rate, failed requests are retried with exponential backoff, and
+deck pages of every event of every format are fetched in parallel. A deck page that still fails after its retries is
+skipped and reported instead of stopping the run.
+
+The site's base URL can be changed with the MTGGOLDFISH_URL environment variable. Pages fetched with a record
+directory are saved there, and FixtureServer serves such a directory over local HTTP, so the scraper can be run
+against recorded pages. Parsed decks are kept in a DeckCache, so decks that were scraped before are never fetched again
+and an interrupted scrape resumes where it stopped. Every deck keeps the date of its event, so the statistics are also
+aggregated per week and the metagame can be viewed over any window of time:
+
+    python mtggoldfish_deck_scraper.py OUTPUT_DIR [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--cache CACHE]
+                                       [--record-dir RECORD_DIR] [--offline]
 """
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urljoin, urlsplit
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
 
-from urllib.request import Request, urlopen
 from lxml import html
+import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-import json
+
+from deck_cache import DeckCache
+# The aggregation lives with the metagame code in the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregation import aggregate_formats
 
 headers={'User-Agent': 'Mozilla/5.0'}
 
-def scrape_goldfish(search_start, search_end, search_format, tournament_name):
+BASE_URL = os.environ.get('MTGGOLDFISH_URL', 'https://www.mtggoldfish.com')
+# Responses with these status codes are retried, as they are usually transient
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Formats whose challenges are scraped
+FORMATS = ['Standard', 'Pioneer', 'Modern', 'Legacy', 'Pauper']
+# Number of days scraped when no start date is given
+DEFAULT_SEARCH_DAYS = 14
+
+class RateLimiter:
+    '''Spaces out the starts of requests so that at most rate requests start per second, allowing bursts of up to
+    burst requests after a quiet period.'''
+    def __init__(self, rate, burst = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated)*self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens)/self.rate
+            time.sleep(wait_time)
+
+class Fetcher:
+    '''Fetches pages through a pooled keep-alive HTTP session, with per host concurrency and rate limits and retries
+    with exponential backoff. Safe to use from several threads.'''
+    def __init__(self, max_per_host = 4, rate_per_host = 4.0, retries = 4, backoff = 1.0, timeout = 30, record_dir = None):
+        self.max_per_host = max_per_host
+        self.rate_per_host = rate_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.record_dir = record_dir
+        if record_dir is not None:
+            os.makedirs(record_dir, exist_ok = True)
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections = 4, pool_maxsize = max_per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    # The concurrency and rate limits of a host, created on first use
+    def _limits(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.max_per_host), RateLimiter(self.rate_per_host))
+            return self._hosts[host]
+
+    # Seconds to wait before retrying after the given attempt, honouring the server's Retry-After header if it sent one
+    def _delay(self, attempt, response = None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff*2**attempt*random.uniform(0.5, 1.5)
+
+    def get(self, url):
+        """Return the body of the page at url, retrying transient failures"""
+        semaphore, rate_limiter = self._limits(urlsplit(url).netloc)
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                with semaphore:
+                    rate_limiter.acquire()
+                    response = self.session.get(url, timeout = self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    if self.record_dir is not None:
+                        with open(os.path.join(self.record_dir, fixture_name(url)), 'wb') as fixture_file:
+                            fixture_file.write(response.content)
+                    return response.content
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            if attempt == self.retries:
+                response.raise_for_status()
+            time.sleep(self._delay(attempt, response))
+
+    def close(self):
+        self.session.close()
+
+# File name under which a page is recorded, a hash of its path and query so it does not depend on the host and stays
+# short for long search URLs
+def fixture_name(url):
+    parts = urlsplit(url)
+    return hashlib.sha1((parts.path + '?' + parts.query).encode('utf-8')).hexdigest() + '.html'
+
+class FixtureServer:
+    '''A local HTTP stand-in for the site that serves pages recorded by a Fetcher with a record directory. Pages that
+    were not recorded are answered with 404. Failures maps the path of a page, with its query if it has one, to the
+    statuses of the responses given to its first requests, such as 429 or 503, before the page itself is served, to
+    rehearse retries.'''
+    def __init__(self, directory, port = 0, failures = None):
+        self.failures = {path: list(statuses) for path, statuses in (failures or {}).items()}
+        lock = threading.Lock()
+        fixture_server = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                with lock:
+                    statuses = fixture_server.failures.get(handler.path)
+                    status = statuses.pop(0) if statuses else None
+                if status is not None:
+                    handler.send_response(status)
+                    handler.send_header('Retry-After', '0')
+                    handler.send_header('Content-Length', '0')
+                    handler.end_headers()
+                    return
+                fp = os.path.join(directory, fixture_name(handler.path))
+                if not os.path.exists(fp):
+                    handler.send_error(404)
+                    return
+                with open(fp, 'rb') as fixture_file:
+                    body = fixture_file.read()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/html; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self._thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+def search_url(base_url, page_num, search_start, search_end, search_format):
+    return ''.join([base_url,
+                    '/tournament_searches/',
+                    'create?commit=Search&page=',
+                    str(page_num),
+                    '&tournament_search%5B',
+                    'date_range%5D=',
+                    search_start[0],
+                    '%2F',
+                    search_start[1],
+                    '%2F',
+                    search_start[2],
+                    '+-+',
+                    search_end[0],
+                    '%2F',
+                    search_end[1],
+                    '%2F',
+                    search_end[2],
+                    '&tournament_search%5Bformat%5D=',
+                    search_format.lower(),
+                    '&tournament_search%5Bname%5D=&utf8=%E2%9C%93'])
+
+# Links to the events of a search page whose names contain tournament_name, as (link, date) pairs. The date of an
+# event is the ISO date in its row of the results table, or None if there is none.
+def parse_search_page(page, base_url, tournament_name):
+    items = html.fromstring(page).xpath('//tr/td/a')
+    events = []
+    for item in items:
+        if item.text and tournament_name in item.text:
+            date = re.search(r'\d{4}-\d{2}-\d{2}', item.getparent().getparent().text_content())
+            events.append((urljoin(base_url, item.get('href')), date.group(0) if date else None))
+    return items, events
+
+# Links to the decks of an event page
+def parse_event_page(page, base_url):
+    decktable = html.fromstring(page).xpath('//table[contains(@class, "table-tournament")]/tr/td/a[contains(@href, "/deck/")]/@href')
+    return [urljoin(base_url, deck_link) for deck_link in decktable]
+
+# The main deck cards of a deck page, as {name: {'qty': quantity, 'type': card type}}. Lands are left out.
+def parse_deck_page(page):
+    decktree = html.fromstring(page)
+    decklist = decktree.xpath('//div[contains(@class,"deck-table-container")]/table[contains(@class, "deck-view-deck-table")]')[0]
+    deckcards = {}
+    card_type = None
+    for tr in decklist.getchildren()[:-1]:
+        trclass = tr.get('class')
+        if trclass is not None and 'deck-category-header' in trclass:
+            card_type = [line.strip() for line in tr.getchildren()[0].text.split('\n') if line.strip()][0]
+            if card_type[-1] == 's':
+                card_type = card_type[:-1]
+        else:
+            if card_type in ['Sideboard', 'Land']:
+                continue
+            qty = int(tr.getchildren()[0].text.strip())
+            name = tr.getchildren()[1].xpath('./span/a')[0].text
+            deckcards[name] = {'qty': qty, 'type': card_type}
+    return deckcards
+
+# Follows the result pages of a search and returns the matching events as (link, date) pairs. Pages the cache records
+# as fully consumed are read from the cache instead of being fetched; without a fetcher, only those pages are read.
+def search_events(fetcher, base_url, search_start, search_end, search_format, tournament_name, cache = None):
+    events = []
     page_num = 1
-    carddict = {}
-    reldict = {}
     while True:
-        page_url = ''.join(['https://www.mtggoldfish.com/tournament_searches/',
-                            'create?commit=Search&page=',
-                            str(page_num),
-                            '&tournament_search%5B',
-                            'date_range%5D=',
-                            search_start[0],
-                            '%2F',
-                            search_start[1],
-                            '%2F',
-                            search_start[2],
-                            '+-+',
-                            search_end[0],
-                            '%2F',
-                            search_end[1],
-                            '%2F',
-                            search_end[2],
-                            '&tournament_search%5Bformat%5D=',
-                            search_format.lower(),
-                            '&tournament_search%5Bname%5D=&utf8=%E2%9C%93'])
-        page_req = Request(page_url, headers = headers)
-        webpage = urlopen(page_req)
-        pagetree = html.fromstring(str(webpage.read()))
-        items = pagetree.xpath('//tr/td/a')
-        if len(items) == 0:
-            break
-        for item in items:
-            if tournament_name not in item.text:
-                continue
-            event_link = 'https://www.mtggoldfish.com/' + item.get('href')
-            event_req = Request(event_link, headers=headers)
-            webevent = urlopen(event_req)
-            eventtree = html.fromstring(str(webevent.read()))
-            decktable = eventtree.xpath('//table[contains(@class, "table-tournament")]/tr/td/a[contains(@href, "/deck/")]/@href')
-            for deck_link in decktable:
-                deck_url = 'https://www.mtggoldfish.com' + deck_link
-                deck_req = Request(deck_url, headers=headers)
-                webdeck = urlopen(deck_req)
-                decktree = html.fromstring(str(webdeck.read()))
-                decklist = decktree.xpath('//div[contains(@class,"deck-table-container")]/table[contains(@class, "deck-view-deck-table")]')[0]
-                deckcards = {}
-                for tr in decklist.getchildren()[:-1]:
-                    trclass = tr.get('class')
-                    if trclass is not None and 'deck-category-header' in trclass:
-                        card_type = tr.getchildren()[0].text.split('\\n')[1]
-                        if card_type[-1] == 's':
-                            card_type = card_type[:-1]
-                    else:
-                        if card_type in ['Sideboard', 'Land']:
-                            continue
-                        qty = int(tr.getchildren()[0].text.replace('\\n', ''))
-                        name = tr.getchildren()[1].xpath('./span/a')[0].text
-                        carddict[name] = carddict.get(name, {'count': 0,
-                                                             'total': 0,
-                                                             'type': None})
-                        carddict[name]['count'] += 1
-                        carddict[name]['total'] += qty
-                        carddict[name]['type'] = card_type
-                        deckcards[name] = {'qty': qty}
-                cardlist = list(deckcards)
-                for i in range(len(cardlist)-1):
-                    for j in range(i+1, len(cardlist)):
-                        relkey = tuple(sorted((cardlist[i], cardlist[j])))
-                        ikey = relkey[0]
-                        jkey = relkey[1]
-                        reldict[relkey] = reldict.get(relkey, {'count': 0,
-                                                               'total': 0})
-                        reldict[relkey]['count'] += 1
-                        reldict[relkey]['total'] += deckcards[ikey]['qty']*deckcards[jkey]['qty']
+        page_url = search_url(base_url, page_num, search_start, search_end, search_format)
+        page_events = cache.consumed_search_page(page_url) if cache is not None else None
+        if page_events is None:
+            if fetcher is None:
+                break
+            items, page_events = parse_search_page(fetcher.get(page_url), base_url, tournament_name)
+            if len(items) == 0:
+                break
+            if cache is not None:
+                cache.add_search_page(page_url, search_format, page_events)
+        events.extend(page_events)
         page_num += 1
-    return carddict, reldict
-
-search_param_sets = {'standard': {'search_start': ['09', '06', '2023'],
-                                  'search_end': ['09', '20', '2023'],
-                                  'search_format': 'Standard',
-                                  'tournament_name': 'Standard Challenge'},
-                     'pioneer': {'search_start': ['09', '06', '2023'],
-                                 'search_end': ['09', '20', '2023'],
-                                 'search_format': 'Pioneer',
-                                 'tournament_name': 'Pioneer Challenge'},
-                     'modern': {'search_start': ['09', '06', '2023'],
-                                'search_end': ['09', '20', '2023'],
-                                'search_format': 'Modern',
-                                'tournament_name': 'Modern Challenge'},
-                     'legacy': {'search_start': ['09', '06', '2023'],
-                                'search_end': ['09', '20', '2023'],
-                                'search_format': 'Legacy',
-                                'tournament_name': 'Legacy Challenge'},
-                     'pauper': {'search_start': ['09', '06', '2023'],
-                                'search_end': ['09', '20', '2023'],
-                                'search_format': 'Pauper',
-                                'tournament_name': 'Pauper Challenge'}}
-cards_main = {}
-rels_main = {}
-for param_set in tqdm(search_param_sets.values()):
-    mtg_format = param_set['search_format']
-    cards, rels = scrape_goldfish(**param_set)
-    for card in cards:
-        cards_main[card] = cards_main.get(card, {'count': {},
-                                                 'total': {},
-                                                 'type': None})
-        cards_main[card]['count'][mtg_format] = cards_main[card]['count'].get(mtg_format, 0) + cards[card]['count']
-        cards_main[card]['total'][mtg_format] = cards_main[card]['total'].get(mtg_format, 0) + cards[card]['total']
-        cards_main[card]['type'] = cards[card]['type']
-    rels_main[mtg_format] = rels_main.get(mtg_format, {})
-    for rel in rels:
-        rels_main[mtg_format][rel] = rels_main[mtg_format].get(rel, {'count': 0,
-                                                                     'total': 0})
-        rels_main[mtg_format][rel]['count'] += rels[rel]['count']
-        rels_main[mtg_format][rel]['total'] += rels[rel]['total']
-for card in cards_main:
-    cards_main[card]['count']['All'] = sum([val for val in cards_main[card]['count'].values()])
-    cards_main[card]['total']['All'] = sum([val for val in cards_main[card]['total'].values()])
-rels_main_all = {}
-for f in rels_main:
-    for rel in rels_main[f]:
-        rels_main_all[rel] = rels_main_all.get(rel, {'count': 0,
-                                                     'total': 0})
-        rels_main_all[rel]['count'] += rels_main[f][rel]['count']
-        rels_main_all[rel]['total'] += rels_main[f][rel]['total']
-rels_main['All'] = rels_main_all
-
-
-with open('C:\\Git\\mtg-cluster\\data\\cards.json', 'w') as f:
-    json.dump(cards_main, f)
-    
-#Necessary to do this to maintain tuples as keys for the relationships as json does not allow this
-def remap_keys(mapping):
-    return[{'key': k, 'value': v} for k,v in mapping.items()]    
-    
-with open('C:\\Git\\mtg-cluster\\data\\rels.json', 'w') as f:
-    json.dump({key: remap_keys(value) for key, value in rels_main.items()}, f)
\ No newline at end of file
+    return events
+
+def scrape_decks(param_sets, fetcher, base_url = BASE_URL, max_workers = 16, cache = None):
+    """Fetch the decks of every search in param_sets and return them as {format: [deck]}, with the date of each deck's
+    event as {format: [date]}
+
+    Searches of different formats, event pages and deck pages are all fetched concurrently: as soon as a search or an
+    event page has been parsed, the pages it links to are queued. Pages that fail after their retries are skipped.
+
+    Parameters
+    ------------
+    param_sets: list
+        keyword arguments of search_events for each search
+    fetcher: Fetcher
+        fetcher for the pages, or None to only read from the cache
+    cache: DeckCache
+        cache of the pages already scraped. Event and deck pages in the cache are not fetched again, and newly fetched
+        pages are added to it as soon as they are parsed, so an interrupted scrape resumes where it stopped.
+    """
+    decks = {param_set['search_format']: [] for param_set in param_sets}
+    dates = {param_set['search_format']: [] for param_set in param_sets}
+    seen_decks = set()
+    failures = 0
+    progress = tqdm(total = 0, unit = 'page')
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+        pending = {}
+        def fetch(kind, mtg_format, link, date, parse):
+            if fetcher is not None:
+                pending[pool.submit(lambda: parse(fetcher.get(link)))] = (kind, mtg_format, link, date)
+                progress.total += 1
+        # Queues the pages an event links to, reading the event's deck links from the cache when possible
+        def queue_event(mtg_format, event_link, date):
+            deck_links = cache.event_decks(event_link) if cache is not None else None
+            if deck_links is None:
+                fetch('event', mtg_format, event_link, date, lambda page: parse_event_page(page, base_url))
+            else:
+                for deck_link in deck_links:
+                    queue_deck(mtg_format, deck_link, date)
+        def queue_deck(mtg_format, deck_link, date):
+            if deck_link in seen_decks:
+                return
+            seen_decks.add(deck_link)
+            deck = cache.deck(deck_link) if cache is not None else None
+            if deck is None:
+                fetch('deck', mtg_format, deck_link, date, parse_deck_page)
+            else:
+                decks[mtg_format].append(deck)
+                dates[mtg_format].append(date)
+
+        for param_set in param_sets:
+            pending[pool.submit(search_events, fetcher, base_url, cache = cache, **param_set)] = ('search', param_set['search_format'], None, None)
+        progress.total += len(pending)
+        fetched_decks = 0
+        while pending:
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                kind, mtg_format, link, date = pending.pop(future)
+                progress.update()
+                try:
+                    result = future.result()
+                except Exception as error:
+                    failures += 1
+                    tqdm.write('Skipping a {} page of {}: {}'.format(kind, mtg_format, error))
+                    continue
+                if kind == 'search':
+                    for event_link, event_date in result:
+                        queue_event(mtg_format, event_link, event_date)
+                elif kind == 'event':
+                    if cache is not None:
+                        cache.add_event(link, mtg_format, result)
+                    for deck_link in result:
+                        queue_deck(mtg_format, deck_link, date)
+                else:
+                    if cache is not None:
+                        cache.add_deck(link, mtg_format, result)
+                    decks[mtg_format].append(result)
+                    dates[mtg_format].append(date)
+                    fetched_decks += 1
+                    if cache is not None and fetched_decks % 500 == 0:
+                        cache.mark_consumed()
+            progress.refresh()
+    progress.close()
+    if cache is not None:
+        cache.mark_consumed()
+    if failures:
+        tqdm.write('{} pages could not be fetched and were skipped.'.format(failures))
+    return decks, dates
+
+def scrape_goldfish(search_start, search_end, search_format, tournament_name, fetcher = None, base_url = BASE_URL):
+    fetcher = fetcher or Fetcher()
+    decks, dates = scrape_decks([{'search_start': search_start,
+                                  'search_end': search_end,
+                                  'search_format': search_format,
+                                  'tournament_name': tournament_name}], fetcher, base_url)
+    return aggregate_formats(decks, dates)
+
+# The [month, day, year] form of an ISO date used in search URLs
+def search_date(date):
+    year, month, day = date.split('-')
+    return [month, day, year]
+
+# The searches for the challenges of every format between two ISO dates, both included
+def search_param_sets(start, end):
+    return [{'search_start': search_date(start),
+             'search_end': search_date(end),
+             'search_format': mtg_format,
+             'tournament_name': mtg_format + ' Challenge'} for mtg_format in FORMATS]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Scrape challenge decklists from MTGGoldfish into cards.json and edges.json.')
+    parser.add_argument('output_dir', help = 'directory to write cards.json and edges.json to')
+    parser.add_argument('--start', help = 'first day of events to scrape, YYYY-MM-DD, by default {} days before the end'.format(DEFAULT_SEARCH_DAYS))
+    parser.add_argument('--end', help = 'last day of events to scrape, YYYY-MM-DD, by default today')
+    parser.add_argument('--snapshot', action = 'store_true', help = 'also write metagame.snapshot and similarity.snapshot to the output directory')
+    parser.add_argument('--record-dir', help = 'directory to save every fetched page to, to be served by FixtureServer')
+    parser.add_argument('--cache', default = 'deck_cache.sqlite', help = 'deck cache file, so that only new decks are fetched')
+    parser.add_argument('--offline', action = 'store_true',
+                        help = 'do not fetch anything and aggregate every deck in the cache, e.g. after changing the aggregation')
+    args = parser.parse_args()
+    end = args.end or datetime.date.today().isoformat()
+    start = args.start or (datetime.date.fromisoformat(end) - datetime.timedelta(days = DEFAULT_SEARCH_DAYS)).isoformat()
+    cache = DeckCache(args.cache)
+    if args.offline:
+        decks, dates = cache.decks(with_dates = True)
+    else:
+        fetcher = Fetcher(record_dir = args.record_dir)
+        try:
+            decks, dates = scrape_decks(search_param_sets(start, end), fetcher, cache = cache)
+        finally:
+            fetcher.close()
+    cooccurrence = aggregate_formats(decks, dates)
+    cooccurrence.to_json(os.path.join(args.output_dir, 'cards.json'), os.path.join(args.output_dir, 'edges.json'))
+    if args.snapshot:
+        cooccurrence.to_metagame(min_count = 0).save_snapshot(os.path.join(args.output_dir, 'metagame.snapshot'))
+        # Similar cards are indexed over the edges the app loads, which leave out the rarest pairs
+        cooccurrence.to_metagame().save_similarity(os.path.join(args.output_dir, 'similarity.snapshot'))
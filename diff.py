@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:26:44 2026
+
+@author: ToupinC
+
+Differences between two formats of a metagame, such as a format over two windows of time or two different formats.
+Cards are compared by deck share, the fraction of a format's decks they appear in, and card pairs by deck share and by
+co-occurrence strength under one of the edge measures of pruning.py. Both formats index cards by the metagame's card
+index, so card arrays line up as they are, and edges are lined up by the unordered pair of cards they connect:
+
+    key = min(source, target)*n_cards + max(source, target)
+
+Every delta is the other format's value minus the base format's, so positive deltas are cards and pairs that rose.
+"""
+import numpy as np
+
+# Edge measure the strength of card pairs is compared by
+DEFAULT_DIFF_MEASURE = 'lift'
+
+# Fraction of a format's decks each card appears in, over n_cards cards
+def _card_shares(meta_format, n_cards):
+    counts = np.zeros(n_cards)
+    card_counts = meta_format.card_counts()[:n_cards]
+    counts[:len(card_counts)] = card_counts
+    n_decks = meta_format.deck_count()
+    return counts/n_decks if n_decks else np.zeros(n_cards)
+
+# Unordered pair key of every edge of a format's arrays
+def _pair_keys(adjacency, n_cards):
+    return np.minimum(adjacency.source, adjacency.target)*n_cards + np.maximum(adjacency.source, adjacency.target)
+
+class FormatDiff:
+    '''The changes in deck share of every card, and in deck share and strength of every card pair of either format, from
+    a base format to another format of the same metagame. Card arrays are indexed by card, and edge arrays by the pairs
+    in source and target, which are every pair with an edge in either format.'''
+    def __init__(self, base, other, measure = DEFAULT_DIFF_MEASURE):
+        if base.metagame is not other.metagame:
+            raise ValueError("Only formats of the same metagame can be compared.")
+        self.base = base
+        self.other = other
+        self.measure = measure
+        n_cards = len(base.metagame.card_ids)
+        self.base_card_share = _card_shares(base, n_cards)
+        self.other_card_share = _card_shares(other, n_cards)
+        self.card_delta = self.other_card_share - self.base_card_share
+        base_keys = _pair_keys(base.arrays, n_cards)
+        other_keys = _pair_keys(other.arrays, n_cards)
+        keys = np.union1d(base_keys, other_keys)
+        self.source, self.target = np.divmod(keys, max(n_cards, 1))
+        # Every format's share and strength of every pair, 0 for the pairs it has no edge between
+        base_rows = np.searchsorted(keys, base_keys)
+        other_rows = np.searchsorted(keys, other_keys)
+        self.base_edge_share, self.other_edge_share, self.base_strength, self.other_strength = [np.zeros(len(keys)) for _ in range(4)]
+        self.base_edge_share[base_rows] = base.arrays.count/(base.deck_count() or 1)
+        self.other_edge_share[other_rows] = other.arrays.count/(other.deck_count() or 1)
+        self.base_strength[base_rows] = base.edge_scores(measure)
+        self.other_strength[other_rows] = other.edge_scores(measure)
+        self.edge_delta = self.other_edge_share - self.base_edge_share
+        self.strength_delta = self.other_strength - self.base_strength
+        return
+
+    def __len__(self):
+        return len(self.source)
+
+    def top_cards(self, n = 10, rising = True):
+        """Return the indices of the n cards whose deck share rose the most, or fell the most if not rising"""
+        delta = self.card_delta if rising else -self.card_delta
+        order = np.argsort(-delta, kind='stable')[:n]
+        return order[delta[order] > 0]
+
+    def top_edges(self, n = 10, rising = True, by_strength = False):
+        """Return the indices into the edge arrays of the n card pairs whose deck share, or strength, rose the most,
+        or fell the most if not rising"""
+        delta = self.strength_delta if by_strength else self.edge_delta
+        delta = delta if rising else -delta
+        order = np.argsort(-delta, kind='stable')[:n]
+        return order[delta[order] > 0]
@@ -5,9 +5,12 @@ Created on Thu Nov 25 01:06:59 2021
 @author: ToupinC
 """
 import uuid
+from collections.abc import Mapping
+import numpy as np
 
 class Card:
     '''A card is a Magic: the Gathering game object represented by a node in a graph.'''
+    __slots__ = ('name', 'type', 'count', 'total', 'id')
     def __init__(self, card_name, card_type, count, total, node_id = None):
         if node_id is None:
             node_id = uuid.uuid4()
@@ -36,6 +39,7 @@ class Card:
 class Edge:
     '''An edge is an object that describes a relationship between two cards. In a MtG format, a 
     relationship between C1 and C2 denotes that these two cards appear in a metagame deck together.'''
+    __slots__ = ('source', 'target', 'count', 'total', 'id')
     def __init__(self, source, target, count, total, edge_id = None):
         if edge_id is None:
             edge_id = source.id + '__' + target.id
@@ -100,4 +104,342 @@ class Path:
     
     # Adding a path or edge to a path returns another path
     def __add__(self, other):
-        return Path(self, other)
\ No newline at end of file
+        return Path(self, other)
+
+
+# Integer arrays are used as they are, so read-only views into a snapshot's memory map are not copied.
+def _int_array(values):
+    values = np.asarray(values)
+    return values if values.dtype.kind in 'iu' else values.astype(np.int64)
+
+class Adjacency:
+    '''An adjacency is an array-backed undirected graph over integer card indices. Edges are stored as parallel
+    source, target, count and total arrays, and the neighbours of every card are stored in compressed sparse row
+    (CSR) form so they can be sliced out without touching any Python objects.'''
+    def __init__(self, n_cards, source, target, count, total):
+        self.n_cards = n_cards
+        self.source = _int_array(source)
+        self.target = _int_array(target)
+        self.count = _int_array(count)
+        self.total = _int_array(total)
+        # Each edge is listed in the rows of both its endpoints, except loops which are only listed once.
+        nonloop = self.source != self.target
+        edge_index = np.arange(len(self.source))
+        rows = np.concatenate([self.source, self.target[nonloop]])
+        cols = np.concatenate([self.target, self.source[nonloop]])
+        order = np.lexsort((cols, rows))
+        # The neighbours of card i are indices[indptr[i]:indptr[i+1]], sorted, and edge_index holds the matching edges.
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_cards))])
+        self.indices = cols[order]
+        self.edge_index = np.concatenate([edge_index, edge_index[nonloop]])[order]
+        return
+    
+    # Builds an adjacency from edge objects, given a dict of card ID to card index
+    @classmethod
+    def from_edges(cls, edges, card_index):
+        edges = list(edges)
+        return cls(len(card_index),
+                   [card_index[edge.source.id] for edge in edges],
+                   [card_index[edge.target.id] for edge in edges],
+                   [edge.count for edge in edges],
+                   [edge.total for edge in edges])
+    
+    # Number of edges
+    def __len__(self):
+        return len(self.source)
+    
+    # Number of edges at each card
+    def degree(self):
+        return np.diff(self.indptr)
+    
+    # Indices of the cards adjacent to card i
+    def neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+    
+    # Indices of the edges at card i
+    def edges_at(self, i):
+        return self.edge_index[self.indptr[i]:self.indptr[i+1]]
+    
+    # Index of the edge between cards i and j, or -1 if they are not adjacent
+    def edge_between(self, i, j):
+        if not (0 <= i < self.n_cards and 0 <= j < self.n_cards):
+            return -1
+        neighbours = self.neighbours(i)
+        position = np.searchsorted(neighbours, j)
+        if position < len(neighbours) and neighbours[position] == j:
+            return int(self.edges_at(i)[position])
+        return -1
+    
+    # Returns a new adjacency with the edges appended
+    def extended(self, source, target, count, total):
+        return Adjacency(self.n_cards,
+                         np.concatenate([self.source, source]),
+                         np.concatenate([self.target, target]),
+                         np.concatenate([self.count, count]),
+                         np.concatenate([self.total, total]))
+    
+    # Returns a new adjacency over n_cards cards, which must be at least as many as there already are
+    def resized(self, n_cards):
+        if n_cards == self.n_cards:
+            return self
+        return Adjacency(n_cards, self.source, self.target, self.count, self.total)
+    
+    # Returns a new adjacency keeping only the edges where edge_mask is True
+    def filtered(self, edge_mask):
+        return Adjacency(self.n_cards, self.source[edge_mask], self.target[edge_mask], self.count[edge_mask], self.total[edge_mask])
+    
+    # Breadth-first search outwards from the seed card indices, expanding the whole frontier at once. Returns an array
+    # of each card's distance in hops from the nearest seed (-1 if it was not reached) and a mask of the edges traversed.
+    # If min_count is given, edges that appear in fewer decks than min_count are not traversed.
+    def bfs(self, seeds, n, min_count = None):
+        distances = np.full(self.n_cards, -1, dtype=np.int64)
+        edge_mask = np.zeros(len(self), dtype=bool)
+        frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+        distances[frontier] = 0
+        for hops in range(1, n+1):
+            if len(frontier) == 0:
+                break
+            starts = self.indptr[frontier]
+            lengths = self.indptr[frontier+1] - starts
+            # Positions in the CSR arrays of every entry in the frontier's rows
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            neighbours = self.indices[positions]
+            edges = self.edge_index[positions]
+            if min_count is not None:
+                usable = self.count[edges] >= min_count
+                neighbours = neighbours[usable]
+                edges = edges[usable]
+            edge_mask[edges] = True
+            frontier = np.unique(neighbours[distances[neighbours] < 0])
+            distances[frontier] = hops
+        return distances, edge_mask
+    
+    # Dense adjacency matrix over the given card indices, with the given edge weights (1 for every edge by default)
+    def matrix(self, cards, weights = None):
+        position = np.full(self.n_cards, -1, dtype=np.int64)
+        position[cards] = np.arange(len(cards))
+        weights = np.ones(len(self)) if weights is None else np.asarray(weights, dtype=float)
+        keep = (position[self.source] >= 0) & (position[self.target] >= 0) & (self.source != self.target)
+        matrix = np.zeros((len(cards), len(cards)))
+        matrix[position[self.source[keep]], position[self.target[keep]]] = weights[keep]
+        matrix[position[self.target[keep]], position[self.source[keep]]] = weights[keep]
+        return matrix
+    
+    # Mask of the edges that are among the k highest scoring edges of at least one of their cards
+    def top_k(self, scores, k):
+        rows = np.repeat(np.arange(self.n_cards), self.degree())
+        # Sort each card's edges by decreasing score, then rank them within the card's row
+        order = np.lexsort((-np.asarray(scores)[self.edge_index], rows))
+        rank = np.arange(len(order)) - self.indptr[rows]
+        keep = np.zeros(len(self), dtype=bool)
+        keep[self.edge_index[order][rank < k]] = True
+        return keep
+    
+    # Computes degree, 2-hop reach, weighted degree and clustering coefficient for every card at once. Returns a dict
+    # of statistic name to an array indexed by card.
+    def node_stats(self):
+        degree = self.degree()
+        rows = np.repeat(np.arange(self.n_cards), degree)
+        weighted_count = np.bincount(rows, weights=self.count[self.edge_index], minlength=self.n_cards)
+        weighted_total = np.bincount(rows, weights=self.total[self.edge_index], minlength=self.n_cards)
+        # Reach and clustering only involve cards with edges, and ignore loops
+        active = np.flatnonzero(degree)
+        adjacency = self.matrix(active)
+        # Entry (i, j) of the squared adjacency matrix counts the paths of length 2 from card i to card j
+        two_step = adjacency @ adjacency
+        reach = (adjacency + two_step) > 0
+        np.fill_diagonal(reach, False)
+        simple_degree = adjacency.sum(axis=1)
+        triangles = (two_step * adjacency).sum(axis=1)/2
+        possible_triangles = simple_degree*(simple_degree - 1)/2
+        two_hop_reach = np.zeros(self.n_cards, dtype=np.int64)
+        two_hop_reach[active] = reach.sum(axis=1)
+        clustering = np.zeros(self.n_cards)
+        clustering[active] = np.divide(triangles, possible_triangles, out=np.zeros(len(active)), where=possible_triangles > 0)
+        return {'degree': degree,
+                'two_hop_reach': two_hop_reach,
+                'weighted_degree_count': weighted_count,
+                'weighted_degree_total': weighted_total,
+                'clustering': clustering}
+
+class CardTable:
+    '''A card table stores the cards of a metagame column by column, with each card identified by its integer index.
+    Card objects are only created on demand, as lightweight CardView objects.'''
+    def __init__(self, ids, names, types, count, total, count_formats):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.types = list(types)
+        # Rows are cards and columns are formats, in the order of count_formats
+        self.count = np.asarray(count)
+        self.total = np.asarray(total)
+        self.count_formats = list(count_formats)
+        self.index = {card_id: i for i, card_id in enumerate(self.ids)}
+        self.name_index = {}
+        for i, name in enumerate(self.names):
+            self.name_index.setdefault(name, i)
+        return
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    # Returns a view of the card at index i
+    def at(self, i):
+        return CardView(self, i)
+    
+    # Appends cards to the table. Cards whose IDs are already in the table are ignored.
+    def append(self, *cards):
+        cards = [card for card in dict((card.id, card) for card in cards).values() if card.id not in self.index]
+        if not cards:
+            return
+        count_formats = self.count_formats + sorted(set([format_name for card in cards for format_name in list(card.count) + list(card.total)]) - set(self.count_formats))
+        pad = ((0, 0), (0, len(count_formats) - len(self.count_formats)))
+        self.count = np.vstack([np.pad(self.count, pad), [[card.count.get(format_name, 0) for format_name in count_formats] for card in cards]])
+        self.total = np.vstack([np.pad(self.total, pad), [[card.total.get(format_name, 0) for format_name in count_formats] for card in cards]])
+        self.count_formats = count_formats
+        for card in cards:
+            self.index[card.id] = len(self.ids)
+            self.name_index.setdefault(card.name, len(self.ids))
+            self.ids.append(card.id)
+            self.names.append(card.name)
+            self.types.append(card.type)
+        return
+
+class CardView(Card):
+    '''A card view exposes the card at one index of a CardTable through the Card API.'''
+    __slots__ = ('_table', '_index')
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+        return
+    
+    @property
+    def name(self):
+        return self._table.names[self._index]
+    
+    @property
+    def type(self):
+        return self._table.types[self._index]
+    
+    @property
+    def count(self):
+        return {format_name: n for format_name, n in zip(self._table.count_formats, self._table.count[self._index].tolist()) if n}
+    
+    @property
+    def total(self):
+        return {format_name: n for format_name, n in zip(self._table.count_formats, self._table.total[self._index].tolist()) if n}
+    
+    @property
+    def id(self):
+        return self._table.ids[self._index]
+    
+    # Views are created on demand, so two views are the same card if they look at the same index of the same table
+    def __eq__(self, other):
+        return isinstance(other, CardView) and other._table is self._table and other._index == self._index
+    
+    def __hash__(self):
+        return hash((id(self._table), self._index))
+
+class EdgeView(Edge):
+    '''An edge view exposes the edge at one index of an Adjacency through the Edge API.'''
+    __slots__ = ('_adjacency', '_cards', '_index')
+    def __init__(self, adjacency, cards, index):
+        self._adjacency = adjacency
+        # Card table the adjacency's card indices refer to
+        self._cards = cards
+        self._index = index
+        return
+    
+    @property
+    def source(self):
+        return self._cards.at(int(self._adjacency.source[self._index]))
+    
+    @property
+    def target(self):
+        return self._cards.at(int(self._adjacency.target[self._index]))
+    
+    @property
+    def count(self):
+        return int(self._adjacency.count[self._index])
+    
+    @property
+    def total(self):
+        return int(self._adjacency.total[self._index])
+    
+    @property
+    def id(self):
+        return self._cards.ids[self._adjacency.source[self._index]] + '__' + self._cards.ids[self._adjacency.target[self._index]]
+    
+    def __eq__(self, other):
+        return isinstance(other, EdgeView) and other._adjacency is self._adjacency and other._index == self._index
+    
+    def __hash__(self):
+        return hash((id(self._adjacency), self._index))
+
+class CardViews(Mapping):
+    '''A read-only mapping of keys to views of the cards in a CardTable, given a dict of key to card index.'''
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+        return
+    
+    def __getitem__(self, key):
+        return self._table.at(self._index[key])
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self):
+        return len(self._index)
+    
+    def __contains__(self, key):
+        return key in self._index
+    
+    def items(self):
+        return [(key, self._table.at(i)) for key, i in self._index.items()]
+    
+    def values(self):
+        return [self._table.at(i) for i in self._index.values()]
+
+class EdgeViews(Mapping):
+    '''A read-only mapping of edge IDs to views of the edges in an Adjacency. Edge IDs are never stored; they are
+    split back into the IDs of the two cards and looked up in the adjacency.'''
+    def __init__(self, adjacency, cards):
+        self._adjacency = adjacency
+        self._cards = cards
+        return
+    
+    def _edge_index(self, edge_id):
+        if not isinstance(edge_id, str) or '__' not in edge_id:
+            return -1
+        source_id, target_id = edge_id.split('__', 1)
+        source = self._cards.index.get(source_id)
+        target = self._cards.index.get(target_id)
+        if source is None or target is None:
+            return -1
+        i = self._adjacency.edge_between(source, target)
+        # Edge IDs are directional even though edges are not
+        if i < 0 or self._adjacency.source[i] != source:
+            return -1
+        return i
+    
+    def __getitem__(self, edge_id):
+        i = self._edge_index(edge_id)
+        if i < 0:
+            raise KeyError(edge_id)
+        return EdgeView(self._adjacency, self._cards, i)
+    
+    def __contains__(self, edge_id):
+        return self._edge_index(edge_id) >= 0
+    
+    def __iter__(self):
+        ids = self._cards.ids
+        return (ids[source] + '__' + ids[target] for source, target in zip(self._adjacency.source.tolist(), self._adjacency.target.tolist()))
+    
+    def __len__(self):
+        return len(self._adjacency)
+    
+    def values(self):
+        return [EdgeView(self._adjacency, self._cards, i) for i in range(len(self._adjacency))]
+    
+    def items(self):
+        return list(zip(self, self.values()))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:31:09 2026
+
+@author: ToupinC
+
+Counts of a format over time. The decks of a format are split into periods, one per week, and the deck counts and
+copies of every edge and card are kept for each period as cumulative sums: column p of a cumulative array is the sum
+of the periods before period p, so it has one more column than there are periods and the counts over periods start to
+end, both included, are
+
+    cumulative[:, end + 1] - cumulative[:, start]
+
+which is one subtraction per edge or card whatever the length of the window.
+"""
+import datetime
+
+import numpy as np
+
+# Period lengths in days
+PERIOD_DAYS = 7
+
+def period_start(date):
+    """Return the first day of the period of a date, as an ISO date string. Periods are weeks starting on Monday.
+
+    Parameters
+    ------------
+    date: str
+        ISO date, YYYY-MM-DD
+    """
+    day = datetime.date.fromisoformat(date)
+    return (day - datetime.timedelta(days = day.weekday())).isoformat()
+
+def period_range(first, last):
+    """Return the first day of every period from the period of first to the period of last, both included"""
+    first, last = datetime.date.fromisoformat(period_start(first)), datetime.date.fromisoformat(period_start(last))
+    return [(first + datetime.timedelta(days = days)).isoformat() for days in range(0, (last - first).days + 1, PERIOD_DAYS)]
+
+# Cumulative sums along the last axis, with a leading column of zeros
+def _cumulative(counts):
+    counts = np.asarray(counts, dtype=np.int64)
+    return np.concatenate([np.zeros(counts.shape[:-1] + (1,), dtype=np.int64), np.cumsum(counts, axis=-1)], axis=-1)
+
+class History:
+    '''The history of a format: the first day of each of its periods, and cumulative counts over the periods of its
+    edges, in the order of the format's arrays, of its cards, by card index, and of its decks.'''
+    def __init__(self, periods, edge_count, edge_total, card_count, card_total, deck_count):
+        self.periods = list(periods)
+        self.edge_count = np.asarray(edge_count)
+        self.edge_total = np.asarray(edge_total)
+        self.card_count = np.asarray(card_count)
+        self.card_total = np.asarray(card_total)
+        self.deck_count = np.asarray(deck_count)
+        return
+
+    # Builds a history from the counts of each period rather than cumulative counts
+    @classmethod
+    def from_periods(cls, periods, edge_count, edge_total, card_count, card_total, deck_count):
+        return cls(periods, _cumulative(edge_count), _cumulative(edge_total), _cumulative(card_count), _cumulative(card_total),
+                   _cumulative(deck_count))
+
+    # Number of periods
+    def __len__(self):
+        return len(self.periods)
+
+    def _check(self, start, end):
+        if not 0 <= start <= end < len(self.periods):
+            raise ValueError("Invalid window [{}, {}] of a history of {} periods.".format(start, end, len(self.periods)))
+
+    def edge_counts(self, start, end):
+        """Return the deck count and copies of every edge over periods start to end, both included"""
+        self._check(start, end)
+        return self.edge_count[:, end + 1] - self.edge_count[:, start], self.edge_total[:, end + 1] - self.edge_total[:, start]
+
+    def card_counts(self, start, end, n_cards = None):
+        """Return the deck count and copies of every card over periods start to end, both included, for n_cards cards.
+        Cards added to the metagame after the history was built have no counts."""
+        self._check(start, end)
+        count = self.card_count[:, end + 1] - self.card_count[:, start]
+        total = self.card_total[:, end + 1] - self.card_total[:, start]
+        pad = (0, max(0, (n_cards or 0) - len(count)))
+        return np.pad(count, pad), np.pad(total, pad)
+
+    def decks(self, start, end):
+        """Return the number of decks over periods start to end, both included"""
+        self._check(start, end)
+        return int(self.deck_count[end + 1] - self.deck_count[start])
+
+    # Returns the history of only the edges where edge_mask is True
+    def filtered(self, edge_mask):
+        return History(self.periods, self.edge_count[edge_mask], self.edge_total[edge_mask], self.card_count, self.card_total,
+                       self.deck_count)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:20:36 2026
+
+@author: ToupinC
+
+Incremental reading of JSON documents shaped like the scraper's edge file, an object of lists:
+
+    {"Standard": [{"key": [...], "value": {...}}, ...], "Pioneer": [...], ...}
+
+The file is read in chunks and each list item is decoded on its own as soon as it is complete, so memory use is
+bounded by the size of one chunk and the items the caller keeps, not by the size of the file.
+"""
+import json
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+class _ChunkReader:
+    '''Decodes JSON values one at a time from a text file read in chunks.'''
+    def __init__(self, text_file, chunk_size):
+        self.file = text_file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    # Reads the next chunk, dropping the part of the buffer that was already consumed. Returns False at end of file.
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    # Skips whitespace and returns the next character without consuming it
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document.')
+
+    # Consumes the next character, which must be one of chars, and returns it
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Expected one of '{}' at character {} of the JSON document, found '{}'.".format(chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    # Decodes the next complete JSON value, reading more chunks until it is complete
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number is only complete once it is followed by a delimiter, as it may continue in the next chunk
+                if isinstance(value, (dict, list, str)) or self.eof or (end < len(self.buffer) and self.buffer[end] in ',]} \t\r\n'):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_json_lists(fp, chunk_size = DEFAULT_CHUNK_SIZE):
+    """Yield (key, item) for every item of every list of a JSON object of lists, in file order, without loading the
+    whole document
+
+    Parameters
+    ------------
+    fp: str
+        path of the JSON file
+    chunk_size: int
+        number of characters read from the file at a time
+    """
+    with open(fp, 'r') as text_file:
+        reader = _ChunkReader(text_file, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield key, reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+            if reader.expect(',}') == '}':
+                return
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:40:12 2026
+
+@author: ToupinC
+
+Server-side graph layout. Node positions are computed once per format with a vectorized Fruchterman-Reingold force
+directed layout, so the browser only has to draw the graph and does not run any physics simulation:
+
+    repulsion       every pair of cards pushes apart with force k^2/d
+    attraction      every edge pulls its cards together with force w.d^2/k, where w grows with the edge's deck count
+    gravity         every card is pulled towards the centre, so disconnected parts of the graph stay close
+
+Cards start from seeded random positions, so the same format always gets the same layout.
+"""
+import numpy as np
+
+# Number of steps of the force simulation
+DEFAULT_ITERATIONS = 120
+# Seed of the initial positions
+LAYOUT_SEED = 0
+# Average distance between neighbouring cards in the final layout, in pixels
+NODE_SPACING = 40.0
+# Strength of the pull towards the centre, relative to the repulsion
+GRAVITY = 0.5
+# Number of cards whose repulsion is computed at once, which bounds memory use to BLOCK_SIZE x cards pairs
+BLOCK_SIZE = 512
+
+def force_layout(adjacency, cards, iterations = DEFAULT_ITERATIONS, seed = LAYOUT_SEED):
+    """Return an array with the x and y position of each of the given cards, laid out by the adjacency's edges
+
+    Parameters
+    ------------
+    adjacency: graph.Adjacency
+        edges of the format to lay out
+    cards: numpy.ndarray
+        indices of the cards to place; edges to other cards are ignored
+    iterations: int
+        number of steps of the force simulation
+    seed: int
+        seed of the initial positions
+    """
+    cards = np.asarray(cards, dtype=np.int64)
+    n = len(cards)
+    if n == 0:
+        return np.zeros((0, 2))
+    position = np.full(adjacency.n_cards, -1, dtype=np.int64)
+    position[cards] = np.arange(n)
+    keep = (position[adjacency.source] >= 0) & (position[adjacency.target] >= 0) & (adjacency.source != adjacency.target)
+    source, target = position[adjacency.source[keep]], position[adjacency.target[keep]]
+    # Edges seen in more decks pull harder, with diminishing returns so the most played pairs do not dominate
+    weight = np.log1p(adjacency.count[keep].astype(float))
+    weight /= weight.mean() if len(weight) else 1
+    positions = np.random.default_rng(seed).uniform(-1, 1, (n, 2))
+    # Ideal distance between cards for n cards in the [-1, 1] square
+    k = np.sqrt(4.0/n)
+    for step in range(iterations):
+        displacement = np.zeros((n, 2))
+        squared_norms = (positions**2).sum(axis=1)
+        for start in range(0, n, BLOCK_SIZE):
+            block = positions[start:start + BLOCK_SIZE]
+            distance2 = np.maximum(squared_norms[start:start + BLOCK_SIZE, None] + squared_norms[None, :] - 2*block @ positions.T, 1e-9)
+            # The sum over j of (p_i - p_j)*f_ij is p_i*sum(f_ij) - (f @ p)_i. A card does not push itself.
+            force = k*k/distance2
+            force[np.arange(len(block)), np.arange(start, start + len(block))] = 0
+            displacement[start:start + BLOCK_SIZE] = block*force.sum(axis=1)[:, None] - force @ positions
+        delta = positions[source] - positions[target]
+        pull = delta*(np.sqrt((delta**2).sum(axis=1))*weight/k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] -= np.bincount(source, weights=pull[:, axis], minlength=n)
+            displacement[:, axis] += np.bincount(target, weights=pull[:, axis], minlength=n)
+        displacement -= GRAVITY*positions
+        # Every card moves at most the temperature, which cools linearly to 0
+        temperature = 0.1*(1 - step/iterations)
+        length = np.maximum(np.sqrt((displacement**2).sum(axis=1)), 1e-9)
+        positions += displacement*(np.minimum(length, temperature)/length)[:, None]
+    positions -= positions.mean(axis=0)
+    positions /= np.abs(positions).max() or 1
+    return positions*NODE_SPACING*np.sqrt(n)
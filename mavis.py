@@ -4,179 +4,579 @@ Created on Fri Sep 15 21:09:36 2022
 
 @author: ToupinC
 """
-from graph import Card, Edge
-from metagame import Metagame
-from tqdm import tqdm
+from api import register_api
+from centrality import CENTRALITY_METRICS
+from metagame import Metagame, ArrayMetagame, DETAIL_METRICS, DEFAULT_MIN_EDGE_COUNT
+from similarity import SIMILARITY_MEASURES, DEFAULT_NEIGHBOURS
+from search import normalize_name
+from palette import lighten_colors
+from pruning import PRUNING_PRESETS
+from sessions import create_session_store, new_session_id, default_session_state
+from collections import OrderedDict
+import hashlib
 import json
+import os
+import threading
+import numpy as np
 import dash
+from dash import dcc, html, Patch
 import dash_bootstrap_components as dbc
-from visual_styles import get_node_and_edge_scaling_vars, get_distinct_colors, get_app_layout, create_color_legend, DEFAULT_NODE_SIZE, DEFAULT_NODE_COLOR
+from visual_styles import column_stats, get_column_stats, get_distinct_colors, get_app_layout, create_color_legend, DEFAULT_NODE_SIZE, DEFAULT_NODE_COLOR, DEFAULT_EDGE_COLOR
+from visual_styles import DELTA_LABELS, DELTA_COLORS, DELTA_THRESHOLDS
 from dash.dependencies import Input, Output, State
 
+# Node property holding the archetype of every card, which depends on the selected format and pruning
+ARCHETYPE_ATTRIBUTE = 'Archetype'
+# Archetype of the cards with no edges in a format
+NO_ARCHETYPE = 'No archetype'
+# Number of similar cards listed for the selected card
+SIMILAR_CARDS = 10
+# Number of views of the formats, i.e. format, pruning and window of time, whose display attributes are remembered
+VIEW_CACHE_SIZE = 256
+# Centrality metrics (see centrality.py) by label, which nodes can be sized by. They are only computed for the view a
+# session sizes nodes by.
+CENTRALITY_LABELS = {label: metric for metric, label in CENTRALITY_METRICS.items()}
+# Render attributes with more than this fraction of their entries changed are sent whole rather than entry by entry, as
+# a partial update of one entry is several times the size of the entry itself
+PATCH_MAX_FRACTION = 0.1
+
+class BoundedCache(OrderedDict):
+    '''A dict that forgets its oldest entries once it holds more than max_size entries. Windows of time make the number
+    of views of the formats grow with the square of the number of periods, so their display attributes are not all kept.
+    Callbacks add entries from several threads, so entries are added and evicted with a lock held, and looked up with
+    get, as an entry can be evicted between checking for it and reading it.'''
+    def __init__(self, max_size = VIEW_CACHE_SIZE):
+        super().__init__()
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            if len(self) > self.max_size:
+                self.popitem(last = False)
+
+# Applies a render from the graph-view store to the full graph data in the graph-base store, lightening every node whose
+# label does not contain the search text and every edge while there is search text. The search text is normalised the
+# same way as the search keys of the render (see search.normalize_name), so accents, case and punctuation are ignored.
+# Hidden nodes and edges are left out of the graph data altogether, so the browser only draws the elements shown. Node
+# positions come from the server-side layout in the render. When the render has an archetype graph, it is shown instead.
+APPLY_GRAPH_VIEW_JS = """
+function(view, search_text, data) {
+    if (!view || !data) {
+        return window.dash_clientside.no_update;
+    }
+    if (view.archetypes) {
+        return view.archetypes;
+    }
+    var search = (search_text || '').normalize('NFKD').replace(/\\p{M}/gu, '').toLowerCase()
+                                    .replace(/[^\\p{L}\\p{N}_']+/gu, ' ').trim();
+    var nodes = [];
+    data.nodes.forEach(function(node, i) {
+        if (view.nodes.hidden[i]) {
+            return;
+        }
+        var new_node = Object.assign({}, node);
+        Object.keys(view.nodes).forEach(function(attribute) {
+            new_node[attribute] = view.nodes[attribute][i];
+        });
+        var lighten = view.search_keys[i].indexOf(search) < 0;
+        new_node.color = lighten ? view.lightened[new_node.true_color] : new_node.true_color;
+        nodes.push(new_node);
+    });
+    var edges = [];
+    data.edges.forEach(function(edge, i) {
+        if (view.edges.hidden[i]) {
+            return;
+        }
+        var new_edge = Object.assign({}, edge);
+        new_edge.hidden = false;
+        new_edge.true_color = view.edges.true_color[i];
+        new_edge.color = {color: search ? view.lightened[new_edge.true_color] : new_edge.true_color};
+        edges.push(new_edge);
+    });
+    return {nodes: nodes, edges: edges};
+}
+"""
+
 class Mavis:
-    def __init__(self):
-        self.metagame = self._import_from_json('data/cards.json', 'data/edges.json')
-        self.format = 'All'
-        self.data = self.metagame.to_visdcc(self.format)
-        self.scaling_vars = get_node_and_edge_scaling_vars(self.data)
-        self.node_value_color_mapping = {}
-        self.edge_value_color_mapping = {}
-        self.nbhd_type = 'None'
-        self.search_text = ''
-        self.node_color_option = 'None'
-        self.size_nodes_option = 'None'
-        self.selection = {'nodes': [], 'edges':[]}
-        self.selected_nodes = None
+    def __init__(self, session_store = None):
+        self.metagame = self._import_metagame('data/metagame.snapshot', 'data/cards.json', 'data/edges.json')
+        # Similarity indexes are computed on first use, unless they were precomputed next to the data
+        if os.path.exists('data/similarity.snapshot'):
+            self.metagame.load_similarity('data/similarity.snapshot')
+        # Everything stored on the Mavis instance is shared by every user and must not change after startup.
+        # The settings each user has chosen are kept per session in the session store instead.
+        self.sessions = session_store if session_store is not None else create_session_store()
+        self.data = self.metagame.to_visdcc('All')
+        # Display attributes that only depend on the data, computed on first use and shared by every session
+        self._column_stats = BoundedCache()
+        self._shared_column_stats = None
+        self._node_counts = BoundedCache()
+        self._node_metrics = BoundedCache()
+        self._format_visibility = BoundedCache()
+        self._node_colors = BoundedCache()
+        self._positions = BoundedCache()
+        self._archetypes = BoundedCache()
+        self._value_codes = {}
+        self._lightened = BoundedCache()
+        self._archetype_graphs = BoundedCache()
+        self._search_keys = [normalize_name(node['label']) for node in self.data['nodes']]
+        self._detail_ranks = BoundedCache()
+        self._delta_nodes = BoundedCache()
+        # First day of every period of the metagame's history, empty if the dates of its decks are unknown
+        self.periods = self.metagame['All'].history.periods if self.metagame['All'].history is not None else []
+        # Index of every node of the graph data by card ID, and of the node of every card by card index (-1 if it has none)
+        self._node_index = {node['id']: i for i, node in enumerate(self.data['nodes'])}
+        self._card_nodes = np.array([self._node_index.get(card_id, -1) for card_id in self.metagame.card_ids], dtype=np.int64)
+        self._node_cards = np.array([self.metagame.card_index[node['id']] for node in self.data['nodes']], dtype=np.int64)
+        # Index of the nodes at either end of every edge of the graph data
+        self._edge_ends = (np.array([self._node_index[edge['from']] for edge in self.data['edges']], dtype=np.int64),
+                           np.array([self._node_index[edge['to']] for edge in self.data['edges']], dtype=np.int64))
         self.nbhd_names = {'neighbours': "Direct Neighbours",
                            '2-neighbours': '2-Neighbours'}
+        self.nbhd_hops = {'neighbours': 1,
+                          '2-neighbours': 2}
         self.app = self.create()
         self.app.title = 'MAVis'
     
     def _import_from_json(self, card_json_fp, edge_json_fp):
-        with open(card_json_fp, 'r') as card_file:
-            card_json = json.load(card_file)
-        with open(edge_json_fp, 'r') as edge_file:
-            edge_json = json.load(edge_file)
-        
-        metagame = Metagame(*[Card(card_name, **card_details) for card_name, card_details in card_json.items()])
-        for format_name, format_edges in tqdm(edge_json.items()):
-            edges = [Edge(metagame.cards_by_name(edge['key'][0])[0],
-                          metagame.cards_by_name(edge['key'][1])[0],
-                          **edge['value']) 
-                     for edge in format_edges if edge['value']['count'] > 5]
-            metagame.new_format(format_name, *edges)
-        
-        return metagame
+        return Metagame.from_json(card_json_fp, edge_json_fp)
+    
+    def _import_metagame(self, snapshot_fp, card_json_fp, edge_json_fp):
+        # Prefer the binary snapshot when one has been built, as it loads much faster than the JSON files.
+        # Snapshots are loaded straight into the array-backed metagame, so no card or edge objects are created up front.
+        if os.path.exists(snapshot_fp):
+            return ArrayMetagame.load_snapshot(snapshot_fp)
+        return self._import_from_json(card_json_fp, edge_json_fp)
 
-    def _callback_format_select(self, graph_data, format_selection):
-        self.format = format_selection
-        meta_format = self.metagame[format_selection]
-        for node in graph_data['nodes']:
-            node['Number of Decks'] = node['deck_count'].get(format_selection, 0)
-            node['Number of Copies'] = node['total_copies'].get(format_selection, 0)
-            node['visibility']['format'] = len(meta_format.edges_at(node['id'])) > 0
-            node['hidden'] = not all(node['visibility'].values())
-        for edge in graph_data['edges']:
-            edge['visibility']['format'] = meta_format.edge_by_id(edge['id']) is not None
-            edge['hidden'] = not all(edge['visibility'].values())
-        self.scaling_vars = get_node_and_edge_scaling_vars(graph_data)
-        graph_data = self._callback_size_nodes(graph_data)
-        graph_data = self._callback_show_nbhd(graph_data)
-        return graph_data
+    # Type, min, max and cardinality of every node and edge attribute in a format, computed once per format and window
+    # of time. Only the deck and copy counts differ between them, so the statistics of every other attribute are shared.
+    def _column_stats_for(self, format_name, window = None):
+        key = (format_name, window)
+        stats = self._column_stats.get(key)
+        if stats is None:
+            if self._shared_column_stats is None:
+                self._shared_column_stats = {'node': get_column_stats(self.data['nodes']), 'edge': get_column_stats(self.data['edges'])}
+            shared = self._shared_column_stats
+            stats = self._column_stats[key] = {'node': {**shared['node'],
+                                                        **{name: column_stats(values) for name, values in self._node_counts_for(format_name, window).items()}},
+                                               'edge': shared['edge']}
+        return stats
+
+    # Number of decks and copies of every node in the given format over the given window of time
+    def _node_counts_for(self, format_name, window = None):
+        key = (format_name, window)
+        counts = self._node_counts.get(key)
+        if counts is None:
+            meta_format = self._pruned_format(format_name, 'none', window)
+            counts = self._node_counts[key] = {'Number of Decks': meta_format.card_counts()[self._node_cards].tolist(),
+                                               'Number of Copies': meta_format.card_totals()[self._node_cards].tolist()}
+        return counts
+
+    # The centrality metric of the given label of every node in the given format once it is pruned
+    def _node_metric_for(self, format_name, label, pruning = 'none', window = None):
+        key = (format_name, label, pruning, window)
+        values = self._node_metrics.get(key)
+        if values is None:
+            meta_format = self._pruned_format(format_name, pruning, window)
+            values = self._node_metrics[key] = meta_format.centrality(CENTRALITY_LABELS[label])[self._node_cards].tolist()
+        return values
+
+    # The given format over the given window of time, a (first period, last period) pair or None for all of its
+    # history, pruned with the pruning preset of the given name. Windows and pruned formats are cached by the format.
+    def _pruned_format(self, format_name, pruning = 'none', window = None):
+        _, measure, threshold, top_k = PRUNING_PRESETS.get(pruning, PRUNING_PRESETS['none'])
+        meta_format = self.metagame[format_name]
+        if window is not None and meta_format.history is not None:
+            meta_format = meta_format.windowed(*window, min_count = DEFAULT_MIN_EDGE_COUNT)
+        return meta_format.pruned(measure, threshold, top_k)
+    
+    # The window of time of a session state, as a hashable (first period, last period) pair, or None for all of it
+    @staticmethod
+    def _window(state):
+        return tuple(state['window']) if state['window'] else None
+    
+    # Which nodes and edges have at least one edge in the given format once it is pruned
+    def _callback_format_select(self, format_selection, pruning = 'none', window = None):
+        key = (format_selection, pruning, window)
+        visibility = self._format_visibility.get(key)
+        if visibility is None:
+            meta_format = self._pruned_format(format_selection, pruning, window)
+            # Cards with node statistics are exactly the cards with at least one edge in the format
+            node_stats = meta_format.node_stats()
+            format_edge_ids = set(meta_format.edges)
+            visibility = self._format_visibility[key] = ([node['id'] in node_stats for node in self.data['nodes']],
+                                                         [edge['id'] in format_edge_ids for edge in self.data['edges']])
+        return visibility
+    
+    # The x and y position of every node in the layout of the given format once it is pruned. Nodes without edges in it
+    # keep their position in the initial graph data.
+    def _positions_for(self, format_name, pruning = 'none', window = None):
+        key = (format_name, pruning, window)
+        xy = self._positions.get(key)
+        if xy is None:
+            layout = self._pruned_format(format_name, pruning, window).layout()
+            positions = [layout.get(node['id'], (node['x'], node['y'])) for node in self.data['nodes']]
+            xy = self._positions[key] = {'x': [x for x, _ in positions], 'y': [y for _, y in positions]}
+        return xy
+    
+    # The archetype of every node in the given format once it is pruned, as an array of indices into the format's
+    # archetypes by decreasing size followed by NO_ARCHETYPE, and that list of archetypes
+    def _archetypes_for(self, format_name, pruning = 'none', window = None):
+        key = (format_name, pruning, window)
+        archetypes = self._archetypes.get(key)
+        if archetypes is None:
+            meta_format = self._pruned_format(format_name, pruning, window)
+            communities = meta_format.communities()
+            names = meta_format.archetype_names()
+            archetypes = self._archetypes[key] = (np.array([communities.get(node['id'], len(names)) for node in self.data['nodes']], dtype=np.int64),
+                                                  names + [NO_ARCHETYPE])
+        return archetypes
+    
+    # The value of the given node property of every node, as an array of indices into the list of its unique values,
+    # in order of first appearance, and that list
+    def _value_codes_for(self, node_property):
+        if node_property not in self._value_codes:
+            values = [node[node_property] for node in self.data['nodes']]
+            unique_values = list(dict.fromkeys(values))
+            index = {value: i for i, value in enumerate(unique_values)}
+            self._value_codes[node_property] = (np.array([index[value] for value in values], dtype=np.int64), unique_values)
+        return self._value_codes[node_property]
+    
+    # The collapsed view of the given format once it is pruned, with one node per archetype in the archetype's color
+    def _archetype_graph_for(self, format_name, pruning = 'none', window = None):
+        key = (format_name, pruning, window)
+        archetype_graph = self._archetype_graphs.get(key)
+        if archetype_graph is None:
+            archetype_graph = self._pruned_format(format_name, pruning, window).archetype_graph()
+            _, archetype_colors = self._callback_color_nodes(ARCHETYPE_ATTRIBUTE, format_name, pruning, window)
+            for node in archetype_graph['nodes']:
+                node['color'] = node['true_color'] = archetype_colors[node['label']]
+            self._archetype_graphs[key] = archetype_graph
+        return archetype_graph
     
     def _search_lighten_color(self, colstr, factor=0.9):
-        col_r = int(colstr[1:3],16)
-        col_r = int(255 - (1-factor)*(255-col_r))
-        col_r = hex(col_r)[2:]
-                
-        col_g = int(colstr[3:5],16)
-        col_g = int(255 - (1-factor)*(255-col_g))
-        col_g = hex(col_g)[2:]
-                
-        col_b = int(colstr[5:7],16)
-        col_b = int(255 - (1-factor)*(255-col_b))
-        col_b = hex(col_b)[2:]
-        
-        newcolstr = ('#' + col_r + col_g + col_b).upper()
-        return newcolstr
+        return lighten_colors([colstr], factor)[0]
     
-    def _callback_search_graph(self, graph_data, search_text):
-        nodes = graph_data['nodes']
-        edges = graph_data['edges']
-        for node in nodes:
-            if search_text.lower() not in node['label'].lower():
-                node['lighten']['search'] = True
-            else:
-                node['lighten']['search'] = False
-            node['color'] = node['true_color'] if not any(node['lighten'].values()) else self._search_lighten_color(node['true_color'])
-        graph_data['nodes'] = nodes
-        if search_text:
-            for edge in edges:
-                edge['lighten']['search'] = True
-                edge['color']['color'] = self._search_lighten_color(edge['true_color'])
-        else:
-            for edge in edges:
-                edge['lighten']['search'] = False
-                edge['color']['color'] = edge['true_color'] if not any(edge['lighten'].values()) else self._search_lighten_color(edge['true_color'])
-        return graph_data
+    # Node colors are cached by node property, and also by format, pruning and window for archetypes, which depend on them
+    @staticmethod
+    def _color_key(color_nodes_value, format_name, pruning, window):
+        return (color_nodes_value, format_name, pruning, window) if color_nodes_value == ARCHETYPE_ATTRIBUTE else color_nodes_value
     
-    def _callback_color_nodes(self, graph_data, color_nodes_value):
-        value_color_mapping = {}
+    # The color of every node when colored by the given node property, and the mapping of values to colors
+    def _callback_color_nodes(self, color_nodes_value, format_name = 'All', pruning = 'none', window = None):
         if color_nodes_value is None or color_nodes_value.lower() == 'none':
-            for node in graph_data['nodes']:
-                node['true_color'] = DEFAULT_NODE_COLOR
-                node['color'] = node['true_color'] if not any(node['lighten'].values()) else self.search_lighten_color(node['true_color'])
-        else:
-            unique_values = list(set([node[color_nodes_value] for node in graph_data['nodes']]))
+            return [DEFAULT_NODE_COLOR]*len(self.data['nodes']), {}
+        key = self._color_key(color_nodes_value, format_name, pruning, window)
+        node_colors = self._node_colors.get(key)
+        if node_colors is None:
+            # Archetypes keep their order, so the largest archetypes get the first colors
+            if color_nodes_value == ARCHETYPE_ATTRIBUTE:
+                codes, unique_values = self._archetypes_for(format_name, pruning, window)
+            else:
+                codes, unique_values = self._value_codes_for(color_nodes_value)
             colors = get_distinct_colors(len(unique_values))
-            value_color_mapping = {x:y for x,y in zip(unique_values, colors)}
-            for node in graph_data['nodes']:
-                node['true_color'] = value_color_mapping[node[color_nodes_value]]
-                node['color'] = node['true_color'] if not any(node['lighten'].values()) else self._search_lighten_color(node['true_color'])
-        return graph_data, value_color_mapping
+            node_colors = self._node_colors[key] = (np.array(colors, dtype=object)[codes].tolist(), dict(zip(unique_values, colors)))
+        return node_colors
     
-    def _callback_size_nodes(self, graph_data):
-        for node in graph_data['nodes']:
-            node['size'] = DEFAULT_NODE_SIZE
-        if self.size_nodes_option != 'None':
-            min_scale = self.scaling_vars['node'][self.size_nodes_option]['min']
-            max_scale = self.scaling_vars['node'][self.size_nodes_option]['max']
-            scale_val = lambda x: 20*(x-min_scale)/(max_scale - min_scale)
-            for node in graph_data['nodes']:
-                node['size'] = DEFAULT_NODE_SIZE + scale_val(node[self.size_nodes_option])
-        return graph_data
+    # The size of every node in the given format once it is pruned, over the given window of time, when sized by the
+    # given node property
+    def _callback_size_nodes(self, format_name, size_nodes_option, pruning = 'none', window = None):
+        if size_nodes_option is None or size_nodes_option == 'None':
+            return [DEFAULT_NODE_SIZE]*len(self.data['nodes'])
+        if size_nodes_option in CENTRALITY_LABELS:
+            values = self._node_metric_for(format_name, size_nodes_option, pruning, window)
+            min_scale, max_scale = min(values, default = 0), max(values, default = 0)
+        else:
+            node_stats = self._column_stats_for(format_name, window)['node']
+            min_scale = node_stats[size_nodes_option]['min']
+            max_scale = node_stats[size_nodes_option]['max']
+            values = self._node_counts_for(format_name, window).get(size_nodes_option, [node[size_nodes_option] for node in self.data['nodes']])
+        scale_val = lambda x: 20*(x-min_scale)/((max_scale - min_scale) or 1)
+        return [DEFAULT_NODE_SIZE + scale_val(value) for value in values]
     
-    def _callback_show_nbhd(self, graph_data):
-        self.selected_nodes = [node for node in graph_data['nodes'] if node['id'] in self.selection['nodes']]
-        
-        if self.selection['nodes']:
-            node_ids = self.selection['nodes']
-            nodes = []
-            edges = []
-            for node_id in node_ids:
-                source_node = self.metagame.cards_by_id(node_id)[0]
-                meta_format = self.metagame[self.format]
-                if self.nbhd_type == 'neighbours':
-                    new_nodes, new_edges = meta_format.direct_neighbours(source_node)
-                elif self.nbhd_type == '2-neighbours':
-                    new_nodes, new_edges = meta_format.n_neighbours(source_node, 2)
-                else:
-                    new_nodes = [node for node in self.metagame.cards.values()]
-                    new_edges = [edge for edge in self.metagame['All'].edges.values()]
-                nodes += new_nodes
-                edges += new_edges
-            nodes = list(set(nodes))
-            edges = list(set(edges))
-            nbhd_node_ids = [str(node.id) for node in nodes]
-            nbhd_edge_ids = [str(edge.id) for edge in edges]
-            for node in graph_data['nodes']:
-                if str(node['id']) in nbhd_node_ids:
-                    node['visibility']['nbhd'] = True
-                else:
-                    node['visibility']['nbhd'] = False
-                node['hidden'] = not all(node['visibility'].values())
-            for edge in graph_data['edges']:
-                if str(edge['id']) in nbhd_edge_ids:
-                    edge['visibility']['nbhd'] = True
-                else:
-                    edge['visibility']['nbhd'] = False
-                edge['hidden'] = not all(edge['visibility'].values())
+    # The format the view of a session is compared with: another format over all of its history, or the same format over
+    # the window of time of the same length just before the view's window. None if there is nothing to compare with.
+    def _comparison_for(self, format_name, window, compare):
+        if compare == 'previous':
+            if window is None or window[0] == 0:
+                return None
+            return self._pruned_format(format_name, 'none', (max(2*window[0] - window[1] - 1, 0), window[0] - 1))
+        return None if compare in [None, 'none'] else self._pruned_format(compare)
+    
+    # The color and size of every node by the change in its deck share from the compared format to the given format over
+    # the given window, with the mapping of changes to colors and the lightened variant of every color. None if there is
+    # nothing to compare with.
+    def _delta_nodes_for(self, format_name, window, compare):
+        key = (format_name, window, compare)
+        delta_nodes = self._delta_nodes.get(key)
+        if delta_nodes is None:
+            base = self._comparison_for(format_name, window, compare)
+            if base is None:
+                return None
+            deltas = base.diff(self._pruned_format(format_name, 'none', window)).card_delta[self._node_cards]
+            scale = np.abs(deltas).max() or 1
+            colors = np.array(DELTA_COLORS, dtype=object)[np.digitize(deltas/scale, DELTA_THRESHOLDS)].tolist()
+            lightened = list(dict.fromkeys(DELTA_COLORS + [DEFAULT_NODE_COLOR, DEFAULT_EDGE_COLOR]))
+            delta_nodes = self._delta_nodes[key] = (colors, (DEFAULT_NODE_SIZE + 20*np.abs(deltas)/scale).tolist(), dict(zip(DELTA_LABELS, DELTA_COLORS)),
+                                                    dict(zip(lightened, lighten_colors(lightened))))
+        return delta_nodes
+    
+    # The mapping of node values to colors shown in the legend of a session
+    def _node_color_mapping(self, state):
+        delta_nodes = self._delta_nodes_for(state['format'], self._window(state), state['compare'])
+        if delta_nodes is not None:
+            return delta_nodes[2]
+        return self._callback_color_nodes(state['node_color_option'], state['format'], state['pruning'], self._window(state))[1]
+    
+    # Which nodes and edges are in the neighbourhood of the selected cards, following only the edges kept by pruning.
+    # Everything is when nothing is selected.
+    def _callback_show_nbhd(self, format_name, selection, nbhd_type, pruning = 'none', window = None):
+        if not selection['nodes'] or nbhd_type not in self.nbhd_hops:
+            return [True]*len(self.data['nodes']), [True]*len(self.data['edges'])
+        source_nodes = self.metagame.cards_by_id(*selection['nodes'])
+        nodes, edges, _ = self._pruned_format(format_name, pruning, window).neighbourhood(source_nodes, self.nbhd_hops[nbhd_type])
+        nbhd_node_ids = set([str(node.id) for node in nodes])
+        nbhd_edge_ids = set([str(edge.id) for edge in edges])
+        return ([str(node['id']) in nbhd_node_ids for node in self.data['nodes']],
+                [str(edge['id']) in nbhd_edge_ids for edge in self.data['edges']])
+    
+    # The rank of every node in the given format once it is pruned under the given level of detail metric, 0 being the
+    # most important. Nodes with no edges in the format rank last.
+    def _detail_ranks_for(self, format_name, pruning, metric, window = None):
+        key = (format_name, pruning, metric, window)
+        ranks = self._detail_ranks.get(key)
+        if ranks is None:
+            order = self._card_nodes[self._pruned_format(format_name, pruning, window).detail_order(metric)]
+            ranks = np.full(len(self.data['nodes']), len(self.data['nodes']), dtype=np.int64)
+            ranks[order[order >= 0]] = np.flatnonzero(order >= 0)
+            self._detail_ranks[key] = ranks
+        return ranks
+    
+    # Which of the candidate nodes are shown at the level of detail of a session: the node budget's worth of the most
+    # important candidates for every tier of detail shown, the selected cards, and the neighbours of every card that
+    # was expanded by selecting it. Every candidate is shown when there is no node budget.
+    def _callback_level_of_detail(self, state, candidates):
+        if state['node_budget'] == 'all':
+            return candidates
+        ranks = np.where(candidates, self._detail_ranks_for(state['format'], state['pruning'], state['detail_metric'], self._window(state)),
+                         len(candidates))
+        shown = np.zeros(len(candidates), dtype=bool)
+        shown[np.argsort(ranks, kind='stable')[:int(state['node_budget'])*(state['detail_tier'] + 1)]] = True
+        expanded = self.metagame.cards_by_id(*state['expanded'])
+        if expanded:
+            cards, _, _ = self._pruned_format(state['format'], state['pruning'], self._window(state)).neighbourhood(expanded, 1)
+            shown[[self._node_index[card.id] for card in cards if card.id in self._node_index]] = True
+        shown[[self._node_index[card_id] for card_id in state['selection']['nodes'] if card_id in self._node_index]] = True
+        return shown & candidates
+    
+    # Which nodes and edges are shown for the settings in a session state: those in the session's view of its format
+    # and neighbourhood, at its level of detail
+    def _shown(self, state):
+        window = self._window(state)
+        format_nodes, format_edges = self._callback_format_select(state['format'], state['pruning'], window)
+        nbhd_nodes, nbhd_edges = self._callback_show_nbhd(state['format'], state['selection'], state['nbhd_type'], state['pruning'], window)
+        shown_nodes = self._callback_level_of_detail(state, np.array(format_nodes) & np.array(nbhd_nodes))
+        sources, targets = self._edge_ends
+        return shown_nodes, np.array(format_edges) & np.array(nbhd_edges) & shown_nodes[sources] & shown_nodes[targets]
+    
+    # The displayed attributes of every node and edge for the settings in a session state, as one list per attribute.
+    # Search highlighting is applied on top of this in the browser, using the precomputed lightened variant of each color.
+    def _render(self, state):
+        window = self._window(state)
+        node_colors, _ = self._callback_color_nodes(state['node_color_option'], state['format'], state['pruning'], window)
+        shown_nodes, shown_edges = self._shown(state)
+        node_sizes = self._callback_size_nodes(state['format'], state['size_nodes_option'], state['pruning'], window)
+        lightened = self._lightened_colors(state['node_color_option'], state['format'], state['pruning'], window)
+        # Comparing colors and sizes nodes by the change in their deck share instead
+        delta_nodes = self._delta_nodes_for(state['format'], window, state['compare'])
+        if delta_nodes is not None:
+            node_colors, node_sizes, _, lightened = delta_nodes
+        return {'nodes': {'hidden': (~shown_nodes).tolist(),
+                          'true_color': node_colors,
+                          'size': node_sizes,
+                          **self._node_counts_for(state['format'], window),
+                          **self._positions_for(state['format'], state['pruning'], window)},
+                'edges': {'hidden': (~shown_edges).tolist(),
+                          'true_color': [DEFAULT_EDGE_COLOR]*len(self.data['edges'])},
+                'lightened': lightened,
+                'search_keys': self._search_keys,
+                'archetypes': self._archetype_graph_for(state['format'], state['pruning'], window) if state['archetype_view'] == 'archetypes' else None}
+    
+    # The lightened variant of every color the nodes and edges can take when colored by the given node property,
+    # computed once per palette
+    def _lightened_colors(self, color_nodes_value, format_name = 'All', pruning = 'none', window = None):
+        key = self._color_key(color_nodes_value, format_name, pruning, window)
+        lightened = self._lightened.get(key)
+        if lightened is None:
+            _, value_color_mapping = self._callback_color_nodes(color_nodes_value, format_name, pruning, window)
+            colors = list(dict.fromkeys(list(value_color_mapping.values()) + [DEFAULT_NODE_COLOR, DEFAULT_EDGE_COLOR]))
+            lightened = self._lightened[key] = dict(zip(colors, lighten_colors(colors)))
+        return lightened
+    
+    # Identifies the render of a session state. Renders are a function of the session state alone, so the browser can
+    # tell the server which render it shows by echoing this back.
+    @staticmethod
+    def _render_version(state):
+        return hashlib.blake2b(json.dumps(state, sort_keys = True).encode('utf-8'), digest_size = 16).hexdigest()
+    
+    # A partial update of a render that changes only the node and edge attributes that differ between two renders.
+    # Attributes where most entries changed, such as after a format switch, are replaced whole, so the update is never
+    # much larger than the render itself.
+    def _graph_patch(self, old_render, new_render):
+        patch = Patch()
+        for element in ['nodes', 'edges']:
+            for attribute, new_values in new_render[element].items():
+                old_values = old_render[element].get(attribute)
+                if old_values is None or len(old_values) != len(new_values):
+                    patch[element][attribute] = new_values
+                    continue
+                changed = [i for i, (old, new) in enumerate(zip(old_values, new_values)) if old != new]
+                if len(changed) > PATCH_MAX_FRACTION*len(new_values):
+                    patch[element][attribute] = new_values
+                    continue
+                for i in changed:
+                    patch[element][attribute][i] = new_values[i]
+        for key in ['lightened', 'archetypes']:
+            if old_render[key] != new_render[key]:
+                patch[key] = new_render[key]
+        return patch
+    
+    # Options of the jump to card dropdown for the text typed in it, best matches first. The dropdown also filters its
+    # options in the browser, so the typed text is added to the search value of each match to keep typo matches. The
+    # selected card is kept in the options so the dropdown can still display it.
+    def _jump_to_card_options(self, search_value, value, limit = 10):
+        card_ids = self.metagame.search(search_value, limit) if search_value else []
+        options = [{'label': card.name, 'value': str(card.id), 'search': card.name + ' ' + search_value}
+                   for card in self.metagame.cards_by_id(*card_ids)]
+        if value and value not in card_ids:
+            options = [{'label': card.name, 'value': str(card.id)} for card in self.metagame.cards_by_id(value)] + options
+        return options
+    
+    # The list of the cards most similar to the first selected card of a session over its whole format, among the cards
+    # shown in the session's view. Similarities are only precomputed over whole formats, so cards hidden by the window
+    # of time, pruning, neighbourhood or level of detail are left out rather than scored again.
+    def _similar_cards_children(self, state):
+        if not state['selection']['nodes']:
+            return [html.Div('Select a card to see the cards played like it.')]
+        shown_nodes, _ = self._shown(state)
+        candidates = self.metagame[state['format']].similar_cards(state['selection']['nodes'][0], DEFAULT_NEIGHBOURS, state['similarity_measure'])
+        similar = [(card, score) for card, score in candidates
+                   if card.id in self._node_index and shown_nodes[self._node_index[card.id]]][:SIMILAR_CARDS]
+        if not similar:
+            return [html.Div('No similar cards among the cards shown.')]
+        return [html.Ol([html.Li('{} ({:.2f})'.format(card.name, score)) for card, score in similar], style={'padding-left': 20})]
+    
+    # Returns the name and contents of the CSV export of the cards currently shown
+    def _export_nbhd(self, state, graph_data):
+        selected_nodes = [node for node in graph_data['nodes'] if node['id'] in state['selection']['nodes']]
+        if selected_nodes and state['nbhd_type'] in self.nbhd_names.keys():
+            name_str = ', '.join([node['label'] for node in selected_nodes]) + ' - ' + self.nbhd_names[state['nbhd_type']] + '.csv'
         else:
-            for node in graph_data['nodes']:
-                node['visibility']['nbhd'] = True
-                node['hidden'] = not all(node['visibility'].values())
-            for edge in graph_data['edges']:
-                edge['visibility']['nbhd'] = True
-                edge['hidden'] = not all(edge['visibility'].values())
-        return graph_data
+            name_str = 'Metagame Cards.csv'
+            
+        content_str = 'Name;Type;Count;Total\n'
+        content_str += '\n'.join([';'.join([str(node[key]) for key in ['label', 'Card Type', 'Number of Decks', 'Number of Copies']]) for node in graph_data['nodes']
+                                  if not node['hidden'] and node['id'] in self.metagame.cards])
+        return dict(content = content_str, filename = name_str)
+    
+    # Applies the setting that triggered the settings pane callback to the session state and returns a patch with the
+    # changes to the render. Only reads from and writes to the session state it is given, so any worker can serve any session.
+    def _update_settings(self, state, input_id, format_selection, nbhd_type, color_nodes_value, size_nodes_value, selection,
+                         jump_to_card = None, pruning = None, archetype_view = None, node_budget = None, detail_metric = None,
+                         date_window = None, compare_with = None, similarity_measure = None):
+        old_render = self._render(state)
+        self._apply_setting(state, input_id, format_selection, nbhd_type, color_nodes_value, size_nodes_value, selection,
+                            jump_to_card, pruning, archetype_view, node_budget, detail_metric, date_window, compare_with,
+                            similarity_measure)
+        return self._graph_patch(old_render, self._render(state))
+    
+    # Rebuilds the settings of a session whose state was lost from the values of the setting controls the browser shows,
+    # then applies the input that changed, and returns the whole render. The tier of detail and the cards expanded
+    # before the state was lost start over.
+    def _restore_settings(self, state, input_id, format_selection, nbhd_type, color_nodes_value, size_nodes_value, selection,
+                          jump_to_card = None, pruning = None, archetype_view = None, node_budget = None, detail_metric = None,
+                          date_window = None, compare_with = None, similarity_measure = None):
+        state.clear()
+        state.update(default_session_state())
+        values = [format_selection, nbhd_type, color_nodes_value, size_nodes_value, selection, jump_to_card, pruning,
+                  archetype_view, node_budget, detail_metric, date_window, compare_with, similarity_measure]
+        controls = {'select_format': format_selection, 'nbhd_type': nbhd_type, 'color_nodes': color_nodes_value,
+                    'size_nodes': size_nodes_value, 'pruning': pruning, 'archetype_view': archetype_view,
+                    'node_budget': node_budget, 'detail_metric': detail_metric, 'date_window': date_window,
+                    'compare_with': compare_with, 'similarity_measure': similarity_measure, 'graph': selection}
+        for control_id in [control_id for control_id, value in controls.items() if value is not None] + [input_id]:
+            self._apply_setting(state, control_id, *values)
+        return self._render(state)
+    
+    # Changes a session state for a new value of the setting control with the given id
+    def _apply_setting(self, state, input_id, format_selection, nbhd_type, color_nodes_value, size_nodes_value, selection,
+                       jump_to_card = None, pruning = None, archetype_view = None, node_budget = None, detail_metric = None,
+                       date_window = None, compare_with = None, similarity_measure = None):
+        # Changing what the graph shows starts over from the first tier of detail
+        if input_id in ['select_format', 'pruning', 'node_budget', 'detail_metric', 'date_window']:
+            state['detail_tier'] = 0
+            state['expanded'] = []
+        if input_id == 'select_format':
+            state['format'] = format_selection
+        if input_id == 'nbhd_type':
+            state['nbhd_type'] = nbhd_type
+        if input_id == 'color_nodes':
+            state['node_color_option'] = color_nodes_value
+        if input_id == 'size_nodes':
+            state['size_nodes_option'] = size_nodes_value
+        # The nodes of the archetype graph are not cards, so selecting them does not select a neighbourhood
+        if input_id == 'graph' and state['archetype_view'] != 'archetypes':
+            state['selection'] = selection
+            # Selecting cards while the level of detail is limited expands them, adding their neighbours to the graph
+            if state['node_budget'] != 'all':
+                state['expanded'] = list(dict.fromkeys(state['expanded'] + selection['nodes']))
+        if input_id == 'pruning':
+            state['pruning'] = pruning
+        if input_id == 'jump_to_card' and jump_to_card:
+            state['selection'] = {'nodes': [jump_to_card], 'edges': []}
+        if input_id == 'archetype_view':
+            state['archetype_view'] = archetype_view
+        if input_id == 'node_budget':
+            state['node_budget'] = node_budget
+        if input_id == 'detail_metric':
+            state['detail_metric'] = detail_metric
+        if input_id == 'more-detail-button':
+            state['detail_tier'] += 1
+        # The whole history is kept as no window, so it shares the display attributes of the full format
+        if input_id == 'date_window' and date_window:
+            state['window'] = None if list(date_window) == [0, len(self.periods) - 1] else list(date_window)
+        if input_id == 'compare_with':
+            state['compare'] = compare_with
+        if input_id == 'similarity_measure':
+            state['similarity_measure'] = similarity_measure
+        # Archetype and comparison colors change with the format, pruning and window as well as the color option
+        state['node_value_color_mapping'] = self._node_color_mapping(state)
     
     def create(self, directed = False, vis_opts = None):
         app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
-        app.layout = get_app_layout(self.data, 
-                                    list(self.metagame.formats.keys()), 
-                                    color_legends = self.get_color_popover_legend_children(),
-                                    directed = directed,
-                                    vis_opts = vis_opts)
+        # The JSON API answers queries from other tools straight from the metagame, without going through the callbacks
+        register_api(app.server, self.metagame)
+        layout = get_app_layout(self.data, 
+                                list(self.metagame.formats.keys()), 
+                                color_legends = self.get_color_popover_legend_children(),
+                                directed = directed,
+                                vis_opts = vis_opts,
+                                column_stats = self._column_stats_for('All'),
+                                detail_metrics = DETAIL_METRICS,
+                                node_metrics = CENTRALITY_METRICS,
+                                periods = self.periods,
+                                similarity_measures = SIMILARITY_MEASURES)
+        # Every page load starts a new session, identified by the id in the session-id store. The graph-view store holds
+        # the session's render, which the browser combines with the full graph data in the graph-base store and the
+        # search text to display the graph.
+        initial_render = self._render(default_session_state())
+        app.layout = lambda: html.Div([dcc.Store(id='session-id', storage_type='memory', data=new_session_id()),
+                                       dcc.Store(id='graph-view', storage_type='memory', data=initial_render),
+                                       dcc.Store(id='graph-view-version', storage_type='memory', data=self._render_version(default_session_state())),
+                                       dcc.Store(id='graph-base', storage_type='memory', data=self.data),
+                                       layout])
         
         @app.callback(
             Output('color-legend-popup', 'is_open'),
@@ -192,58 +592,102 @@ class Mavis:
             Output('export-csv', 'data'),
             Input('export-csv-button', 'n_clicks'),
             State('graph', 'data'),
+            State('session-id', 'data'),
             prevent_initial_call=True
         )
-        def export_nbhd(n, graph_data):
-            if self.selected_nodes and self.nbhd_type in self.nbhd_names.keys():
-                name_str = ', '.join([node['label'] for node in self.selected_nodes]) + ' - ' + self.nbhd_names[self.nbhd_type] + '.csv'
-            else:
-                name_str = 'Metagame Cards.csv'
-                
-            content_str = 'Name;Type;Count;Total\n'
-            content_str += '\n'.join([';'.join([str(node[key]) for key in ['label', 'Card Type', 'Number of Decks', 'Number of Copies']]) for node in graph_data['nodes'] if not node['hidden']])
-            return dict(content = content_str, filename = name_str)
+        def export_nbhd(n, graph_data, session_id):
+            return self._export_nbhd(self.sessions.get(session_id), graph_data)
+        
+        # Search highlighting and applying the render to the graph both happen in the browser, so typing in the search
+        # box never reaches the server.
+        app.clientside_callback(
+            APPLY_GRAPH_VIEW_JS,
+            Output('graph', 'data'),
+            [Input('graph-view', 'data'),
+             Input('search_graph', 'value')],
+            [State('graph-base', 'data')]
+        )
+        
+        # Card name search goes through the metagame's search index, which ranks matches and tolerates typos
+        @app.callback(
+            Output('jump_to_card', 'options'),
+            Input('jump_to_card', 'search_value'),
+            State('jump_to_card', 'value')
+        )
+        def jump_to_card_options(search_value, value):
+            return self._jump_to_card_options(search_value, value)
         
         @app.callback(
-            [Output('graph', 'data'),
-             Output('color-legend-popup', 'children')],
+            Output('graph', 'focus'),
+            Input('jump_to_card', 'value'),
+            prevent_initial_call=True
+        )
+        def focus_card(card_id):
+            if not card_id:
+                return dash.no_update
+            return {'Is_used': True, 'nodeId': card_id, 'options': {'scale': 1.5, 'animation': True}}
+        
+        @app.callback(
+            [Output('graph-view', 'data'),
+             Output('graph-view-version', 'data'),
+             Output('color-legend-popup', 'children'),
+             Output('similar-cards', 'children')],
             [Input('select_format', 'value'),
              Input('nbhd_type', 'value'),
-             Input('search_graph', 'value'),
              Input('color_nodes', 'value'),
              Input('size_nodes', 'value'),
-             Input('graph', 'selection')],
-            [State('graph', 'data')]
+             Input('graph', 'selection'),
+             Input('jump_to_card', 'value'),
+             Input('pruning', 'value'),
+             Input('archetype_view', 'value'),
+             Input('node_budget', 'value'),
+             Input('detail_metric', 'value'),
+             Input('more-detail-button', 'n_clicks'),
+             Input('date_window', 'value'),
+             Input('compare_with', 'value'),
+             Input('similarity_measure', 'value')],
+            [State('session-id', 'data'),
+             State('graph-view-version', 'data')]
         )
         def setting_pane_callback(format_selection,
                                   nbhd_type,
-                                  search_text,
                                   color_nodes_value,
                                   size_nodes_value,
                                   selection,
-                                  graph_data):
+                                  jump_to_card,
+                                  pruning,
+                                  archetype_view,
+                                  node_budget,
+                                  detail_metric,
+                                  more_detail_clicks,
+                                  date_window,
+                                  compare_with,
+                                  similarity_measure,
+                                  session_id,
+                                  graph_version):
+            state = self.sessions.get(session_id)
+            # Only the node and edge attributes that changed are sent back, as a partial update of the render
+            graph_patch = dash.no_update
+            version = dash.no_update
             #fetch the id of the option which triggered the callback
             ctx = dash.callback_context
             if ctx.triggered:
                 input_id = ctx.triggered[0]['prop_id'].split('.')[0]
-                if input_id == 'select_format':
-                    graph_data = self._callback_format_select(graph_data, format_selection)
-                if input_id == 'nbhd_type':
-                    self.nbhd_type = nbhd_type
-                    graph_data = self._callback_show_nbhd(graph_data)
-                if input_id == 'search_graph':
-                    graph_data = self._callback_search_graph(graph_data, search_text)
-                if input_id == 'color_nodes':
-                    graph_data, self.node_value_color_mapping = self._callback_color_nodes(graph_data, color_nodes_value)
-                if input_id == 'size_nodes':
-                    self.size_nodes_option = size_nodes_value
-                    graph_data = self._callback_size_nodes(graph_data)
-                if input_id == 'graph':
-                    self.selection = selection
-                    graph_data = self._callback_show_nbhd(graph_data)
+                settings = [format_selection, nbhd_type, color_nodes_value, size_nodes_value, selection, jump_to_card, pruning,
+                            archetype_view, node_budget, detail_metric, date_window, compare_with, similarity_measure]
+                # The partial update only applies to the render of the session's state. The browser shows another
+                # render when the session was evicted from the store or is kept by another worker's in-process store,
+                # in which case the store returns the default state, or when a response was lost or arrived out of
+                # order. The settings are then rebuilt from the controls and the whole render is sent.
+                if graph_version == self._render_version(state):
+                    graph_patch = self._update_settings(state, input_id, *settings)
+                else:
+                    graph_patch = self._restore_settings(state, input_id, *settings)
+                version = self._render_version(state)
+                self.sessions.set(session_id, state)
                 
-            color_popover_legend_children = self.get_color_popover_legend_children(self.node_value_color_mapping, self.edge_value_color_mapping)
-            return [graph_data, color_popover_legend_children]
+            color_popover_legend_children = self.get_color_popover_legend_children(state['node_value_color_mapping'], state['edge_value_color_mapping'])
+            return [graph_patch, version, color_popover_legend_children, self._similar_cards_children(state)]
         
         return app
         
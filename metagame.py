@@ -4,8 +4,49 @@ Created on Mon Sep 12 15:05:44 2022
 @author: ToupinC
 """
 
-from graph import Card, Edge, Path
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+import hashlib
+import json
+import threading
+import uuid
+import numpy as np
+from tqdm import tqdm
+from centrality import centrality, CENTRALITY_METRICS
+from clustering import louvain
+from diff import FormatDiff, DEFAULT_DIFF_MEASURE
+from graph import Card, Edge, Path, Adjacency, CardTable, CardViews, EdgeView, EdgeViews
+from history import History
+from jsonstream import iter_json_lists
+from layout import force_layout
+from pruning import edge_scores, estimate_deck_count
+from search import CardNameIndex
+from similarity import nearest_neighbours, write_similarity, read_similarity, DEFAULT_SIMILARITY_MEASURE, SIMILARITY_MEASURES
+from snapshot import write_snapshot, read_snapshot, encode_strings, decode_strings
 from visual_styles import DEFAULT_COLOR, DEFAULT_NODE_SIZE, DEFAULT_EDGE_WIDTH
+
+# Card IDs are derived from card names within this namespace, so every process that loads the same data agrees on them
+CARD_ID_NAMESPACE = uuid.UUID('5f0f6c1e-3d2b-4c57-9a59-6d6176697331')
+# Edges must appear in at least this many decks to be loaded into a format
+DEFAULT_MIN_EDGE_COUNT = 6
+# Number of neighbourhood queries remembered per format
+NBHD_CACHE_SIZE = 256
+# Number of windows of time remembered per format
+WINDOW_CACHE_SIZE = 64
+# Metrics cards can be ranked by for level of detail, with their labels
+DETAIL_METRICS = {'deck_count': 'Number of Decks',
+                  'degree': 'Number of Neighbours',
+                  'weighted_degree': 'Weighted Degree (Decks)',
+                  **CENTRALITY_METRICS}
+# Cumulative arrays of a history, as stored in snapshots
+HISTORY_COLUMNS = ['edge_count', 'edge_total', 'card_count', 'card_total', 'deck_count']
+# Degree statistics of a card with no edges in a format
+EMPTY_NODE_STATS = {'degree': 0,
+                    'two_hop_reach': 0,
+                    'weighted_degree_count': 0.0,
+                    'weighted_degree_total': 0.0,
+                    'clustering': 0.0}
        
 class Format:
     '''A format in a metagame contains a set of edges between cards in the game. It is similar to a graph 
@@ -13,84 +54,460 @@ class Format:
     def __init__(self, metagame, format_name, *edges):
         if not all([isinstance(edge, Edge) for edge in edges]):
             raise TypeError("All edges must be valid Edge objects.")
-        if not all([(edge.source  in metagame.cards.values()) and (edge.target in metagame.cards.values()) for edge in edges]):
+        if not all([(metagame.cards.get(edge.source.id) is edge.source) and (metagame.cards.get(edge.target.id) is edge.target) for edge in edges]):
             raise ValueError("All edges must be between nodes in the market.")
-        # Ensure there are no duplicate edges within a sector. 
-        #Duplicate edges being passed to the app layer prevents anything from displaying.
-        edges = sorted(list(edges), key = lambda x: str(x))
-        for i in reversed(range(len(edges)-1)):
-            if str(edges[i]) == str(edges[i+1]):
-                del edges[i]
-       
-        
         self.metagame = metagame
         self.name = format_name
         # Hash edges so they can be quickly retrieved by their IDs, their source node IDs, or their target node IDs.
-        self.edges = {edge.id: edge for edge in edges}
-        self.edges_at_card = {card.id: [edge for edge in edges if edge.source.id == card.id or edge.target.id == card.id] 
-                              for card in metagame.cards.values()}
+        self.edges = {}
+        # Edges are also hashed by the unordered pair of cards they connect, which is what makes two edges duplicates.
+        self.edges_by_pair = {}
+        self.edges_at_card = {card_id: [] for card_id in metagame.cards}
+        # Guards the caches that threads evict entries from, and the replacement of every cache by _invalidate
+        self._cache_lock = threading.Lock()
+        self._init_caches()
+        # Array-backed copy of the edges, built on first use. Edge i of the arrays is self._edge_list[i].
+        self._arrays = None
+        self._edge_list = None
+        # Number of decks the format was aggregated from, or None if unknown, in which case it is estimated when needed
+        self.n_decks = None
+        # Per period counts of the format's edges and cards (see history.History), or None if they are unknown
+        self.history = None
+        # Deck count and copies arrays of the cards, by card index, for formats whose card counts are not those of the
+        # metagame's cards, such as windows of time. None to use the metagame's.
+        self.card_stats = None
+        # Format whose layout positions the cards of this format keep, or None to lay this format out on its own
+        self.layout_base = None
+        # Ensure there are no duplicate edges within a format. 
+        #Duplicate edges being passed to the app layer prevents anything from displaying.
+        for edge in edges:
+            self._index_edge(edge)
+        # Cleared once all the edges are indexed rather than after each one
+        self._invalidate()
         return
     
-    # Handles the minutia of adding a new edge to a sector
+    # Unordered pair of card IDs an edge connects. Edges are undirected so C1 -- C2 and C2 -- C1 share a key.
+    @staticmethod
+    def _pair_key(edge):
+        return frozenset((edge.source.id, edge.target.id))
+    
+    # Adds an edge to the format's hashes unless it duplicates an existing edge. Returns whether the edge was added.
+    def _index_edge(self, edge):
+        pair_key = self._pair_key(edge)
+        if edge.id in self.edges or pair_key in self.edges_by_pair:
+            return False
+        self.edges[edge.id] = edge
+        self.edges_by_pair[pair_key] = edge
+        self.edges_at_card.setdefault(edge.source.id, []).append(edge)
+        if not edge.is_loop():
+            self.edges_at_card.setdefault(edge.target.id, []).append(edge)
+        return True
+    
+    # Sets up empty caches of everything computed from the format's edges. Every cache is created here, so that
+    # _invalidate clears all of them in every kind of format.
+    def _init_caches(self):
+        # Recently requested neighbourhoods, most recently used last. The least recently used entries of this and of
+        # the windows are evicted as threads add others, so both are only used with the cache lock held.
+        self._nbhd_cache = OrderedDict()
+        # Per-card degree statistics, computed in bulk on first use
+        self._node_stats = None
+        # Per-card layout positions, computed on first use
+        self._layout = None
+        # Per-card archetypes by edge weight, computed on first use
+        self._communities = {}
+        # Archetype names by edge weight, computed on first use
+        self._archetype_names = {}
+        # Cards ranked by each level of detail metric, computed on first use
+        self._detail_orders = {}
+        # Most similar cards of every card by similarity measure, computed on first use or loaded with
+        # Metagame.load_similarity
+        self._similarity = {}
+        # Per-card values of each centrality metric, computed on first use
+        self._centrality = {}
+        # Edge scores by measure and pruned formats by pruning setting, computed on first use
+        self._edge_scores = {}
+        self._pruned = {}
+        # Recently requested windows of time, most recently used last
+        self._windows = OrderedDict()
+        # Deck count and copies arrays of the metagame's cards in this format, built on first use
+        self._card_arrays = None
+    
+    # Clears everything computed from the format's edges. Called whenever the edges or the metagame's cards change.
+    # The caches are replaced rather than emptied, so results computed from the old edges by other threads are stored
+    # in the old caches, which are no longer read.
+    def _invalidate(self, rebuild_arrays = True):
+        with self._cache_lock:
+            self._init_caches()
+            if rebuild_arrays:
+                self._reset_arrays()
+    
+    # Drops the array-backed copy of the edges, so it is rebuilt from the edges on next use
+    def _reset_arrays(self):
+        self._arrays = None
+        self._edge_list = None
+    
+    # The format's edges as an Adjacency over the metagame's card indices. Neighbourhoods and statistics are computed on it.
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            self._edge_list = list(self.edges.values())
+            self._arrays = Adjacency.from_edges(self._edge_list, self.metagame.card_index)
+        return self._arrays
+    
+    # Retrieve the edge at index i of the format's arrays
+    def _edge_at(self, i):
+        self.arrays
+        return self._edge_list[i]
+    
+    # Returns a new format with only the edges that appear in at least min_count decks
+    def filtered(self, min_count):
+        return self._subset(self.arrays.count >= min_count)
+    
+    # Returns a new format with only the edges selected by a boolean mask over the format's arrays
+    def _subset(self, keep):
+        subset = Format(self.metagame, self.name, *[self._edge_at(i) for i in np.flatnonzero(keep).tolist()])
+        return self._derive(subset)
+    
+    # Returns a new format with only the edges selected by a boolean mask over the format's arrays, with new deck counts
+    # and copies given for every edge of the format's arrays
+    def _recounted(self, keep, count, total):
+        return Format(self.metagame, self.name, *[Edge(edge.source, edge.target, edge_count, edge_total, edge.id)
+                                                  for edge, edge_count, edge_total in zip([self._edge_at(i) for i in np.flatnonzero(keep).tolist()],
+                                                                                          count[keep].tolist(), total[keep].tolist())])
+    
+    # Gives a format derived from this one, with a subset of its edges, the same decks, card counts and layout base
+    def _derive(self, subset):
+        subset.n_decks = self.n_decks
+        subset.card_stats = self.card_stats
+        subset.layout_base = self.layout_base
+        return subset
+    
+    # Number of decks each card appears in, in this format, as an array indexed by card
+    def card_counts(self):
+        if self.card_stats is not None:
+            return self.card_stats[0]
+        return self._metagame_card_arrays()[0]
+    
+    # Number of copies of each card over the decks of this format, as an array indexed by card
+    def card_totals(self):
+        if self.card_stats is not None:
+            return self.card_stats[1]
+        return self._metagame_card_arrays()[1]
+    
+    # Deck count and copies arrays of the metagame's cards in this format, read from the cards once. They are shared by
+    # every caller, so they are read-only.
+    def _metagame_card_arrays(self):
+        if self._card_arrays is None:
+            cards = [self.metagame.card_at(i) for i in range(len(self.metagame.card_ids))]
+            self._card_arrays = (np.array([card.count.get(self.name, 0) for card in cards], dtype=np.int64),
+                                 np.array([card.total.get(self.name, 0) for card in cards], dtype=np.int64))
+            for array in self._card_arrays:
+                array.flags.writeable = False
+        return self._card_arrays
+    
+    # Number of decks in the format, estimated from the card and edge counts if it is not known
+    def deck_count(self):
+        if self.n_decks is not None:
+            return self.n_decks
+        card_counts = self.card_counts()
+        return estimate_deck_count(self.arrays.count, card_counts[self.arrays.source], card_counts[self.arrays.target])
+    
+    # Returns an array with the score of every edge of the format's arrays under the given measure (see pruning.MEASURES)
+    def edge_scores(self, measure):
+        if measure not in self._edge_scores:
+            card_counts = self.card_counts()
+            self._edge_scores[measure] = edge_scores(measure, self.arrays.count, card_counts[self.arrays.source],
+                                                     card_counts[self.arrays.target], self.deck_count())
+        return self._edge_scores[measure]
+    
+    # Returns a new format with only the edges scoring at least threshold under the given measure, further reduced to
+    # the top_k highest scoring edges of each card if top_k is given. Pruned formats are cached by setting.
+    def pruned(self, measure = None, threshold = None, top_k = None):
+        if measure is None:
+            return self
+        key = (measure, threshold, top_k)
+        if key not in self._pruned:
+            scores = self.edge_scores(measure)
+            keep = np.ones(len(scores), dtype=bool) if threshold is None else scores >= threshold
+            if top_k is not None:
+                keep &= self.arrays.top_k(np.where(keep, scores, -np.inf), top_k)
+            self._pruned[key] = self._subset(keep)
+        return self._pruned[key]
+    
+    # Returns a new format with the deck counts and copies of its edges and cards over periods start to end of the
+    # format's history, both included, without the edges that appear in fewer than min_count decks over them. Its cards
+    # keep their positions in this format's layout, so the graph does not move as the window changes. The most recently
+    # requested windows are cached.
+    def windowed(self, start, end, min_count = 1):
+        if self.history is None:
+            raise ValueError("Format '{}' has no history.".format(self.name))
+        key = (start, end, min_count)
+        with self._cache_lock:
+            windows = self._windows
+            window = windows.get(key)
+            if window is not None:
+                windows.move_to_end(key)
+                return window
+        count, total = self.history.edge_counts(start, end)
+        window = self._recounted(count >= max(min_count, 1), count, total)
+        window.n_decks = self.history.decks(start, end)
+        window.card_stats = self.history.card_counts(start, end, len(self.metagame.card_ids))
+        window.layout_base = self if self.layout_base is None else self.layout_base
+        with self._cache_lock:
+            windows[key] = window
+            if len(windows) > WINDOW_CACHE_SIZE:
+                windows.popitem(last = False)
+        return window
+    
+    # Returns the changes in deck share and co-occurrence strength of every card and card pair from this format to
+    # another format of the same metagame, such as this format over another window of time (see diff.FormatDiff)
+    def diff(self, other, measure = DEFAULT_DIFF_MEASURE):
+        return FormatDiff(self, other, measure)
+    
+    # Handles the minutia of adding a new edge to a format
     def add(self, new_edge):
         if not isinstance(new_edge, Edge):
             raise TypeError("Can only add valid edge objects to a format.")
-        if new_edge.source.id not in self.market.node_table or new_edge.target.id not in self.market.nodes:
+        if new_edge.source.id not in self.metagame.cards or new_edge.target.id not in self.metagame.cards:
             raise ValueError("Edges must be between existing cards.")
         # Ensure edge is not a duplicate. Duplicate edges cause errors in the app layer
-        if new_edge.id not in self.edges and str(new_edge) not in [str(edge) for edge in self.edges.values()]:
-            self.edges[new_edge.id] = new_edge
+        if self._index_edge(new_edge):
+            self._invalidate()
+            # The history has no counts for the new edge
+            self.history = None
         return
     
+    # Retrieve an edge by the pair of cards it connects, in either order
+    def edge_between(self, card_a, card_b):
+        return self.edges_by_pair.get(frozenset((card_a.id, card_b.id)), None)
     # Retrieve edges by its ID
     def edge_by_id(self, edge_id):
         return self.edges.get(edge_id, None)
     # Retrieve edges by their source or target card ID
     def edges_at(self, card_id):
-        return self.edges_at_card.get(card_id, None)
+        return self.edges_at_card.get(card_id, [])
     
     # Given a particular card, returns the cards that are one edge away in any direction and the edges that connect them.
     def direct_neighbours(self, src_card):
-        if not isinstance(src_card, Card):
-            raise TypeError("Can only find the neighbourhood of a card.")
-        edges = self.edges_at(src_card.id)
-        cards = [src_card] + [edge.target for edge in edges] + [edge.source for edge in edges]
-        
-        return list(set(cards)), list(set(edges))
+        return self.n_neighbours(src_card, 1)
     
     # Given a particular card, returns the cards that are at most n edges away in any direction and the edges that connect them.
     def n_neighbours(self, src_card, n):
         if not isinstance(src_card, Card):
             raise TypeError("Can only find the neighbourhood of a card.")
-        cards = [src_card]
-        edges = []
-        for i in range(n):
-            for card in cards.copy():
-                new_cards, new_edges = self.direct_neighbours(src_card)
-                cards += new_cards
-                edges += new_edges
-        return list(set(cards)), list(set(edges))
-    
-    # Returns a dict with nodes and edges data formatted for the app layer to interpret it.
-    def to_visdcc(self):
+        cards, edges, _ = self.neighbourhood([src_card], n)
+        return cards, edges
+    
+    # Breadth-first search outwards from a set of seed cards. Returns the cards at most n edges away from any seed,
+    # the edges traversed to reach them, and a dict of each card's ID to its distance in hops from the nearest seed.
+    # If min_count is given, edges that appear in fewer decks than min_count are not traversed.
+    def neighbourhood(self, src_cards, n, min_count = None):
+        if not all([isinstance(src_card, Card) for src_card in src_cards]):
+            raise TypeError("Can only find the neighbourhood of a card.")
+        key = (frozenset([src_card.id for src_card in src_cards]), n, min_count)
+        # The neighbourhood is stored in the cache it was looked up in, which _invalidate replaces if the edges change
+        # during the search
+        with self._cache_lock:
+            nbhd_cache = self._nbhd_cache
+            nbhd = nbhd_cache.get(key)
+            if nbhd is not None:
+                nbhd_cache.move_to_end(key)
+        if nbhd is None:
+            nbhd = self._bfs(src_cards, n, min_count)
+            with self._cache_lock:
+                nbhd_cache[key] = nbhd
+                if len(nbhd_cache) > NBHD_CACHE_SIZE:
+                    nbhd_cache.popitem(last = False)
+        cards, edges, distances = nbhd
+        return list(cards), list(edges), dict(distances)
+    
+    def _bfs(self, src_cards, n, min_count):
+        seeds = [self.metagame.card_index[src_card.id] for src_card in src_cards]
+        distances, edge_mask = self.arrays.bfs(seeds, n, min_count)
+        reached = np.flatnonzero(distances >= 0).tolist()
+        cards = tuple([self.metagame.card_at(i) for i in reached])
+        edges = tuple([self._edge_at(i) for i in np.flatnonzero(edge_mask).tolist()])
+        return cards, edges, {card.id: hops for card, hops in zip(cards, distances[reached].tolist())}
+    
+    # Returns a dict of card ID to that card's degree statistics in this format. Cards with no edges are omitted.
+    def node_stats(self):
+        if self._node_stats is None:
+            self._node_stats = self._compute_node_stats()
+        return self._node_stats
+    
+    # Retrieve the degree statistics of a single card by its ID
+    def stats_at(self, card_id):
+        return self.node_stats().get(card_id, EMPTY_NODE_STATS)
+    
+    # Computes the degree statistics of every card at once on the format's arrays
+    def _compute_node_stats(self):
+        stats = self.arrays.node_stats()
+        names = list(stats)
+        columns = [stats[name].tolist() for name in names]
+        return {self.metagame.card_ids[i]: {name: column[i] for name, column in zip(names, columns)}
+                for i in np.flatnonzero(stats['degree']).tolist()}
+    
+    # Returns a dict of card ID to that card's (x, y) position in the format's layout. Cards with no edges are omitted.
+    # Formats with a layout base reuse its positions, as their cards are a subset of its cards.
+    def layout(self):
+        if self._layout is None:
+            active = np.flatnonzero(self.arrays.degree())
+            if self.layout_base is not None:
+                base_layout = self.layout_base.layout()
+                self._layout = {self.metagame.card_ids[i]: base_layout[self.metagame.card_ids[i]] for i in active.tolist()}
+            else:
+                positions = force_layout(self.arrays, active).round(1).tolist()
+                self._layout = {self.metagame.card_ids[i]: tuple(position) for i, position in zip(active.tolist(), positions)}
+        return self._layout
+    
+    # Returns a dict of card ID to the archetype of that card in this format, numbered from 0 by decreasing size.
+    # Archetypes are communities of the format's graph with edges weighted by weight, 'count' or 'total' (see
+    # clustering.louvain). Cards with no edges are omitted.
+    def communities(self, weight = 'count'):
+        if weight not in ('count', 'total'):
+            raise ValueError("Unknown edge weight '{}'.".format(weight))
+        if weight not in self._communities:
+            active = np.flatnonzero(self.arrays.degree())
+            labels = louvain(self.arrays.matrix(active, getattr(self.arrays, weight)))
+            self._communities[weight] = {self.metagame.card_ids[i]: label for i, label in zip(active.tolist(), labels.tolist())}
+        return self._communities[weight]
+    
+    # Returns the name of every archetype of communities(weight), in order, after its card played in the most decks
+    def archetype_names(self, weight = 'count'):
+        if weight not in self._archetype_names:
+            card_counts = self.card_counts()
+            most_played = {}
+            for card_id, label in self.communities(weight).items():
+                i = self.metagame.card_index[card_id]
+                if label not in most_played or card_counts[i] > card_counts[most_played[label]]:
+                    most_played[label] = i
+            self._archetype_names[weight] = ['{}. {}'.format(label + 1, self.metagame.card_at(most_played[label]).name)
+                                             for label in range(len(most_played))]
+        return self._archetype_names[weight]
+    
+    # Returns a dict with nodes and edges data formatted for the app layer, with one node per archetype of
+    # communities(weight), placed at the centre of its cards in the format's layout, and one edge per pair of
+    # archetypes with the deck counts and copies of every edge between them summed.
+    def archetype_graph(self, weight = 'count'):
+        communities = self.communities(weight)
+        names = self.archetype_names(weight)
+        layout = self.layout()
+        community = np.full(len(self.metagame.card_ids), -1, dtype=np.int64)
+        community[[self.metagame.card_index[card_id] for card_id in communities]] = list(communities.values())
+        members = np.bincount(community[community >= 0], minlength=len(names))
+        positions = np.array([layout[card_id] for card_id in communities]).reshape(-1, 2)
+        labels = np.array(list(communities.values()), dtype=np.int64)
+        x = np.bincount(labels, weights=positions[:, 0], minlength=len(names))/np.maximum(members, 1)
+        y = np.bincount(labels, weights=positions[:, 1], minlength=len(names))/np.maximum(members, 1)
+        source, target = community[self.arrays.source], community[self.arrays.target]
+        between = source != target
+        low, high = np.minimum(source, target)[between], np.maximum(source, target)[between]
+        pairs, inverse = np.unique(low*len(names) + high, return_inverse=True)
+        count = np.bincount(inverse, weights=self.arrays.count[between], minlength=len(pairs))
+        total = np.bincount(inverse, weights=self.arrays.total[between], minlength=len(pairs))
+        max_count = count.max() if len(count) else 1
+        node_id = lambda label: 'archetype-{}'.format(label)
+        visdcc_nodes = [{
+            'id': node_id(label),
+            'label': name,
+            'Card Type': 'Archetype',
+            'shape': 'dot',
+            'size': DEFAULT_NODE_SIZE*np.sqrt(n_members),
+            'hidden': False,
+            'color': DEFAULT_COLOR,
+            'true_color': DEFAULT_COLOR,
+            'Number of Cards': n_members,
+            'x': node_x,
+            'y': node_y
+            } for label, (name, n_members, node_x, node_y) in enumerate(zip(names, members.tolist(), x.round(1).tolist(), y.round(1).tolist()))]
+        visdcc_edges = [{
+            'id': node_id(low) + '__' + node_id(high),
+            'from': node_id(low),
+            'to': node_id(high),
+            'count': int(edge_count),
+            'total': int(edge_total),
+            'hidden': False,
+            'color': {'color': DEFAULT_COLOR},
+            'width': DEFAULT_EDGE_WIDTH*(1 + 9*edge_count/max_count)
+            } for low, high, edge_count, edge_total in zip((pairs // len(names)).tolist(), (pairs % len(names)).tolist(),
+                                                           count.tolist(), total.tolist())]
+        return {'nodes': visdcc_nodes, 'edges': visdcc_edges}
+    
+    # Returns the indices of the cards with edges in this format, from most to least important under the given level of
+    # detail metric (see DETAIL_METRICS). Ties are broken by card index.
+    def detail_order(self, metric = 'deck_count'):
+        if metric not in DETAIL_METRICS:
+            raise ValueError("Unknown detail metric '{}'.".format(metric))
+        if metric not in self._detail_orders:
+            degree = self.arrays.degree()
+            if metric == 'deck_count':
+                values = self.card_counts()
+            elif metric == 'degree':
+                values = degree
+            elif metric in CENTRALITY_METRICS:
+                values = self.centrality(metric)
+            else:
+                values = np.bincount(np.repeat(np.arange(len(degree)), degree), weights=self.arrays.count[self.arrays.edge_index],
+                                     minlength=len(degree))
+            active = np.flatnonzero(degree)
+            self._detail_orders[metric] = active[np.lexsort((active, -values[active]))]
+        return self._detail_orders[metric]
+    
+    # Returns the value of the given centrality metric (see centrality.py) of every card, by card index. Pruned formats
+    # and windows of time are formats of their own, so their centralities are cached with them.
+    def centrality(self, metric):
+        if metric not in CENTRALITY_METRICS:
+            raise ValueError("Unknown centrality metric '{}'.".format(metric))
+        if metric not in self._centrality:
+            self._centrality[metric] = centrality(self.arrays, metric)
+        return self._centrality[metric]
+    
+    # Returns the index of the most similar cards of every card under the given measure (see similarity.py)
+    def similarity_index(self, measure = DEFAULT_SIMILARITY_MEASURE):
+        if measure not in self._similarity:
+            self._similarity[measure] = nearest_neighbours(self.arrays, measure)
+        return self._similarity[measure]
+    
+    # Returns the n cards most similar to the card with the given ID under the given measure, as (card, similarity)
+    # pairs from most to least similar. Cards played with the same cards are similar, so these are often substitutes.
+    def similar_cards(self, card_id, n = 10, measure = DEFAULT_SIMILARITY_MEASURE):
+        if card_id not in self.metagame.card_index:
+            return []
+        cards, scores = self.similarity_index(measure).similar(self.metagame.card_index[card_id], n)
+        return [(self.metagame.card_at(i), score) for i, score in zip(cards.tolist(), scores.tolist())]
+    
+    # Returns a dict with nodes and edges data formatted for the app layer to interpret it. If max_nodes is given, only
+    # the max_nodes most important cards under the given level of detail metric and the edges between them are included.
+    def to_visdcc(self, max_nodes = None, metric = 'deck_count'):
+        node_stats = self.node_stats()
+        shown = None if max_nodes is None else set([self.metagame.card_ids[i] for i in self.detail_order(metric)[:max_nodes].tolist()])
+        layout = self.layout()
+        communities = self.communities()
+        archetype_names = self.archetype_names()
         visdcc_nodes = [{
             'id': card.id, 
             'label': card.name, 
             'Card Type': card.type, 
             'shape': 'dot',
             'size': DEFAULT_NODE_SIZE,
-            'hidden': len(self.edges_at(card.id))==0,
+            'hidden': False,
             'color': DEFAULT_COLOR,
             'true_color': DEFAULT_COLOR,
             'deck_count': card.count,
             'Number of Decks': card.count[self.name],
             'total_copies': card.total,
             'Number of Copies': card.total[self.name],
-            'Number of Neighbours': 1+len(self.edges_at(card.id)),
-            'Number of 2-Neighbours': 1+len(self.n_neighbours(card, 2)[1]),
-            'visibility': {'default': len(self.edges_at(card.id))>0},
+            'Number of Neighbours': 1+node_stats[card.id]['degree'],
+            'Number of 2-Neighbours': 1+node_stats[card.id]['two_hop_reach'],
+            'Weighted Degree (Decks)': node_stats[card.id]['weighted_degree_count'],
+            'Weighted Degree (Copies)': node_stats[card.id]['weighted_degree_total'],
+            'Clustering Coefficient': node_stats[card.id]['clustering'],
+            'Archetype': archetype_names[communities[card.id]],
+            'x': layout[card.id][0],
+            'y': layout[card.id][1],
+            'visibility': {'default': True},
             'lighten': {'default': False}
-            } for card in self.metagame.cards.values() if len(self.edges_at(card.id))>0]
+            } for card in self.metagame.cards.values() if card.id in node_stats and (shown is None or card.id in shown)]
         visdcc_edges = [{
             'id': edge.id,
             'name': edge.id,
@@ -105,7 +522,7 @@ class Format:
             'width': DEFAULT_EDGE_WIDTH,
             'visibility': {'default': True},
             'lighten': {'default': False}
-            } for edge in self.edges.values()]
+            } for edge in self.edges.values() if shown is None or (edge.source.id in shown and edge.target.id in shown)]
         return {'nodes': visdcc_nodes, 'edges': visdcc_edges}
                 
 class Metagame():
@@ -114,7 +531,101 @@ class Metagame():
         if any([not isinstance(card, Card) for card in cards]):
             raise TypeError("Can only import card objects into a metagame.")
         self.cards = {card.id: card for card in cards}
+        # Index cards by name so edges can be resolved to their endpoints without scanning every card. When several
+        # cards share a name, the first one added keeps it, as in add_cards and CardTable.
+        self.cards_by_name_index = {}
+        for card in self.cards.values():
+            self.cards_by_name_index.setdefault(card.name, card)
+        # Every card also has an integer index, in the order cards were added, which the formats' arrays refer to.
+        self.card_ids = list(self.cards)
+        self.card_index = {card_id: i for i, card_id in enumerate(self.card_ids)}
+        self._search_index = None
         self.formats = {}
+    
+    #Takes in the card and edge JSON files produced by the scraper and returns the metagame they describe.
+    #Edges that appear in fewer than min_count decks are dropped.
+    @classmethod
+    def from_json(cls, card_json_fp, edge_json_fp, min_count = DEFAULT_MIN_EDGE_COUNT):
+        with open(card_json_fp, 'r') as card_file:
+            card_json = json.load(card_file)
+        
+        metagame = cls(*[Card(card_name, node_id = uuid.uuid5(CARD_ID_NAMESPACE, card_name), **card_details)
+                         for card_name, card_details in card_json.items()])
+        # The edge file is streamed one edge at a time, so only the edges that pass the threshold are ever held in memory
+        for format_name, format_edges in tqdm(groupby(iter_json_lists(edge_json_fp), key = itemgetter(0))):
+            edges = [Edge(metagame.card_by_name(edge['key'][0]),
+                          metagame.card_by_name(edge['key'][1]),
+                          **edge['value']) 
+                     for _, edge in format_edges if edge['value']['count'] >= min_count]
+            metagame.new_format(format_name, *edges)
+        return metagame
+    
+    #Writes the metagame to a columnar binary snapshot file that can be loaded with load_snapshot
+    def save_snapshot(self, snapshot_fp):
+        cards = list(self.cards.values())
+        index = {card.id: i for i, card in enumerate(cards)}
+        count_formats = sorted(set([format_name for card in cards for format_name in list(card.count) + list(card.total)]))
+        columns = {'card_ids': encode_strings([card.id for card in cards]),
+                   'card_names': encode_strings([card.name for card in cards]),
+                   # Cards without a type are stored with an empty type
+                   'card_types': encode_strings([card.type or '' for card in cards]),
+                   'card_count': np.array([[card.count.get(format_name, 0) for format_name in count_formats] for card in cards],
+                                          dtype=np.int32).reshape(len(cards), len(count_formats)),
+                   'card_total': np.array([[card.total.get(format_name, 0) for format_name in count_formats] for card in cards],
+                                          dtype=np.int32).reshape(len(cards), len(count_formats))}
+        for i, meta_format in enumerate(self.formats.values()):
+            edges = list(meta_format.edges.values())
+            columns['edges/{}/source'.format(i)] = np.array([index[edge.source.id] for edge in edges], dtype=np.int32)
+            columns['edges/{}/target'.format(i)] = np.array([index[edge.target.id] for edge in edges], dtype=np.int32)
+            columns['edges/{}/count'.format(i)] = np.array([edge.count for edge in edges], dtype=np.int32)
+            columns['edges/{}/total'.format(i)] = np.array([edge.total for edge in edges], dtype=np.int32)
+            # Histories are stored as their cumulative arrays, whose edge rows are in the same order as the edges
+            if meta_format.history is not None:
+                for name in HISTORY_COLUMNS:
+                    columns['history/{}/{}'.format(i, name)] = getattr(meta_format.history, name)
+        # Deck counts are only known for formats aggregated from decklists, and histories for decklists with dates
+        deck_counts = {format_name: meta_format.n_decks for format_name, meta_format in self.formats.items() if meta_format.n_decks is not None}
+        histories = {format_name: meta_format.history.periods for format_name, meta_format in self.formats.items() if meta_format.history is not None}
+        write_snapshot(snapshot_fp, columns, {'formats': list(self.formats), 'count_formats': count_formats, 'deck_counts': deck_counts,
+                                              'histories': histories})
+    
+    # Sets the history of format i of a snapshot, if it has one, keeping the rows of the edges where keep is True
+    @staticmethod
+    def _load_history(meta_format, i, meta, columns, keep):
+        periods = meta.get('histories', {}).get(meta_format.name)
+        if periods is not None:
+            meta_format.history = History(periods, *[columns['history/{}/{}'.format(i, name)] for name in HISTORY_COLUMNS]).filtered(keep)
+    
+    #Reads a snapshot file written by save_snapshot and returns the metagame it describes.
+    #Edges that appear in fewer than min_count decks are dropped.
+    @classmethod
+    def load_snapshot(cls, snapshot_fp, min_count = DEFAULT_MIN_EDGE_COUNT):
+        meta, columns = read_snapshot(snapshot_fp)
+        count_formats = meta['count_formats']
+        card_count = columns['card_count'].tolist()
+        card_total = columns['card_total'].tolist()
+        cards = [Card(card_name,
+                      card_type or None,
+                      {format_name: n for format_name, n in zip(count_formats, count) if n},
+                      {format_name: n for format_name, n in zip(count_formats, total) if n},
+                      node_id = card_id)
+                 for card_id, card_name, card_type, count, total in zip(decode_strings(columns['card_ids']),
+                                                                        decode_strings(columns['card_names']),
+                                                                        decode_strings(columns['card_types']),
+                                                                        card_count, card_total)]
+        metagame = cls(*cards)
+        for i, format_name in enumerate(meta['formats']):
+            count = columns['edges/{}/count'.format(i)]
+            keep = count >= min_count
+            edges = [Edge(cards[source], cards[target], edge_count, edge_total)
+                     for source, target, edge_count, edge_total in zip(columns['edges/{}/source'.format(i)][keep].tolist(),
+                                                                       columns['edges/{}/target'.format(i)][keep].tolist(),
+                                                                       count[keep].tolist(),
+                                                                       columns['edges/{}/total'.format(i)][keep].tolist())]
+            metagame.new_format(format_name, *edges)
+            metagame.formats[format_name].n_decks = meta.get('deck_counts', {}).get(format_name)
+            cls._load_history(metagame.formats[format_name], i, meta, columns, keep)
+        return metagame
         
     #Takes in list of cards and adds cards that are not pre-existing (based on id) to market
     def add_cards(self, *cards):
@@ -123,28 +634,235 @@ class Metagame():
         for card in cards:
             if card.id not in self.cards:
                 self.cards[card.id] = card
+                self.cards_by_name_index.setdefault(card.name, card)
+                self.card_index[card.id] = len(self.card_ids)
+                self.card_ids.append(card.id)
+        self._search_index = None
+        for meta_format in self.formats.values():
+            meta_format._invalidate()
+    #Takes in a card index and returns the card at that index
+    def card_at(self, i):
+        return self.cards[self.card_ids[i]]
     #Takes in a string and a list of edges to create a new format object, and add it to the metagame's formats dict    
     def new_format(self, name, *edges):
         self.formats[name] = Format(self, name, *edges)
     #Takes in a list of ID values and returns all matching cards in the metagame    
     def cards_by_id(self, *card_ids):
         return [self.cards[card_id] for card_id in card_ids if card_id in self.cards]
-    #Takes in a list of names and returns all cards with those names in the metagame
+    #Takes in a list of names and returns all cards with exactly those names in the metagame
     def cards_by_name(self, *card_names):
-        return [card for card in self.cards.values() if any([card_name in card.name for card_name in card_names])]
+        return [self.cards_by_name_index[card_name] for card_name in card_names if card_name in self.cards_by_name_index]
+    #Takes in a single name and returns the card with exactly that name, or None if there is no such card
+    def card_by_name(self, card_name):
+        return self.cards_by_name_index.get(card_name)
+    #Takes in a list of search strings and returns all cards whose names start with (prefix = True) or contain any of them,
+    #ignoring case and diacritics
+    def search_cards(self, *queries, prefix = False):
+        card_ids = {}
+        for query in queries:
+            card_ids.update(dict.fromkeys(self.search_index.search(query, limit = None, mode = 'prefix' if prefix else 'substring')))
+        return self.cards_by_id(*card_ids)
+    #Takes in a search string and returns the IDs of the best matching cards, best first. Tolerates typos and ignores
+    #case and diacritics. Ties are broken by the number of decks a card appears in.
+    def search(self, query, limit = 10):
+        return self.search_index.search(query, limit = limit)
+    #Index of card names used by search and search_cards, built on first use
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            cards = self.cards.values()
+            self._search_index = CardNameIndex([card.id for card in cards],
+                                               [card.name for card in cards],
+                                               [sum(card.count.values()) for card in cards])
+        return self._search_index
     #Takes in a format name and returns that format if it exists
     def get_format(self, format_name):
         return self.formats.get(format_name)
-    def to_visdcc(self, default_format = 'All'):                
-        visdcc = self.formats.get(default_format, self.formats['All']).to_visdcc()
+    def to_visdcc(self, default_format = 'All', max_nodes = None, metric = 'deck_count'):
+        visdcc = self.formats.get(default_format, self.formats['All']).to_visdcc(max_nodes, metric)
         edge_dict = {edge['name']: edge for edge in visdcc['edges']}
         for format_key in self.formats:
             meta_format = self.formats[format_key]
             for edge in meta_format.edges.values():
-                edge_dict[edge.source.id + '__' + edge.target.id]['formats'].append(format_key)
+                edge_key = edge.source.id + '__' + edge.target.id
+                # Edges between cards left out by the level of detail are not in the data
+                if edge_key in edge_dict:
+                    edge_dict[edge_key]['formats'].append(format_key)
         visdcc['edges'] = list(edge_dict.values())
         return visdcc
     
     def __getitem__(self, key):
         return self.formats.get(key, self.formats['All'])
-        
\ No newline at end of file
+    #Identifies the cards and formats similarity indexes are computed from, by a digest of the card ids, which the
+    #indexes' rows refer to by position, and the number of edges of every format
+    def _similarity_meta(self):
+        return {'card_ids': hashlib.blake2b(json.dumps(self.card_ids).encode('utf-8'), digest_size=16).hexdigest(),
+                'edge_counts': {format_name: len(meta_format.arrays) for format_name, meta_format in self.formats.items()}}
+    #Writes the similarity indexes of every format under the given measures to a file that can be loaded with
+    #load_similarity, so they are not computed again when the metagame is next loaded
+    def save_similarity(self, similarity_fp, measures = tuple(SIMILARITY_MEASURES)):
+        indexes = {(format_name, measure): meta_format.similarity_index(measure) for format_name, meta_format in self.formats.items() for measure in measures}
+        write_similarity(similarity_fp, indexes, self._similarity_meta())
+    #Reads the similarity indexes of a file written by save_similarity into the formats. Indexes that were computed from
+    #other cards, or from a format of the same name with other edges, such as a format loaded with another min_count,
+    #are computed again from the format instead. Returns the (format name, measure) pairs of the indexes computed again.
+    def load_similarity(self, similarity_fp):
+        indexes, meta = read_similarity(similarity_fp)
+        expected = self._similarity_meta()
+        rebuilt = []
+        for (format_name, measure), index in indexes.items():
+            meta_format = self.formats.get(format_name)
+            if meta_format is None:
+                continue
+            if (meta.get('card_ids') == expected['card_ids'] and format_name in meta.get('edge_counts', {})
+                    and meta['edge_counts'][format_name] == expected['edge_counts'][format_name] and len(index.rows) == len(self.card_ids)):
+                meta_format._similarity[measure] = index
+            else:
+                meta_format._similarity[measure] = nearest_neighbours(meta_format.arrays, measure)
+                rebuilt.append((format_name, measure))
+        return rebuilt
+    #Takes in the names of two formats, and optionally a (first period, last period) window of time of each, and returns
+    #the changes from the first to the second (see Format.diff)
+    def diff(self, base_format, other_format, base_window = None, other_window = None, measure = DEFAULT_DIFF_MEASURE):
+        base = self[base_format] if base_window is None else self[base_format].windowed(*base_window)
+        other = self[other_format] if other_window is None else self[other_format].windowed(*other_window)
+        return base.diff(other, measure)
+        
+class ArrayFormat(Format):
+    '''An array format stores its edges in an Adjacency over the metagame's card indices rather than as Edge objects.
+    Edge objects are only created on demand, as lightweight EdgeView objects, so it exposes the same API as a Format.'''
+    def __init__(self, metagame, format_name, adjacency):
+        self.metagame = metagame
+        self.name = format_name
+        self._arrays = adjacency.resized(len(metagame.cards))
+        self.edges = EdgeViews(self._arrays, metagame.card_table)
+        self._cache_lock = threading.Lock()
+        self._init_caches()
+        self.n_decks = None
+        self.history = None
+        self.card_stats = None
+        self.layout_base = None
+        return
+    
+    # The arrays are the edges themselves, so they are only resized to the metagame's cards
+    def _reset_arrays(self):
+        self._arrays = self._arrays.resized(len(self.metagame.cards))
+        self.edges = EdgeViews(self._arrays, self.metagame.card_table)
+    
+    @property
+    def arrays(self):
+        return self._arrays
+    
+    def _edge_at(self, i):
+        return EdgeView(self._arrays, self.metagame.card_table, i)
+    
+    def _subset(self, keep):
+        return self._derive(ArrayFormat(self.metagame, self.name, self._arrays.filtered(keep)))
+    
+    def _recounted(self, keep, count, total):
+        return ArrayFormat(self.metagame, self.name, Adjacency(self._arrays.n_cards, self._arrays.source[keep], self._arrays.target[keep],
+                                                               count[keep], total[keep]))
+    
+    def card_counts(self):
+        if self.card_stats is not None:
+            return self.card_stats[0]
+        card_table = self.metagame.card_table
+        if self.name not in card_table.count_formats:
+            return np.zeros(len(card_table), dtype=np.int64)
+        return np.asarray(card_table.count[:, card_table.count_formats.index(self.name)], dtype=np.int64)
+    
+    def card_totals(self):
+        if self.card_stats is not None:
+            return self.card_stats[1]
+        card_table = self.metagame.card_table
+        if self.name not in card_table.count_formats:
+            return np.zeros(len(card_table), dtype=np.int64)
+        return np.asarray(card_table.total[:, card_table.count_formats.index(self.name)], dtype=np.int64)
+    
+    def add(self, new_edge):
+        if not isinstance(new_edge, Edge):
+            raise TypeError("Can only add valid edge objects to a format.")
+        if new_edge.source.id not in self.metagame.cards or new_edge.target.id not in self.metagame.cards:
+            raise ValueError("Edges must be between existing cards.")
+        source = self.metagame.card_index[new_edge.source.id]
+        target = self.metagame.card_index[new_edge.target.id]
+        # Ensure edge is not a duplicate. Duplicate edges cause errors in the app layer
+        if self._arrays.edge_between(source, target) < 0:
+            self._arrays = self._arrays.extended([source], [target], [new_edge.count], [new_edge.total])
+            # The history has no counts for the new edge
+            self.history = None
+            self._invalidate()
+        return
+    
+    def edge_between(self, card_a, card_b):
+        i = self._arrays.edge_between(self.metagame.card_index.get(card_a.id, -1), self.metagame.card_index.get(card_b.id, -1))
+        return self._edge_at(i) if i >= 0 else None
+    
+    def edges_at(self, card_id):
+        if card_id not in self.metagame.card_index:
+            return []
+        return [self._edge_at(i) for i in self._arrays.edges_at(self.metagame.card_index[card_id]).tolist()]
+
+class ArrayMetagame(Metagame):
+    '''An array metagame stores its cards in a CardTable and its formats as ArrayFormats. Card and Edge objects are
+    only created on demand, as lightweight views, so it exposes the same API as a Metagame.'''
+    def __init__(self, *cards, card_table = None):
+        if any([not isinstance(card, Card) for card in cards]):
+            raise TypeError("Can only import card objects into a metagame.")
+        if card_table is None:
+            card_table = CardTable([], [], [], np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0), dtype=np.int64), [])
+        self.card_table = card_table
+        self.card_table.append(*cards)
+        # The card IDs, card indices and name index are the card table's own, so they stay current as cards are added.
+        self.cards = CardViews(self.card_table, self.card_table.index)
+        self.cards_by_name_index = CardViews(self.card_table, self.card_table.name_index)
+        self.card_ids = self.card_table.ids
+        self.card_index = self.card_table.index
+        self._search_index = None
+        self.formats = {}
+    
+    #Reads a snapshot file written by save_snapshot and returns the metagame it describes, without creating any card
+    #or edge objects. Edges that appear in fewer than min_count decks are dropped.
+    @classmethod
+    def load_snapshot(cls, snapshot_fp, min_count = DEFAULT_MIN_EDGE_COUNT):
+        meta, columns = read_snapshot(snapshot_fp)
+        card_table = CardTable(decode_strings(columns['card_ids']),
+                               decode_strings(columns['card_names']),
+                               [card_type or None for card_type in decode_strings(columns['card_types'])],
+                               columns['card_count'],
+                               columns['card_total'],
+                               meta['count_formats'])
+        metagame = cls(card_table = card_table)
+        for i, format_name in enumerate(meta['formats']):
+            adjacency = Adjacency(len(card_table),
+                                  columns['edges/{}/source'.format(i)],
+                                  columns['edges/{}/target'.format(i)],
+                                  columns['edges/{}/count'.format(i)],
+                                  columns['edges/{}/total'.format(i)])
+            keep = adjacency.count >= min_count
+            metagame.formats[format_name] = ArrayFormat(metagame, format_name, adjacency.filtered(keep))
+            metagame.formats[format_name].n_decks = meta.get('deck_counts', {}).get(format_name)
+            cls._load_history(metagame.formats[format_name], i, meta, columns, keep)
+        return metagame
+    
+    def add_cards(self, *cards):
+        if any([not isinstance(card, Card) for card in cards]):
+            raise TypeError("Can only import card objects into a metagame.")
+        self.card_table.append(*cards)
+        self._search_index = None
+        for meta_format in self.formats.values():
+            meta_format._invalidate()
+    
+    def card_at(self, i):
+        return self.card_table.at(i)
+    
+    def new_format(self, name, *edges):
+        if not all([isinstance(edge, Edge) for edge in edges]):
+            raise TypeError("All edges must be valid Edge objects.")
+        if not all([(edge.source.id in self.card_index) and (edge.target.id in self.card_index) for edge in edges]):
+            raise ValueError("All edges must be between nodes in the market.")
+        # Ensure there are no duplicate edges within a format, keeping the first edge between each pair of cards
+        unique_edges = {}
+        for edge in edges:
+            unique_edges.setdefault(frozenset((edge.source.id, edge.target.id)), edge)
+        self.formats[name] = ArrayFormat(self, name, Adjacency.from_edges(unique_edges.values(), self.card_index))
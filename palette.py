@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:47:51 2026
+
+@author: ToupinC
+
+Color palettes of any size. A palette starts from a list of hand picked colors and is extended one color at a time by
+farthest point sampling in the OKLab color space, where euclidean distance approximates perceived difference: each new
+color is the candidate sRGB color farthest from every color already in the palette. Colors are hex strings, '#RRGGBB'.
+"""
+import numpy as np
+
+# Number of levels of each sRGB channel in the grid of candidate colors
+CANDIDATE_STEPS = 18
+# OKLab lightness range of the candidate colors. Lighter colors disappear on the white background when lightened, and
+# darker colors are hard to tell apart.
+MIN_LIGHTNESS = 0.35
+MAX_LIGHTNESS = 0.9
+
+# sRGB to LMS cone response and cube-root LMS to OKLab matrices, from https://bottosson.github.io/posts/oklab/
+_LINEAR_SRGB_TO_LMS = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                                [0.2119034982, 0.6806995451, 0.1073969566],
+                                [0.0883024619, 0.2817188376, 0.6299787005]])
+_LMS_TO_OKLAB = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                          [1.9779984951, -2.4285922050, 0.4505937099],
+                          [0.0259040371, 0.7827717662, -0.8086757660]])
+
+# Red, green and blue channels of every color, between 0 and 255, and back
+def _hex_to_channels(colors):
+    return np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in colors], dtype=np.int64).reshape(-1, 3)
+
+def _channels_to_hex(channels):
+    return ['#{:02X}{:02X}{:02X}'.format(*row) for row in np.asarray(channels, dtype=np.int64).tolist()]
+
+def hex_to_rgb(colors):
+    """Return an array of the red, green and blue channels of every color, between 0 and 1"""
+    return _hex_to_channels(colors)/255
+
+def rgb_to_hex(rgb):
+    """Return the hex string of every row of red, green and blue channels between 0 and 1"""
+    return _channels_to_hex(np.rint(np.asarray(rgb, dtype=float).reshape(-1, 3)*255))
+
+def srgb_to_oklab(rgb):
+    """Return the OKLab lightness and a, b coordinates of every row of sRGB channels between 0 and 1"""
+    rgb = np.asarray(rgb, dtype=float)
+    linear = np.where(rgb <= 0.04045, rgb/12.92, ((rgb + 0.055)/1.055)**2.4)
+    return np.cbrt(linear @ _LINEAR_SRGB_TO_LMS.T) @ _LMS_TO_OKLAB.T
+
+def extend_palette(colors, n, avoid = ()):
+    """Return n perceptually distinct colors: the first n of colors, extended with new colors if there are too few
+
+    Parameters
+    ------------
+    colors: list
+        hand picked colors to start from
+    n: int
+        number of colors to return
+    avoid: list
+        colors the new colors should also be far from, such as the background color
+    """
+    colors = list(colors)
+    if n <= len(colors):
+        return colors[:n]
+    levels = np.linspace(0, 1, CANDIDATE_STEPS)
+    candidates = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    lab = srgb_to_oklab(candidates)
+    usable = (lab[:, 0] >= MIN_LIGHTNESS) & (lab[:, 0] <= MAX_LIGHTNESS)
+    candidates, lab = candidates[usable], lab[usable]
+    taken = srgb_to_oklab(hex_to_rgb(colors + list(avoid)))
+    # Squared distance from every candidate to the nearest color taken so far
+    nearest = ((lab[:, None, :] - taken[None, :, :])**2).sum(axis=2).min(axis=1, initial=np.inf)
+    new_colors = []
+    for _ in range(n - len(colors)):
+        best = int(np.argmax(nearest))
+        new_colors.append(candidates[best])
+        nearest = np.minimum(nearest, ((lab - lab[best])**2).sum(axis=1))
+    return colors + rgb_to_hex(new_colors)
+
+def lighten_colors(colors, factor = 0.9):
+    """Return every color moved towards white by the given factor, 0 leaving it unchanged and 1 making it white"""
+    return _channels_to_hex(np.floor(255 - (1 - factor)*(255 - _hex_to_channels(colors))))
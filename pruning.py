@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:58:02 2026
+
+@author: ToupinC
+
+Edge significance measures for pruning formats. Every measure is computed for all the edges of a format at once from
+the edge counts, the counts of the cards at either end, and the number of decks in the format:
+
+    count           number of decks containing both cards
+    lift            how many times more often the cards appear together than if they were independent
+    pmi             pointwise mutual information, log2 of the lift
+    jaccard         decks containing both cards over decks containing either card
+    significance    -log10 of the hypergeometric p-value of seeing at least count decks with both cards if they were
+                    independent, so 3 means p = 0.001
+
+Higher is more significant for every measure, so pruning always keeps the edges at or above a threshold.
+"""
+import numpy as np
+
+MEASURES = ('count', 'lift', 'pmi', 'jaccard', 'significance')
+# Terms of the hypergeometric tail smaller than this fraction of the sum so far are not added
+TAIL_TOLERANCE = 1e-12
+
+# Pruning settings selectable in the app, as (label, measure, threshold, top_k)
+PRUNING_PRESETS = {'none': ('None', None, None, None),
+                   'significant': ('Significant (p < 0.001)', 'significance', 3.0, None),
+                   'lift': ('Lift of at least 2', 'lift', 2.0, None),
+                   'jaccard': ('Jaccard of at least 0.2', 'jaccard', 0.2, None),
+                   'backbone': ('Backbone (5 strongest per card)', 'significance', None, 5),
+                   'significant-backbone': ('Significant backbone (3 per card)', 'significance', 3.0, 3)}
+
+def estimate_deck_count(count, source_count, target_count):
+    """Lower bound on the number of decks of a format when it is not known, from the fact that every card and every
+    pair of cards' union must fit in the format's decks."""
+    if len(count) == 0:
+        return 0
+    return int(max(source_count.max(), target_count.max(), (source_count + target_count - count).max()))
+
+# Natural logarithm of n! for every n up to n_max
+def _log_factorials(n_max):
+    return np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, n_max + 1)))])
+
+def hypergeometric_log_sf(k, population, successes, draws):
+    """Natural logarithm of P(X >= k) for X hypergeometric with the given population size, number of successes in
+    the population and number of draws, for arrays of k, successes and draws
+
+    The tail is summed term by term from k, using the ratio of consecutive probabilities, away from the mode, so only
+    a few terms are needed. When k is below the mean, the complement P(X < k) is summed instead.
+    """
+    k, successes, draws = [np.asarray(array, dtype=np.int64) for array in (k, successes, draws)]
+    log_factorial = _log_factorials(population)
+    log_choose = lambda n, r: log_factorial[n] - log_factorial[r] - log_factorial[n - r]
+    failures = population - successes
+    log_pmf = lambda x, s, f, d: log_choose(s, x) + log_choose(f, d - x) - log_choose(population, d)
+    upper = k > draws*successes/max(population, 1)
+    log_sf = np.zeros(len(k))
+    # Upper tail: sum P(X = x) for x from k upwards
+    x = k[upper].astype(float)
+    s, d, f = successes[upper], draws[upper], failures[upper]
+    term, total = np.ones(len(x)), np.ones(len(x))
+    while len(x) and (term > TAIL_TOLERANCE*total).any():
+        term = term*(s - x)*(d - x)/((x + 1)*(f - d + x + 1))
+        total += term
+        x += 1
+    log_sf[upper] = log_pmf(k[upper], s, f, d) + np.log(total)
+    # Lower tail: P(X >= k) = 1 - sum P(X = x) for x from k - 1 downwards. If k is the smallest possible value of X,
+    # P(X >= k) is 1.
+    lower = ~upper & (k > np.maximum(0, draws - failures))
+    x = (k[lower] - 1).astype(float)
+    s, d, f = successes[lower], draws[lower], failures[lower]
+    term, total = np.ones(len(x)), np.ones(len(x))
+    while len(x) and (term > TAIL_TOLERANCE*total).any():
+        term = term*x*(f - d + x)/((s - x + 1)*(d - x + 1))
+        total += term
+        x -= 1
+    cdf = np.exp(log_pmf(k[lower] - 1, s, f, d) + np.log(total))
+    log_sf[lower] = np.log(np.clip(1 - cdf, np.finfo(float).tiny, 1))
+    return np.minimum(log_sf, 0)
+
+def edge_scores(measure, count, source_count, target_count, n_decks):
+    """Score every edge with the given measure
+
+    Parameters
+    ------------
+    measure: str
+        one of MEASURES
+    count: numpy.ndarray
+        number of decks containing each edge's pair of cards
+    source_count, target_count: numpy.ndarray
+        number of decks containing each edge's source and target card
+    n_decks: int
+        number of decks in the format, or None to use estimate_deck_count
+    """
+    count, source_count, target_count = [np.asarray(array, dtype=float) for array in (count, source_count, target_count)]
+    # Card counts can be lower than edge counts if the data is inconsistent; clip so every measure stays defined
+    source_count = np.maximum(source_count, count)
+    target_count = np.maximum(target_count, count)
+    n_decks = max(n_decks or 0, estimate_deck_count(count, source_count, target_count))
+    if measure == 'count':
+        return count
+    if measure in ('lift', 'pmi'):
+        lift = np.divide(count*n_decks, source_count*target_count, out=np.zeros(len(count)), where=count > 0)
+        return lift if measure == 'lift' else np.log2(np.maximum(lift, np.finfo(float).tiny))
+    if measure == 'jaccard':
+        union = source_count + target_count - count
+        return np.divide(count, union, out=np.zeros(len(count)), where=union > 0)
+    if measure == 'significance':
+        log_sf = hypergeometric_log_sf(count.astype(np.int64), int(n_decks), source_count.astype(np.int64), target_count.astype(np.int64))
+        return -log_sf/np.log(10)
+    raise ValueError("Unknown edge measure '{}'.".format(measure))
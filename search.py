@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:21:09 2026
+
+@author: ToupinC
+
+Search index over card names. Names are normalised (diacritics removed, lower case) so that "lim-dul" finds
+"Lim-Dûl", and indexed by trigram so substring and typo-tolerant searches only look at a handful of candidates.
+"""
+from bisect import bisect_left
+import re
+import unicodedata
+
+import numpy as np
+
+# Ranks of the ways a name can match a query, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+# Number of names sharing the most trigrams with a query that are checked for typos
+FUZZY_CANDIDATES = 24
+
+def normalize_name(name):
+    """Strip diacritics, case and punctuation from a name, so that e.g. 'Lim-Dûl' and 'lim dul' compare equal."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join([char for char in decomposed if not unicodedata.combining(char)]).lower()
+    return re.sub(r"[^\w']+", ' ', stripped).strip()
+
+def name_words(name):
+    """The words of a normalised name."""
+    return name.split()
+
+def trigrams(text):
+    """The set of trigrams of a normalised string, padded so that short strings and word boundaries have trigrams.
+    Every word is also padded on its own, so words have trigrams marking where they start and end."""
+    grams = set()
+    for part in [text] + name_words(text):
+        padded = '  ' + part + ' '
+        grams.update([padded[i:i+3] for i in range(len(padded) - 2)])
+    return grams
+
+def edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance + 1 if it is larger than max_distance."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+    if max_distance == 1:
+        # Strip the common prefix and suffix; a and b are one edit apart if at most one character remains in each
+        start = 0
+        while start < min(len(a), len(b)) and a[start] == b[start]:
+            start += 1
+        end = 0
+        while end < min(len(a), len(b)) - start and a[-1-end] == b[-1-end]:
+            end += 1
+        return 1 if max(len(a), len(b)) - start - end <= 1 else 2
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0]*len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (char_a != char_b))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+class CardNameIndex:
+    '''A card name index ranks the cards whose names match a search query. Exact matches rank first, then names that
+    start with the query, names with a word that starts with the query, names that contain the query, and finally
+    names within a small edit distance of the query, which are only looked for when the other matches do not reach the
+    limit. Ties are broken by weight (e.g. number of decks), then by name.'''
+    def __init__(self, keys, names, weights = None):
+        self.keys = list(keys)
+        self.names = list(names)
+        self.normalized = [normalize_name(name) for name in self.names]
+        self.weights = np.zeros(len(self.keys)) if weights is None else np.asarray(weights, dtype=float)
+        # Sorted normalised names and words, for prefix searches by bisection
+        self._sorted_names = sorted([(name, i) for i, name in enumerate(self.normalized)])
+        self._sorted_words = sorted([(word, i) for i, name in enumerate(self.normalized) for word in set(name_words(name))])
+        # Posting list of the names containing each trigram
+        postings = {}
+        for i, name in enumerate(self.normalized):
+            for trigram in trigrams(name):
+                postings.setdefault(trigram, []).append(i)
+        self._postings = {trigram: np.array(indices, dtype=np.int64) for trigram, indices in postings.items()}
+        return
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Indices of the entries of a sorted list of (string, index) pairs whose strings start with prefix
+    @staticmethod
+    def _prefixed(sorted_pairs, prefix):
+        start = bisect_left(sorted_pairs, (prefix, -1))
+        matches = []
+        for name, i in sorted_pairs[start:]:
+            if not name.startswith(prefix):
+                break
+            matches.append(i)
+        return matches
+
+    # Indices of the names containing query
+    def _containing(self, query):
+        query_trigrams = [trigram for trigram in trigrams(query) if trigram[0] != ' ' and trigram[-1] != ' ']
+        if not query_trigrams:
+            return [i for i, name in enumerate(self.normalized) if query in name]
+        postings = sorted([self._postings.get(trigram, np.empty(0, dtype=np.int64)) for trigram in query_trigrams], key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return [i for i in candidates.tolist() if query in self.normalized[i]]
+
+    # Indices of the names within max_distance edits of the query, or of one of their words, with their distances
+    def _fuzzy(self, query, max_distance):
+        query_trigrams = list(trigrams(query))
+        postings = [self._postings[trigram] for trigram in query_trigrams if trigram in self._postings]
+        if not postings:
+            return {}
+        # Only names that share a reasonable fraction of the query's trigrams can be within a few edits of it
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.keys))
+        candidates = np.flatnonzero(shared >= max(1, len(query_trigrams) - 3*max_distance))
+        candidates = candidates[np.argsort(-shared[candidates], kind='stable')][:FUZZY_CANDIDATES]
+        distances = {}
+        for i in candidates.tolist():
+            name = self.normalized[i]
+            # Queries of several words are compared to the start of the whole name, and single words to each word
+            words = [name] if ' ' in query else name_words(name)
+            distance = min([edit_distance(query, word[:len(query) + max_distance], max_distance)
+                            for word in words if len(word) >= len(query) - max_distance] or [max_distance + 1])
+            if distance <= max_distance:
+                distances[i] = distance
+        return distances
+
+    def search(self, query, limit = 10, mode = 'fuzzy'):
+        """Return the keys of the cards whose names best match query, best match first
+
+        Parameters
+        ------------
+        query: str
+            the text to search for
+        limit: int
+            the maximum number of keys to return, or None for all matches
+        mode: str
+            'prefix' only matches names that start with the query, 'substring' also matches names containing the query
+            and 'fuzzy' also matches names within a few typos of the query when there are fewer than limit other matches
+        """
+        query = normalize_name(query or '')
+        if not query:
+            return []
+        ranks = {}
+        def rank(indices, value):
+            for i in indices:
+                ranks.setdefault(i, (value, 0))
+        rank([i for i in self._prefixed(self._sorted_names, query) if self.normalized[i] == query], EXACT)
+        rank(self._prefixed(self._sorted_names, query), PREFIX)
+        if mode in ('substring', 'fuzzy'):
+            rank(self._prefixed(self._sorted_words, query), WORD_PREFIX)
+            rank(self._containing(query), SUBSTRING)
+        if mode == 'fuzzy' and len(query) >= 4 and (limit is None or len(ranks) < limit):
+            for i, distance in self._fuzzy(query, 1 if len(query) < 8 else 2).items():
+                ranks.setdefault(i, (FUZZY, distance))
+        ranked = sorted(ranks, key = lambda i: (ranks[i], -self.weights[i], self.normalized[i]))
+        return [self.keys[i] for i in (ranked if limit is None else ranked[:limit])]
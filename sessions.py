@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:05:47 2026
+
+@author: ToupinC
+
+Per-session server state. Each browser session is given a session id, kept in a dcc.Store, and the settings the
+user has chosen are kept in a session store under that id instead of on the shared Mavis instance. Session stores
+are interchangeable:
+
+    LRUSessionStore       in-process, for a single worker
+    SQLiteSessionStore    a SQLite file on a memory backed filesystem, shared by every worker on one host
+    RedisSessionStore     any Redis-compatible client, shared by every worker that can reach it
+
+LocalRedis is a minimal in-process stand-in for a Redis client, for development and testing without a Redis server.
+
+Deployments with several workers must use a store shared by every worker. An LRUSessionStore only knows the sessions of
+its own worker, and forgets the least recently used sessions past its capacity. The app then finds the default state,
+notices that the browser shows a render of another state, and falls back to sending whole renders.
+"""
+from collections import OrderedDict
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_SESSION_STATE = {
+    'format': 'All',
+    'nbhd_type': 'None',
+    'node_color_option': 'None',
+    'size_nodes_option': 'None',
+    'pruning': 'none',
+    'archetype_view': 'cards',
+    'node_budget': '500',
+    'detail_metric': 'deck_count',
+    'detail_tier': 0,
+    'expanded': [],
+    'window': None,
+    'compare': 'none',
+    'similarity_measure': 'cosine',
+    'selection': {'nodes': [], 'edges': []},
+    'node_value_color_mapping': {},
+    'edge_value_color_mapping': {},
+}
+# Sessions that have not been used for this many seconds may be discarded
+DEFAULT_SESSION_TTL = 24*60*60
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+def default_session_state():
+    return copy.deepcopy(DEFAULT_SESSION_STATE)
+
+class SessionStore:
+    """Base class for session stores. Subclasses store JSON serializable state dicts by session id."""
+    def get(self, session_id):
+        """Return the state of a session, or the default state if the session is unknown or expired."""
+        state = self._load(session_id) if session_id else None
+        return default_session_state() if state is None else {**default_session_state(), **state}
+
+    def set(self, session_id, state):
+        """Replace the state of a session."""
+        if session_id:
+            self._save(session_id, state)
+
+    def _load(self, session_id):
+        raise NotImplementedError
+
+    def _save(self, session_id, state):
+        raise NotImplementedError
+
+class LRUSessionStore(SessionStore):
+    """Keeps the most recently used sessions in the memory of the current process."""
+    def __init__(self, max_sessions = 1024):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, session_id):
+        with self._lock:
+            if session_id not in self._sessions:
+                return None
+            self._sessions.move_to_end(session_id)
+            return copy.deepcopy(self._sessions[session_id])
+
+    def _save(self, session_id, state):
+        with self._lock:
+            self._sessions[session_id] = copy.deepcopy(state)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last = False)
+
+class SQLiteSessionStore(SessionStore):
+    """Keeps sessions in a SQLite file so every worker process on the host sees the same sessions. By default the
+    file is placed on /dev/shm when it exists, so reads and writes stay in shared memory."""
+    def __init__(self, fp = None, ttl = DEFAULT_SESSION_TTL):
+        if fp is None:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            fp = os.path.join(directory, 'mavis_sessions.sqlite')
+        self.fp = fp
+        self.ttl = ttl
+        # Connections cannot be shared between threads, so each thread opens its own
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT, updated REAL)')
+
+    def _connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = sqlite3.connect(self.fp, timeout = 10)
+            self._local.connection.execute('PRAGMA journal_mode=WAL')
+        return self._local.connection
+
+    def _load(self, session_id):
+        row = self._connection().execute('SELECT state, updated FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def _save(self, session_id, state):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)',
+                               (session_id, json.dumps(state), time.time()))
+            connection.execute('DELETE FROM sessions WHERE updated < ?', (time.time() - self.ttl,))
+
+class RedisSessionStore(SessionStore):
+    """Keeps sessions in Redis, or anything implementing the get and set(..., ex=...) methods of a Redis client."""
+    def __init__(self, client, prefix = 'mavis:session:', ttl = DEFAULT_SESSION_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _load(self, session_id):
+        value = self.client.get(self.prefix + session_id)
+        return None if value is None else json.loads(value)
+
+    def _save(self, session_id, state):
+        self.client.set(self.prefix + session_id, json.dumps(state), ex = self.ttl)
+
+class LocalRedis:
+    """An in-process stand-in for the parts of a Redis client used by RedisSessionStore."""
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._values.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ex = None):
+        with self._lock:
+            self._values[key] = (value.encode('utf-8') if isinstance(value, str) else value,
+                                 None if ex is None else time.time() + ex)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum([self._values.pop(key, None) is not None for key in keys])
+
+def create_session_store(backend = None):
+    """Create the session store named by backend, or by the MAVIS_SESSION_STORE environment variable
+
+    Parameters
+    ------------
+    backend: str
+        one of 'memory' (the default), 'sqlite', 'redis' or 'local-redis'. The 'sqlite' backend reads its file path
+        from MAVIS_SESSION_DB and the 'redis' backend reads its URL from MAVIS_REDIS_URL.
+    """
+    backend = backend or os.environ.get('MAVIS_SESSION_STORE', 'memory')
+    if backend == 'memory':
+        return LRUSessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore(os.environ.get('MAVIS_SESSION_DB'))
+    if backend == 'redis':
+        # redis is only needed when this backend is used
+        import redis
+        return RedisSessionStore(redis.Redis.from_url(os.environ.get('MAVIS_REDIS_URL', 'redis://localhost:6379/0')))
+    if backend == 'local-redis':
+        return RedisSessionStore(LocalRedis())
+    raise ValueError("Unknown session store '{}'.".format(backend))
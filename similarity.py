@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:58:13 2026
+
+@author: ToupinC
+
+Card similarity, for finding cards that are played like a given card, such as substitutes. Two cards are similar when
+they are played with the same cards, whether or not they are played together, under one of
+
+    cosine      cosine of the cards' rows of the adjacency matrix weighted by deck count
+    jaccard     cards both are played with over cards either is played with
+    svd         cosine of the cards' embeddings from a truncated SVD of the adjacency matrix weighted by the logarithm
+                of deck count, so the most played pairs do not dominate the embeddings
+
+Similarities are computed for a block of cards at a time against every card, and only the DEFAULT_NEIGHBOURS most
+similar cards of each card are kept, in a SimilarityIndex. Looking up the most similar cards of a card is then a row
+lookup. Indexes are persisted in the snapshot file format (see snapshot.py), so they are computed once per dataset.
+"""
+import numpy as np
+
+from snapshot import write_snapshot, read_snapshot, encode_strings, decode_strings
+
+SIMILARITY_MEASURES = {'cosine': 'Shared neighbours (cosine)',
+                       'jaccard': 'Shared neighbours (Jaccard)',
+                       'svd': 'Embedding (SVD)'}
+DEFAULT_SIMILARITY_MEASURE = 'cosine'
+# Number of most similar cards kept for every card
+DEFAULT_NEIGHBOURS = 20
+# Number of dimensions of the SVD embeddings
+SVD_DIMENSIONS = 32
+# Number of cards whose similarities are computed at once, which bounds memory use to BLOCK_SIZE x cards similarities
+BLOCK_SIZE = 512
+
+# Embedding of every row of a symmetric matrix from its SVD truncated to the given number of dimensions. The singular
+# vectors of a symmetric matrix are its eigenvectors and its singular values the absolute values of its eigenvalues.
+def _svd_embeddings(matrix, dimensions):
+    values, vectors = np.linalg.eigh(matrix)
+    top = np.argsort(-np.abs(values), kind='stable')[:dimensions]
+    return vectors[:, top]*np.sqrt(np.abs(values[top]))
+
+def nearest_neighbours(adjacency, measure = DEFAULT_SIMILARITY_MEASURE, k = DEFAULT_NEIGHBOURS):
+    """Return a SimilarityIndex of the k most similar cards of every card with edges in an adjacency
+
+    Parameters
+    ------------
+    adjacency: graph.Adjacency
+        edges of the format
+    measure: str
+        one of SIMILARITY_MEASURES
+    k: int
+        number of most similar cards kept for every card
+    """
+    if measure not in SIMILARITY_MEASURES:
+        raise ValueError("Unknown similarity measure '{}'.".format(measure))
+    cards = np.flatnonzero(adjacency.degree())
+    matrix = adjacency.matrix(cards, adjacency.count)
+    if measure == 'jaccard':
+        vectors = (matrix > 0).astype(float)
+        sizes = vectors.sum(axis=1)
+    else:
+        vectors = matrix if measure == 'cosine' else _svd_embeddings(np.log1p(matrix), SVD_DIMENSIONS)
+        norms = np.sqrt((vectors**2).sum(axis=1))
+        vectors = vectors/np.where(norms > 0, norms, 1)[:, None]
+    n = len(cards)
+    k = max(min(k, n - 1), 0)
+    neighbours = np.zeros((n, k), dtype=np.int64)
+    scores = np.zeros((n, k))
+    for start in range(0, n, BLOCK_SIZE):
+        block = vectors[start:start + BLOCK_SIZE]
+        similarity = block @ vectors.T
+        if measure == 'jaccard':
+            similarity /= np.maximum(sizes[start:start + BLOCK_SIZE, None] + sizes[None, :] - similarity, 1)
+        # A card is not similar to itself
+        similarity[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+        if k == 0:
+            continue
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        # Most similar first, ties broken by card index
+        order = np.lexsort((top, -top_scores), axis=1)
+        neighbours[start:start + BLOCK_SIZE] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + BLOCK_SIZE] = np.take_along_axis(top_scores, order, axis=1)
+    return SimilarityIndex(adjacency.n_cards, cards, cards[neighbours], scores, measure)
+
+class SimilarityIndex:
+    '''The most similar cards of every card with edges in a format, by card index, from most to least similar.'''
+    def __init__(self, n_cards, cards, neighbours, scores, measure):
+        self.cards = np.asarray(cards, dtype=np.int64)
+        self.neighbours = np.asarray(neighbours, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=float)
+        self.measure = measure
+        # Row of every card, -1 for cards without edges
+        self.rows = np.full(n_cards, -1, dtype=np.int64)
+        self.rows[self.cards] = np.arange(len(self.cards))
+        return
+
+    def similar(self, card_index, n = 10):
+        """Return the indices and similarities of the n cards most similar to a card, most similar first. Cards that
+        share nothing with it are left out."""
+        row = self.rows[card_index] if 0 <= card_index < len(self.rows) else -1
+        if row < 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        scores = self.scores[row, :n]
+        keep = scores > 0
+        return self.neighbours[row, :n][keep], scores[keep]
+
+def write_similarity(fp, indexes, meta = None):
+    """Write similarity indexes to a snapshot file that can be read with read_similarity
+
+    Parameters
+    ------------
+    fp: str
+        path of the file to write
+    indexes: dict{(str, str): SimilarityIndex}
+        indexes by format name and measure
+    meta: dict
+        additional JSON serializable metadata, such as what the indexes were computed from
+    """
+    columns = {'formats': encode_strings([format_name for format_name, _ in indexes]),
+               'measures': encode_strings([measure for _, measure in indexes])}
+    n_cards = []
+    for i, ((format_name, measure), index) in enumerate(indexes.items()):
+        columns['similarity/{}/cards'.format(i)] = index.cards.astype(np.int32)
+        columns['similarity/{}/neighbours'.format(i)] = index.neighbours.astype(np.int32)
+        columns['similarity/{}/scores'.format(i)] = index.scores.astype(np.float32)
+        n_cards.append(len(index.rows))
+    write_snapshot(fp, columns, {**(meta or {}), 'n_cards': n_cards})
+
+def read_similarity(fp):
+    """Read a file written by write_similarity and return its indexes by format name and measure, and its metadata"""
+    meta, columns = read_snapshot(fp)
+    indexes = {}
+    for i, key in enumerate(zip(decode_strings(columns['formats']), decode_strings(columns['measures']))):
+        indexes[key] = SimilarityIndex(meta['n_cards'][i],
+                                       columns['similarity/{}/cards'.format(i)],
+                                       columns['similarity/{}/neighbours'.format(i)],
+                                       columns['similarity/{}/scores'.format(i)],
+                                       key[1])
+    return indexes, meta
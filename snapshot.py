@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:40:02 2026
+
+@author: ToupinC
+
+Compact columnar binary storage for metagame snapshots.
+
+A snapshot file is laid out as
+    MAGIC (8 bytes) | header length (uint64, little endian) | JSON header | padding | column data
+where the JSON header records, for each named column, its dtype, shape and byte offset from the start of the column data.
+Every column starts on a COLUMN_ALIGNMENT byte boundary so it can be viewed in place from a memory map. String
+columns are stored as a single UTF-8 byte column of NUL terminated strings.
+
+Run this module as a script to convert the scraper's JSON output into a snapshot:
+    python snapshot.py data/cards.json data/edges.json data/metagame.snapshot
+"""
+import json
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'MAVISNP1'
+COLUMN_ALIGNMENT = 64
+
+def _padding(offset):
+    return (-offset) % COLUMN_ALIGNMENT
+
+def encode_strings(strings):
+    """Encode a list of strings as a single UTF-8 byte column of NUL terminated strings."""
+    return np.frombuffer(''.join([string + '\0' for string in strings]).encode('utf-8'), dtype=np.uint8)
+
+def decode_strings(column):
+    """Decode a byte column created by encode_strings back into a list of strings."""
+    return column.tobytes().decode('utf-8').split('\0')[:-1]
+
+def write_snapshot(fp, columns, meta = None):
+    """Write named numpy arrays and a JSON serializable metadata dict to a snapshot file
+
+    Parameters
+    ------------
+    fp: str
+        path of the snapshot file to write
+    columns: dict{str: numpy.ndarray}
+        columns to store, by name
+    meta: dict
+        additional JSON serializable metadata stored in the header
+    """
+    columns = {name: np.ascontiguousarray(column) for name, column in columns.items()}
+    # The header stores offsets relative to the end of the header; they are made absolute on read.
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        offset += _padding(offset)
+        layout[name] = {'dtype': column.dtype.str, 'shape': list(column.shape), 'offset': offset}
+        offset += column.nbytes
+    header = json.dumps({'meta': meta or {}, 'columns': layout}).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(header)
+    data_start += _padding(data_start)
+    with open(fp, 'wb') as snapshot_file:
+        snapshot_file.write(MAGIC)
+        snapshot_file.write(struct.pack('<Q', len(header)))
+        snapshot_file.write(header)
+        snapshot_file.write(b'\0'*(data_start - len(MAGIC) - 8 - len(header)))
+        written = 0
+        for name, column in columns.items():
+            snapshot_file.write(b'\0'*(layout[name]['offset'] - written))
+            snapshot_file.write(column.tobytes())
+            written = layout[name]['offset'] + column.nbytes
+    return
+
+def read_snapshot(fp):
+    """Memory map a snapshot file and return its metadata and columns
+
+    The returned arrays are read-only views into the memory map, so processes that load the same snapshot share
+    its pages through the operating system's page cache rather than each holding a private copy.
+    """
+    with open(fp, 'rb') as snapshot_file:
+        buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError("{} is not a metagame snapshot.".format(fp))
+    header_length = struct.unpack('<Q', buffer[len(MAGIC):len(MAGIC) + 8])[0]
+    header = json.loads(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_length].decode('utf-8'))
+    data_start = len(MAGIC) + 8 + header_length
+    data_start += _padding(data_start)
+    columns = {}
+    for name, layout in header['columns'].items():
+        dtype = np.dtype(layout['dtype'])
+        size = int(np.prod(layout['shape'], dtype=np.int64))
+        columns[name] = np.frombuffer(buffer, dtype=dtype, count=size,
+                                      offset=data_start + layout['offset']).reshape(layout['shape'])
+    return header['meta'], columns
+
+if __name__ == '__main__':
+    from metagame import Metagame
+    if len(sys.argv) != 4:
+        print('Usage: python snapshot.py CARD_JSON EDGE_JSON SNAPSHOT')
+        sys.exit(1)
+    card_json_fp, edge_json_fp, snapshot_fp = sys.argv[1:]
+    Metagame.from_json(card_json_fp, edge_json_fp, min_count = 0).save_snapshot(snapshot_fp)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:41:07 2026
+
+@author: ToupinC
+
+The app's modules are run from the repository root, and the scraper's from the data directory, so both are importable
+and tests run from the repository root, where the app finds its data. Tests of the statistics compare them with the
+same statistics computed directly from random decklists.
+"""
+import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [ROOT, os.path.join(ROOT, 'data')]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+os.chdir(ROOT)
+
+# Card pool of the random decks, with each card's type
+CARD_TYPES = {'Card {:02d}'.format(i): ['Creature', 'Instant', 'Sorcery', 'Artifact'][i % 4] for i in range(40)}
+
+@pytest.fixture
+def random_decks():
+    """Random decklists of two formats, with the date of every deck spread over eleven weeks, as taken by
+    aggregation.aggregate_formats. Every deck is of one of three archetypes, whose five core cards are in most of its
+    decks, so those pairs are far more common than chance, and is filled with random cards."""
+    rng = np.random.default_rng(7)
+    names = list(CARD_TYPES)
+    popularity = np.linspace(3, 0.2, len(names) - 15)
+    decks, dates = {}, {}
+    for format_name, n_decks in [('Modern', 90), ('Pauper', 60)]:
+        decks[format_name], dates[format_name] = [], []
+        for _ in range(n_decks):
+            archetype = int(rng.integers(0, 3))
+            core = [5*archetype + i for i in range(5) if rng.random() < 0.8]
+            filler = 15 + rng.choice(len(popularity), rng.integers(4, 10), replace=False, p=popularity/popularity.sum())
+            decks[format_name].append({names[i]: {'qty': int(rng.integers(1, 5)), 'type': CARD_TYPES[names[i]]} for i in core + filler.tolist()})
+            dates[format_name].append((datetime.date(2026, 8, 3) + datetime.timedelta(days=int(rng.integers(0, 77)))).isoformat())
+    return decks, dates
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:31:26 2026
+
+@author: ToupinC
+
+Card pair statistics of deck matrices against the same statistics counted deck by deck, summed in dense arrays and by
+sorting, with chunks small enough that the pairs of large formats are summed several times.
+"""
+import numpy as np
+import pytest
+
+import aggregation
+from aggregation import DeckMatrix, aggregate_formats
+
+# Count and total of every card pair of a deck matrix, counted deck by deck
+def reference_pairs(matrix):
+    pairs = {}
+    for i in range(len(matrix)):
+        cards = matrix.indices[matrix.indptr[i]:matrix.indptr[i+1]].tolist()
+        quantities = matrix.quantities[matrix.indptr[i]:matrix.indptr[i+1]].tolist()
+        for j in range(len(cards)):
+            for k in range(j + 1, len(cards)):
+                count, total = pairs.get((cards[j], cards[k]), (0, 0))
+                pairs[cards[j], cards[k]] = (count + 1, total + quantities[j]*quantities[k])
+    return pairs
+
+# A deck matrix of random decks of n_cards cards, some with fewer than two cards
+def random_matrix(n_decks, n_cards, max_length, seed):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, max_length + 1, n_decks)
+    indices = np.concatenate([np.zeros(0, dtype=np.int64)] + [np.sort(rng.choice(n_cards, length, replace=False)) for length in lengths])
+    return DeckMatrix(n_cards, np.concatenate([[0], np.cumsum(lengths)]), indices, rng.integers(1, 5, len(indices)))
+
+@pytest.fixture(params = ['dense', 'sparse'])
+def summation(request, monkeypatch):
+    if request.param == 'sparse':
+        monkeypatch.setattr(aggregation, 'DENSE_PAIR_LIMIT', 0)
+    return request.param
+
+@pytest.mark.parametrize('chunk_size', [1, 50, 2**22])
+def test_cooccurrence_matches_deck_by_deck(summation, monkeypatch, chunk_size):
+    monkeypatch.setattr(aggregation, 'PAIR_CHUNK_SIZE', chunk_size)
+    matrix = random_matrix(200, 60, 12, seed = 3)
+    source, target, count, total = matrix.cooccurrence()
+    assert (source < target).all()
+    keys = source*matrix.n_cards + target
+    assert (np.diff(keys) > 0).all()
+    assert {(s, t): (c, w) for s, t, c, w in zip(source.tolist(), target.tolist(), count.tolist(), total.tolist())} == reference_pairs(matrix)
+
+def test_cooccurrence_without_pairs(summation):
+    for matrix in [random_matrix(0, 10, 5, seed = 0), random_matrix(20, 10, 1, seed = 0)]:
+        arrays = matrix.cooccurrence()
+        assert [len(array) for array in arrays] == [0]*4
+        assert all([array.dtype == np.int64 for array in arrays])
+
+# Large formats are summed a chunk at a time: the pairs sorted at once are at most the distinct pairs and the pending
+# chunks, never every pair of every deck
+def test_sparse_cooccurrence_bounds_pairs_held(monkeypatch):
+    chunk_size = 5000
+    monkeypatch.setattr(aggregation, 'DENSE_PAIR_LIMIT', 0)
+    monkeypatch.setattr(aggregation, 'PAIR_CHUNK_SIZE', chunk_size)
+    sizes = []
+    reduce_pairs = aggregation._reduce_pairs
+    def recording_reduce_pairs(n_cards, source, *arrays):
+        sizes.append(len(source))
+        return reduce_pairs(n_cards, source, *arrays)
+    monkeypatch.setattr(aggregation, '_reduce_pairs', recording_reduce_pairs)
+    matrix = random_matrix(2000, 80, 40, seed = 5)
+    n_pairs = (np.diff(matrix.indptr)*(np.diff(matrix.indptr) - 1)//2).sum()
+    sparse = matrix.cooccurrence()
+    assert sparse[2].sum() == n_pairs
+    assert len(sizes) > 10
+    assert max(sizes) <= len(sparse[0]) + 2*chunk_size
+    monkeypatch.setattr(aggregation, 'DENSE_PAIR_LIMIT', 2**24)
+    assert all([(dense_array == sparse_array).all() for dense_array, sparse_array in zip(matrix.cooccurrence(), sparse)])
+
+# Count and total of every card pair of a format of aggregated statistics, by name
+def named_pairs(cooccurrence, format_name):
+    source, target, count, total = [array.tolist() for array in cooccurrence.edges[format_name]]
+    return {(cooccurrence.names[s], cooccurrence.names[t]): (c, w) for s, t, c, w in zip(source, target, count, total)}
+
+def test_aggregate_formats_matches_deck_by_deck(random_decks, summation):
+    decks, _ = random_decks
+    cooccurrence = aggregate_formats(decks)
+    expected_all = {}
+    for format_name in ['Modern', 'Pauper']:
+        expected = {}
+        for deck in decks[format_name]:
+            names = sorted(deck)
+            for i, name in enumerate(names):
+                for other in names[i + 1:]:
+                    count, total = expected.get((name, other), (0, 0))
+                    expected[name, other] = (count + 1, total + deck[name]['qty']*deck[other]['qty'])
+                    count, total = expected_all.get((name, other), (0, 0))
+                    expected_all[name, other] = (count + 1, total + deck[name]['qty']*deck[other]['qty'])
+        assert named_pairs(cooccurrence, format_name) == expected
+    assert named_pairs(cooccurrence, 'All') == expected_all
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:48:37 2026
+
+@author: ToupinC
+
+The JSON API through the app's own server: revalidation with ETags, gzipped responses, pages of lists, and the errors
+returned for bad parameters and unknown formats and cards.
+"""
+import gzip
+import json
+
+import pytest
+
+from api import DEFAULT_PAGE_SIZE, GZIP_MIN_SIZE, MAX_HOPS, MAX_PAGE_SIZE
+from mavis import Mavis
+
+@pytest.fixture(scope = 'module')
+def mavis():
+    return Mavis()
+
+@pytest.fixture
+def client(mavis):
+    return mavis.app.server.test_client()
+
+@pytest.fixture(scope = 'module')
+def bolt(mavis):
+    return mavis.metagame.card_by_name('Lightning Bolt').id
+
+def test_etag_revalidation(client, bolt):
+    url = '/api/formats/Modern/cards/{}'.format(bolt)
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('W/"')
+    assert response.get_json()['name'] == 'Lightning Bolt'
+    revalidated = client.get(url, headers = {'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+    # The strong form of the tag matches too, and other tags do not
+    assert client.get(url, headers = {'If-None-Match': etag[2:]}).status_code == 304
+    assert client.get(url, headers = {'If-None-Match': '"stale"'}).status_code == 200
+    # Responses to other queries have other tags
+    assert client.get('/api/formats/Legacy/cards/{}'.format(bolt)).headers['ETag'] != etag
+
+def test_gzip(client, bolt):
+    url = '/api/formats/Modern/cards/{}/edges?limit=100'.format(bolt)
+    plain = client.get(url)
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.data) >= GZIP_MIN_SIZE
+    zipped = client.get(url, headers = {'Accept-Encoding': 'gzip, deflate'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    assert zipped.headers['ETag'] == plain.headers['ETag']
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+    # Small responses are sent as they are
+    small = client.get('/api/cards/{}'.format(bolt), headers = {'Accept-Encoding': 'gzip'})
+    assert len(small.data) < GZIP_MIN_SIZE
+    assert 'Content-Encoding' not in small.headers
+
+def test_pages(client, bolt):
+    url = '/api/formats/Modern/cards/{}/neighbourhood?hops=2'.format(bolt)
+    first = client.get(url).get_json()
+    assert first['total'] == 128
+    assert (first['offset'], first['limit'], len(first['items'])) == (0, DEFAULT_PAGE_SIZE, DEFAULT_PAGE_SIZE)
+    items = first['items']
+    page = first
+    while page['next'] is not None:
+        page = client.get(page['next']).get_json()
+        items += page['items']
+    assert page['offset'] == 2*DEFAULT_PAGE_SIZE
+    assert len(page['items']) == 128 - 2*DEFAULT_PAGE_SIZE
+    assert len(items) == 128
+    assert len(set([item['id'] for item in items])) == 128
+    # Nearest first
+    assert [item['hops'] for item in items] == sorted([item['hops'] for item in items])
+    assert items[0]['id'] == bolt
+    # Pages past the end are empty, and a page ending at the end has no next page
+    assert client.get(url + '&offset=1000').get_json()['items'] == []
+    last = client.get(url + '&offset=28&limit=100').get_json()
+    assert (len(last['items']), last['next']) == (100, None)
+    assert len(client.get(url + '&limit={}'.format(MAX_PAGE_SIZE)).get_json()['items']) == 128
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit={}'.format(MAX_PAGE_SIZE + 1), 'offset=-1', 'offset=first',
+                                   'hops=0', 'hops={}'.format(MAX_HOPS + 1), 'min_count=0', 'pruning=most',
+                                   'start=0'])
+def test_bad_parameters(client, bolt, query):
+    response = client.get('/api/formats/Modern/cards/{}/neighbourhood?{}'.format(bolt, query))
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+@pytest.mark.parametrize('url', ['/api/formats/Vintage', '/api/formats/Vintage/cards', '/api/formats/Modern/cards/no-such-card',
+                                 '/api/formats/Modern/cards/no-such-card/related', '/api/cards/no-such-card'])
+def test_unknown_format_or_card(client, url):
+    response = client.get(url)
+    assert response.status_code == 404
+    assert response.get_json()['error']
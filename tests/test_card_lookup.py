@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:44:09 2026
+
+@author: ToupinC
+
+Looking cards up by name in both kinds of metagame: exact names find only the card of that name, even when other names
+start with it, searches list the exact card first, and cards added later are found too.
+"""
+import pytest
+
+from graph import Card, Edge
+from metagame import ArrayMetagame, Metagame
+
+NAMES = ['Optimistic Scavenger', 'Opt Out', 'Opt', 'Ornithopter', 'Thopter Foundry']
+
+# Cards of the given names, each played in more decks than the one before
+def cards(names, offset = 0):
+    return [Card(name, 'Instant', {'Modern': offset + i + 1}, {'Modern': 4*(offset + i + 1)}, node_id = 'card-{}'.format(offset + i))
+            for i, name in enumerate(names)]
+
+@pytest.fixture(params = [Metagame, ArrayMetagame])
+def metagame(request):
+    return request.param(*cards(NAMES))
+
+def test_exact_name(metagame):
+    assert metagame.card_by_name('Opt').id == 'card-2'
+    assert [card.id for card in metagame.cards_by_name('Opt', 'Opt Out', 'Counterspell')] == ['card-2', 'card-1']
+    assert metagame.card_by_name('opt') is None
+    assert metagame.card_by_name('Op') is None
+
+def test_exact_name_first_in_searches(metagame):
+    assert metagame.search('Opt')[0] == 'card-2'
+    assert metagame.search('opt', limit = 1) == ['card-2']
+    assert [card.id for card in metagame.search_cards('Opt', prefix = True)] == ['card-2', 'card-1', 'card-0']
+    assert [card.id for card in metagame.search_cards('Opt')] == ['card-2', 'card-1', 'card-0', 'card-4', 'card-3']
+
+def test_added_cards(metagame):
+    metagame.add_cards(*cards(['Counterspell', 'Opt'], offset = len(NAMES)))
+    assert metagame.card_by_name('Counterspell').id == 'card-5'
+    # The first card added under a name keeps it
+    assert metagame.card_by_name('Opt').id == 'card-2'
+    assert metagame.search('counterspell') == ['card-5']
+
+def test_edges_between_exact_names(metagame):
+    metagame.new_format('Modern', Edge(metagame.card_by_name('Opt'), metagame.card_by_name('Opt Out'), 3, 12))
+    edge = metagame.formats['Modern'].edge_between(metagame.card_by_name('Opt Out'), metagame.card_by_name('Opt'))
+    assert (edge.source.name, edge.target.name, edge.count) == ('Opt', 'Opt Out', 3)
+
+def test_json_edges_resolve_exact_names():
+    metagame = Metagame.from_json('data/cards.json', 'data/edges.json')
+    opt = metagame.card_by_name('Opt')
+    assert opt.name == 'Opt'
+    assert metagame.search('Opt')[0] == opt.id
+    edges = metagame.formats['All'].edges_at(opt.id)
+    assert edges
+    assert all([opt in (edge.source, edge.target) for edge in edges])
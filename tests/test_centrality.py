@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:58:14 2026
+
+@author: ToupinC
+
+Centrality metrics against plain Python implementations over dicts of neighbours: PageRank by iteration, Brandes'
+algorithm for betweenness, and peeling the card of lowest degree for core numbers.
+"""
+from collections import deque
+
+import numpy as np
+import pytest
+
+from centrality import betweenness, core_number, eigenvector_centrality, pagerank
+from graph import Adjacency
+
+# A random graph over n cards with m edges drawn at random, some of them loops, and a few cards without edges
+def random_adjacency(n, m, seed):
+    rng = np.random.default_rng(seed)
+    source, target = rng.integers(0, n, m), rng.integers(0, n, m)
+    keys = np.unique(np.minimum(source, target)*n + np.maximum(source, target))
+    source, target = np.divmod(keys, n)
+    count = rng.integers(1, 50, len(keys))
+    return Adjacency(n + 5, source, target, count, 3*count)
+
+# The deck count of the edge to every neighbour of every card with edges, loops left out
+def neighbours(adjacency):
+    result = {}
+    for source, target, count in zip(adjacency.source.tolist(), adjacency.target.tolist(), adjacency.count.tolist()):
+        if source != target:
+            result.setdefault(source, {})[target] = count
+            result.setdefault(target, {})[source] = count
+    return result
+
+def reference_pagerank(nbhd, damping = 0.85, iterations = 300):
+    rank = {card: 1/len(nbhd) for card in nbhd}
+    strength = {card: sum(weights.values()) for card, weights in nbhd.items()}
+    for _ in range(iterations):
+        rank = {card: (1 - damping)/len(nbhd) + damping*sum(rank[other]*weight/strength[other] for other, weight in weights.items())
+                for card, weights in nbhd.items()}
+    return rank
+
+def reference_betweenness(nbhd, sources = None):
+    centrality = dict.fromkeys(nbhd, 0.0)
+    for source in nbhd if sources is None else sources:
+        stack, predecessors = [], {card: [] for card in nbhd}
+        paths, distance = dict.fromkeys(nbhd, 0), dict.fromkeys(nbhd, -1)
+        paths[source], distance[source] = 1, 0
+        queue = deque([source])
+        while queue:
+            card = queue.popleft()
+            stack.append(card)
+            for other in nbhd[card]:
+                if distance[other] < 0:
+                    queue.append(other)
+                    distance[other] = distance[card] + 1
+                if distance[other] == distance[card] + 1:
+                    paths[other] += paths[card]
+                    predecessors[other].append(card)
+        dependency = dict.fromkeys(nbhd, 0.0)
+        while stack:
+            card = stack.pop()
+            for predecessor in predecessors[card]:
+                dependency[predecessor] += paths[predecessor]/paths[card]*(1 + dependency[card])
+            if card != source:
+                centrality[card] += dependency[card]
+    return {card: value/2 for card, value in centrality.items()}
+
+def reference_core_number(nbhd):
+    degree = {card: len(others) for card, others in nbhd.items()}
+    core, remaining = {}, set(nbhd)
+    while remaining:
+        card = min(remaining, key=lambda card: degree[card])
+        core[card] = degree[card]
+        remaining.remove(card)
+        for other in nbhd[card]:
+            if other in remaining and degree[other] > degree[card]:
+                degree[other] -= 1
+    return core
+
+GRAPHS = [(30, 60, 0), (120, 300, 1), (200, 1500, 2)]
+
+@pytest.mark.parametrize('n, m, seed', GRAPHS)
+def test_pagerank(n, m, seed):
+    adjacency = random_adjacency(n, m, seed)
+    nbhd = neighbours(adjacency)
+    expected = np.zeros(adjacency.n_cards)
+    for card, value in reference_pagerank(nbhd).items():
+        expected[card] = value
+    np.testing.assert_allclose(pagerank(adjacency), expected, atol=1e-9)
+
+@pytest.mark.parametrize('n, m, seed', GRAPHS)
+def test_eigenvector_centrality(n, m, seed):
+    adjacency = random_adjacency(n, m, seed)
+    matrix = np.zeros((adjacency.n_cards, adjacency.n_cards))
+    for card, weights in neighbours(adjacency).items():
+        for other, weight in weights.items():
+            matrix[card, other] = weight
+    _, vectors = np.linalg.eigh(matrix)
+    expected = np.abs(vectors[:, -1])/np.abs(vectors[:, -1]).max()
+    np.testing.assert_allclose(eigenvector_centrality(adjacency), expected, atol=1e-6)
+
+@pytest.mark.parametrize('n, m, seed', GRAPHS)
+def test_betweenness(n, m, seed):
+    adjacency = random_adjacency(n, m, seed)
+    expected = np.zeros(adjacency.n_cards)
+    for card, value in reference_betweenness(neighbours(adjacency)).items():
+        expected[card] = value
+    np.testing.assert_allclose(betweenness(adjacency, samples = adjacency.n_cards), expected, rtol=1e-9, atol=1e-9)
+
+def test_sampled_betweenness():
+    # A sample of sources gives their exact dependencies scaled up to every card with edges
+    adjacency = random_adjacency(200, 1500, 2)
+    nbhd = neighbours(adjacency)
+    cards = np.flatnonzero(adjacency.degree())
+    sources = np.sort(np.random.default_rng(0).choice(cards, 100, replace=False))
+    expected = np.zeros(adjacency.n_cards)
+    for card, value in reference_betweenness(nbhd, sources.tolist()).items():
+        expected[card] = value*len(cards)/len(sources)
+    sampled = betweenness(adjacency, samples = 100, seed = 0)
+    np.testing.assert_allclose(sampled, expected, rtol=1e-9, atol=1e-9)
+    exact = betweenness(adjacency, samples = adjacency.n_cards)
+    assert np.corrcoef(sampled[cards], exact[cards])[0, 1] > 0.85
+
+@pytest.mark.parametrize('n, m, seed', GRAPHS)
+def test_core_number(n, m, seed):
+    adjacency = random_adjacency(n, m, seed)
+    expected = np.zeros(adjacency.n_cards, dtype=np.int64)
+    for card, value in reference_core_number(neighbours(adjacency)).items():
+        expected[card] = value
+    np.testing.assert_array_equal(core_number(adjacency), expected)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:25:03 2026
+
+@author: ToupinC
+
+Partial updates of the render against the render itself: applying the patch sent for every change of the settings to
+the render before the change must give the render after it, as the browser only ever sees the patches.
+"""
+import copy
+import json
+
+import pytest
+
+from mavis import Mavis, ARCHETYPE_ATTRIBUTE
+from sessions import default_session_state
+
+@pytest.fixture(scope = 'module')
+def mavis():
+    return Mavis()
+
+# Applies a patch to a copy of a render the way Dash does in the browser
+def apply_patch(render, patch):
+    render = copy.deepcopy(render)
+    for operation in patch.to_plotly_json()['operations']:
+        assert operation['operation'] == 'Assign'
+        target = render
+        for key in operation['location'][:-1]:
+            target = target[key]
+        target[operation['location'][-1]] = operation['params']['value']
+    return render
+
+# Applies a setting to a session state and returns the patch of the render, with the other controls showing the state
+def update(mavis, state, input_id, **setting):
+    controls = {'format_selection': state['format'], 'nbhd_type': state['nbhd_type'], 'color_nodes_value': state['node_color_option'],
+                'size_nodes_value': state['size_nodes_option'], 'selection': state['selection']}
+    return mavis._update_settings(state, input_id, **{**controls, **setting})
+
+def busiest_cards(mavis, n):
+    return [node['id'] for node in sorted(mavis.data['nodes'], key=lambda node: -node['Number of Decks'])[:n]]
+
+def steps(mavis):
+    first, second = busiest_cards(mavis, 2)
+    return [('select_format', {'format_selection': 'Pauper'}),
+            ('size_nodes', {'size_nodes_value': 'PageRank'}),
+            ('color_nodes', {'color_nodes_value': ARCHETYPE_ATTRIBUTE}),
+            ('pruning', {'pruning': 'backbone'}),
+            ('select_format', {'format_selection': 'Modern'}),
+            ('node_budget', {'node_budget': '100'}),
+            ('more-detail-button', {}),
+            ('detail_metric', {'detail_metric': 'betweenness'}),
+            ('graph', {'selection': {'nodes': [first], 'edges': []}}),
+            ('nbhd_type', {'nbhd_type': 'neighbours'}),
+            ('nbhd_type', {'nbhd_type': '2-neighbours'}),
+            ('jump_to_card', {'jump_to_card': second}),
+            ('size_nodes', {'size_nodes_value': 'Number of Decks'}),
+            ('compare_with', {'compare_with': 'Legacy'}),
+            ('compare_with', {'compare_with': 'none'}),
+            ('archetype_view', {'archetype_view': 'archetypes'}),
+            ('archetype_view', {'archetype_view': 'cards'}),
+            ('nbhd_type', {'nbhd_type': 'None'}),
+            ('select_format', {'format_selection': 'All'}),
+            ('color_nodes', {'color_nodes_value': 'Card Type'}),
+            ('node_budget', {'node_budget': 'all'}),
+            ('pruning', {'pruning': 'none'}),
+            ('similarity_measure', {'similarity_measure': 'jaccard'})]
+
+def test_patches_match_renders(mavis):
+    state = default_session_state()
+    for input_id, setting in steps(mavis):
+        old_render = mavis._render(state)
+        patch = update(mavis, state, input_id, **setting)
+        assert apply_patch(old_render, patch) == mavis._render(state), input_id
+
+def test_unchanged_render_sends_nothing(mavis):
+    state = default_session_state()
+    patch = update(mavis, state, 'similarity_measure', similarity_measure='svd')
+    assert patch.to_plotly_json()['operations'] == []
+
+def test_patch_smaller_than_render(mavis):
+    # Every entry that changed is assigned on its own unless enough changed that the whole list is smaller
+    state = default_session_state()
+    old_render = mavis._render(state)
+    patch = update(mavis, state, 'select_format', format_selection='Pauper')
+    assert len(json.dumps(patch.to_plotly_json())) < len(json.dumps(mavis._render(state)))
+    assert apply_patch(old_render, patch) == mavis._render(state)
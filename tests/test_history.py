@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:14:52 2026
+
+@author: ToupinC
+
+Formats over windows of time against the statistics of only the decks of each window, counted deck by deck.
+"""
+import pytest
+
+from aggregation import aggregate_formats
+from history import period_range, period_start
+from metagame import ArrayMetagame, Metagame
+
+# Deck count and copies of every card and card pair of decklists, and their number of decks
+def reference_counts(decks):
+    cards, pairs = {}, {}
+    for deck in decks:
+        names = sorted(deck)
+        for i, name in enumerate(names):
+            count, total = cards.get(name, (0, 0))
+            cards[name] = (count + 1, total + deck[name]['qty'])
+            for other in names[i + 1:]:
+                count, total = pairs.get((name, other), (0, 0))
+                pairs[name, other] = (count + 1, total + deck[name]['qty']*deck[other]['qty'])
+    return cards, pairs, len(decks)
+
+# The deck count and copies of every card with decks and every edge of a format, by name
+def format_counts(meta_format):
+    metagame = meta_format.metagame
+    name = lambda i: metagame.card_at(i).name
+    cards = {name(i): (count, total) for i, (count, total) in enumerate(zip(meta_format.card_counts().tolist(), meta_format.card_totals().tolist()))
+             if count}
+    pairs = {tuple(sorted((name(source), name(target)))): (count, total)
+             for source, target, count, total in zip(*[array.tolist() for array in (meta_format.arrays.source, meta_format.arrays.target,
+                                                                                      meta_format.arrays.count, meta_format.arrays.total)])}
+    return cards, pairs, meta_format.deck_count()
+
+@pytest.fixture
+def windowed_decks(random_decks):
+    decks, dates = random_decks
+    periods = period_range(min(min(format_dates) for format_dates in dates.values()), max(max(format_dates) for format_dates in dates.values()))
+    metagame = aggregate_formats(decks, dates).to_metagame(min_count = 1)
+    return decks, dates, periods, metagame
+
+# The decks of a format whose dates are in periods start to end, both included, with 'All' holding every format's
+def decks_in_window(decks, dates, periods, format_name, start, end):
+    window = set(periods[start:end + 1])
+    format_names = [name for name in decks if name != 'All'] if format_name == 'All' else [format_name]
+    return [deck for name in format_names for deck, date in zip(decks[name], dates[name]) if period_start(date) in window]
+
+WINDOWS = [(0, 0), (0, 10), (3, 5), (10, 10), (4, 4), (2, 9)]
+
+@pytest.mark.parametrize('format_name', ['Modern', 'Pauper', 'All'])
+@pytest.mark.parametrize('start, end', WINDOWS)
+def test_windowed(windowed_decks, format_name, start, end):
+    decks, dates, periods, metagame = windowed_decks
+    assert len(periods) == 11
+    window = metagame[format_name].windowed(start, end)
+    assert format_counts(window) == reference_counts(decks_in_window(decks, dates, periods, format_name, start, end))
+
+@pytest.mark.parametrize('min_count', [2, 4])
+def test_windowed_min_count(windowed_decks, min_count):
+    decks, dates, periods, metagame = windowed_decks
+    cards, pairs, n_decks = reference_counts(decks_in_window(decks, dates, periods, 'Modern', 2, 8))
+    window = metagame['Modern'].windowed(2, 8, min_count = min_count)
+    assert format_counts(window) == (cards, {pair: counts for pair, counts in pairs.items() if counts[0] >= min_count}, n_decks)
+
+def test_whole_history(windowed_decks):
+    # The window of every period has the statistics of the whole format
+    decks, dates, periods, metagame = windowed_decks
+    for format_name in ['Modern', 'Pauper']:
+        assert format_counts(metagame[format_name]) == reference_counts(decks[format_name])
+        assert format_counts(metagame[format_name].windowed(0, len(periods) - 1)) == reference_counts(decks[format_name])
+
+@pytest.mark.parametrize('metagame_class', [Metagame, ArrayMetagame])
+def test_snapshot_history(windowed_decks, tmp_path, metagame_class):
+    decks, dates, periods, metagame = windowed_decks
+    metagame.save_snapshot(str(tmp_path/'metagame.snapshot'))
+    loaded = metagame_class.load_snapshot(str(tmp_path/'metagame.snapshot'), min_count = 1)
+    assert loaded['Modern'].history.periods == periods
+    assert format_counts(loaded['Modern'].windowed(3, 7)) == reference_counts(decks_in_window(decks, dates, periods, 'Modern', 3, 7))
+
+def test_invalid_window(windowed_decks):
+    _, _, periods, metagame = windowed_decks
+    with pytest.raises(ValueError):
+        metagame['Modern'].windowed(5, 4)
+    with pytest.raises(ValueError):
+        metagame['Modern'].windowed(0, len(periods))
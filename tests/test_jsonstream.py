@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:06:41 2026
+
+@author: ToupinC
+
+The streaming reader against json.load, on documents shaped like the edge file and written compactly or indented, with
+chunks small enough to split every kind of value.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from jsonstream import iter_json_lists
+
+# A random JSON value of the kinds found in edge files and a few more, with escapes and non-ASCII strings
+def random_value(rng, depth = 0):
+    kind = rng.integers(0, 8 if depth < 3 else 5)
+    if kind == 0:
+        return int(rng.integers(-10**12, 10**12))
+    if kind == 1:
+        return float(rng.normal()*10.0**rng.integers(-8, 8))
+    if kind == 2:
+        return ''.join(rng.choice(list('ab "\\/\n\té€💡'), rng.integers(0, 12)).tolist())
+    if kind == 3:
+        return [None, True, False][rng.integers(0, 3)]
+    if kind == 4:
+        return int(rng.integers(0, 10))
+    if kind == 5:
+        return [random_value(rng, depth + 1) for _ in range(rng.integers(0, 4))]
+    return {'key{}'.format(i): random_value(rng, depth + 1) for i in range(rng.integers(0, 4))}
+
+def random_document(seed):
+    rng = np.random.default_rng(seed)
+    document = {}
+    for format_name in ['Standard', 'Pioneer', 'Mod"ern', 'Légacy', 'Empty']:
+        items = 0 if format_name == 'Empty' else rng.integers(1, 30)
+        document[format_name] = [{'key': ['Card {}'.format(rng.integers(0, 100)), 'Card {}'.format(rng.integers(0, 100))],
+                                  'value': {'count': int(rng.integers(1, 1000)), 'total': int(rng.integers(1, 4000))}}
+                                 if rng.random() < 0.5 else random_value(rng) for _ in range(items)]
+    return document
+
+def flatten(document):
+    return [(key, item) for key, items in document.items() for item in items]
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('indent', [None, 2])
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 16])
+def test_iter_json_lists(tmp_path, seed, indent, chunk_size):
+    fp = str(tmp_path/'edges.json')
+    with open(fp, 'w') as json_file:
+        json.dump(random_document(seed), json_file, indent = indent)
+    with open(fp, 'r') as json_file:
+        expected = flatten(json.load(json_file))
+    assert list(iter_json_lists(fp, chunk_size)) == expected
+
+def test_edge_file(tmp_path):
+    with open('data/edges.json', 'r') as json_file:
+        expected = flatten(json.load(json_file))
+    assert list(iter_json_lists('data/edges.json', 1000)) == expected
+
+@pytest.mark.parametrize('text', ['{}', ' { } ', '{"a": []}', '{"a": [], "b": [1]}'])
+def test_empty(tmp_path, text):
+    fp = str(tmp_path/'edges.json')
+    with open(fp, 'w') as json_file:
+        json_file.write(text)
+    assert list(iter_json_lists(fp, 2)) == flatten(json.loads(text))
+
+@pytest.mark.parametrize('text', ['', '[1, 2]', '{"a": [1, 2', '{"a": [1, 2]', '{"a": [1 2]}', '{"a": 1}', '{"a": [tru]}', '{"a": [1],}'])
+def test_malformed(tmp_path, text):
+    fp = str(tmp_path/'edges.json')
+    with open(fp, 'w') as json_file:
+        json_file.write(text)
+    with pytest.raises(ValueError):
+        list(iter_json_lists(fp, 3))
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:12:40 2026
+
+@author: ToupinC
+
+Neighbourhoods of the default metagame against a plain Python breadth-first search over the format's edges, one card
+at a time, for every format and a spread of source cards.
+"""
+from collections import deque
+
+import pytest
+
+from metagame import Metagame
+
+@pytest.fixture(scope = 'module')
+def metagame():
+    return Metagame.from_json('data/cards.json', 'data/edges.json')
+
+# Breadth-first search from the seed card IDs. Returns each reached card's distance in hops and the IDs of the edges
+# at the cards less than n hops away, skipping edges in fewer than min_count decks.
+def naive_bfs(meta_format, seeds, n, min_count = None):
+    distances = {seed: 0 for seed in seeds}
+    edges = set()
+    queue = deque(seeds)
+    while queue:
+        card_id = queue.popleft()
+        if distances[card_id] == n:
+            continue
+        for edge in meta_format.edges_at(card_id):
+            if min_count is not None and edge.count < min_count:
+                continue
+            edges.add(edge.id)
+            other = edge.target.id if edge.source.id == card_id else edge.source.id
+            if other not in distances:
+                distances[other] = distances[card_id] + 1
+                queue.append(other)
+    return distances, edges
+
+# A few of the most and least connected cards of a format
+def source_cards(metagame, meta_format):
+    card_ids = sorted([card_id for card_id in metagame.cards if meta_format.edges_at(card_id)],
+                      key = lambda card_id: (len(meta_format.edges_at(card_id)), card_id))
+    return [metagame.cards[card_id] for card_id in card_ids[:3] + card_ids[len(card_ids)//2:][:3] + card_ids[-3:]]
+
+@pytest.mark.parametrize('format_name', ['Standard', 'Pioneer', 'Modern', 'Legacy', 'Pauper', 'All'])
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_neighbourhood_matches_naive_bfs(metagame, format_name, n):
+    meta_format = metagame.formats[format_name]
+    for src_card in source_cards(metagame, meta_format):
+        cards, edges, distances = meta_format.neighbourhood([src_card], n)
+        expected_distances, expected_edges = naive_bfs(meta_format, [src_card.id], n)
+        assert distances == expected_distances
+        assert sorted([card.id for card in cards]) == sorted(expected_distances)
+        assert sorted([edge.id for edge in edges]) == sorted(expected_edges)
+
+def test_neighbourhood_of_several_cards_with_min_count(metagame):
+    meta_format = metagame.formats['Modern']
+    src_cards = source_cards(metagame, meta_format)[-2:]
+    _, edges, distances = meta_format.neighbourhood(src_cards, 2, min_count = 20)
+    expected_distances, expected_edges = naive_bfs(meta_format, [card.id for card in src_cards], 2, min_count = 20)
+    assert distances == expected_distances
+    assert sorted([edge.id for edge in edges]) == sorted(expected_edges)
+
+def test_lightning_bolt_in_modern(metagame):
+    cards, _ = metagame.formats['Modern'].n_neighbours(metagame.card_by_name('Lightning Bolt'), 2)
+    assert len(cards) == 128
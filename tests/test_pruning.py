@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:52:36 2026
+
+@author: ToupinC
+
+Edge scores and pruned formats against scores computed pair by pair from the decklists, with exact hypergeometric tails.
+"""
+from fractions import Fraction
+import math
+
+import numpy as np
+import pytest
+
+from aggregation import aggregate_formats
+from pruning import PRUNING_PRESETS, edge_scores, hypergeometric_log_sf
+
+# P(X >= k) for X hypergeometric, summed exactly
+def exact_sf(k, population, successes, draws):
+    tail = sum(math.comb(successes, x)*math.comb(population - successes, draws - x) for x in range(k, min(successes, draws) + 1))
+    return Fraction(tail, math.comb(population, draws))
+
+def exact_log_sf(k, population, successes, draws):
+    sf = exact_sf(k, population, successes, draws)
+    return math.log(sf.numerator) - math.log(sf.denominator)
+
+@pytest.mark.parametrize('k, population, successes, draws', [
+    (0, 10, 3, 4), (1, 10, 3, 4), (3, 10, 3, 4), (2, 50, 10, 10), (5, 50, 10, 10), (10, 50, 10, 10),
+    (30, 200, 60, 80), (20, 200, 60, 80), (60, 200, 60, 80), (150, 500, 200, 200), (80, 500, 200, 200),
+    (1, 1000, 1, 1), (12, 1000, 40, 30), (40, 100, 90, 45)])
+def test_hypergeometric_log_sf(k, population, successes, draws):
+    log_sf = hypergeometric_log_sf([k], population, [successes], [draws])[0]
+    assert log_sf == pytest.approx(exact_log_sf(k, population, successes, draws), rel=1e-6, abs=1e-9)
+
+def test_hypergeometric_log_sf_random():
+    rng = np.random.default_rng(3)
+    population = 300
+    successes = rng.integers(1, population, 200)
+    draws = rng.integers(1, population, 200)
+    k = np.array([rng.integers(max(0, d - (population - s)), min(s, d) + 1) for s, d in zip(successes, draws)])
+    expected = [exact_log_sf(*params) for params in zip(k.tolist(), [population]*len(k), successes.tolist(), draws.tolist())]
+    np.testing.assert_allclose(hypergeometric_log_sf(k, population, successes, draws), expected, rtol=1e-6, atol=1e-9)
+
+# Deck count of every card and card pair of a format's decklists, and its number of decks
+def deck_counts(decks):
+    cards, pairs = {}, {}
+    for deck in decks:
+        names = sorted(deck)
+        for i, name in enumerate(names):
+            cards[name] = cards.get(name, 0) + 1
+            for other in names[i + 1:]:
+                pairs[name, other] = pairs.get((name, other), 0) + 1
+    return cards, pairs, len(decks)
+
+def reference_score(measure, count, source_count, target_count, n_decks):
+    if measure == 'count':
+        return count
+    if measure == 'lift':
+        return count*n_decks/(source_count*target_count)
+    if measure == 'pmi':
+        return math.log2(count*n_decks/(source_count*target_count))
+    if measure == 'jaccard':
+        return count/(source_count + target_count - count)
+    return -exact_log_sf(count, n_decks, source_count, target_count)/math.log(10)
+
+@pytest.fixture
+def modern(random_decks):
+    decks, dates = random_decks
+    return decks['Modern'], aggregate_formats(decks, dates).to_metagame(min_count = 1)['Modern']
+
+# The (source name, target name) pair of every edge of a format's arrays
+def edge_names(meta_format):
+    return [tuple(sorted((meta_format.metagame.card_at(source).name, meta_format.metagame.card_at(target).name)))
+            for source, target in zip(meta_format.arrays.source.tolist(), meta_format.arrays.target.tolist())]
+
+@pytest.mark.parametrize('measure', ['count', 'lift', 'pmi', 'jaccard', 'significance'])
+def test_edge_scores(modern, measure):
+    decks, meta_format = modern
+    cards, pairs, n_decks = deck_counts(decks)
+    assert meta_format.deck_count() == n_decks
+    expected = [reference_score(measure, pairs[pair], cards[pair[0]], cards[pair[1]], n_decks) for pair in edge_names(meta_format)]
+    np.testing.assert_allclose(meta_format.edge_scores(measure), expected, rtol=1e-6, atol=1e-9)
+
+def test_edge_scores_estimate_deck_count():
+    # Without the number of decks, the smallest number the card and pair counts fit in is used
+    scores = edge_scores('lift', [2, 1], [5, 3], [4, 6], None)
+    np.testing.assert_allclose(scores, [2*8/20, 1*8/18])
+
+@pytest.mark.parametrize('pruning', [pruning for pruning in PRUNING_PRESETS if pruning != 'none'])
+def test_pruned(modern, pruning):
+    decks, meta_format = modern
+    _, measure, threshold, top_k = PRUNING_PRESETS[pruning]
+    cards, pairs, n_decks = deck_counts(decks)
+    names = edge_names(meta_format)
+    scores = {pair: reference_score(measure, pairs[pair], cards[pair[0]], cards[pair[1]], n_decks) for pair in names}
+    kept = set([pair for pair in names if threshold is None or scores[pair] >= threshold - 1e-9])
+    if top_k is not None:
+        # An edge is kept when it is among the top_k highest scoring kept edges of either of its cards. Ties are broken
+        # by the format's own scores, in the order of each card's neighbours.
+        own_scores = dict(zip(names, meta_format.edge_scores(measure).tolist()))
+        card_index = {meta_format.metagame.card_at(i).name: i for i in range(len(meta_format.metagame.card_ids))}
+        neighbour = lambda card, pair: card_index[pair[1] if pair[0] == card else pair[0]]
+        top = set()
+        for card in cards:
+            card_pairs = sorted([pair for pair in kept if card in pair], key=lambda pair: (-own_scores[pair], neighbour(card, pair)))
+            top.update(card_pairs[:top_k])
+        kept = top
+    assert set(edge_names(meta_format.pruned(measure, threshold, top_k))) == kept
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:44:19 2026
+
+@author: ToupinC
+
+Runs the scraper against recorded pages served by FixtureServer: one search with a matching event, whose event page
+links to two decks.
+"""
+import json
+import os
+import shutil
+from urllib.parse import urlsplit
+
+import pytest
+
+from deck_cache import DeckCache
+from mtggoldfish_deck_scraper import Fetcher, FixtureServer, fixture_name, scrape_decks, search_date, search_url
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'mtggoldfish')
+SEARCH = {'search_start': search_date('2026-10-05'),
+          'search_end': search_date('2026-10-11'),
+          'search_format': 'Modern',
+          'tournament_name': 'Modern Challenge'}
+DECKS = [{'Ragavan, Nimble Pilferer': {'qty': 4, 'type': 'Creature'},
+          'Guide of Souls': {'qty': 4, 'type': 'Creature'},
+          'Lightning Bolt': {'qty': 4, 'type': 'Instant'}},
+         {'Primeval Titan': {'qty': 4, 'type': 'Creature'},
+          'Amulet of Vigor': {'qty': 4, 'type': 'Artifact'}}]
+
+# The path of a URL with its query, as requested from FixtureServer
+def page_path(url):
+    parts = urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+# Records the fixture pages in a directory under the names a Fetcher would have recorded them for the given base URL
+def record(directory, base_url):
+    pages = {search_url(base_url, 1, SEARCH['search_start'], SEARCH['search_end'], 'Modern'): 'search.html',
+             search_url(base_url, 2, SEARCH['search_start'], SEARCH['search_end'], 'Modern'): 'search_empty.html',
+             base_url + '/tournament/5001': 'event.html',
+             base_url + '/deck/9001': 'deck_9001.html',
+             base_url + '/deck/9002': 'deck_9002.html'}
+    for url, page in pages.items():
+        shutil.copy(os.path.join(FIXTURES, page), os.path.join(directory, fixture_name(url)))
+
+def scrape(server, cache = None, retries = 4):
+    fetcher = Fetcher(rate_per_host = 1000, retries = retries, backoff = 0)
+    try:
+        return scrape_decks([SEARCH], fetcher, server.url, max_workers = 4, cache = cache)
+    finally:
+        fetcher.close()
+
+def by_cards(decks):
+    return sorted(decks, key = lambda deck: json.dumps(deck, sort_keys = True))
+
+@pytest.fixture
+def server(tmp_path):
+    with FixtureServer(str(tmp_path)) as fixture_server:
+        record(str(tmp_path), fixture_server.url)
+        yield fixture_server
+
+def test_scrape_fixture_pages(server):
+    decks, dates = scrape(server)
+    assert by_cards(decks['Modern']) == by_cards(DECKS)
+    assert dates == {'Modern': ['2026-10-10', '2026-10-10']}
+
+def test_transient_failures_are_retried(server):
+    server.failures[page_path(server.url + '/deck/9001')] = [429, 503]
+    server.failures[page_path(server.url + '/tournament/5001')] = [500]
+    decks, _ = scrape(server)
+    assert by_cards(decks['Modern']) == by_cards(DECKS)
+    assert not any(server.failures.values())
+
+def test_pages_failing_every_retry_are_skipped(server):
+    server.failures[page_path(server.url + '/deck/9002')] = [502]*3
+    decks, _ = scrape(server, retries = 2)
+    assert decks['Modern'] == DECKS[:1]
+
+def test_deck_cache_round_trip(server, tmp_path):
+    cache = DeckCache(str(tmp_path/'decks.sqlite'))
+    decks, dates = scrape(server, cache)
+    assert len(cache) == 2
+    cached_decks, cached_dates = cache.decks(with_dates = True)
+    assert by_cards(cached_decks['Modern']) == by_cards(decks['Modern'])
+    assert cached_dates == dates
+    # Without a fetcher, the consumed search page and everything it links to come from the cache
+    offline_decks, offline_dates = scrape_decks([SEARCH], None, server.url, cache = DeckCache(str(tmp_path/'decks.sqlite')))
+    assert by_cards(offline_decks['Modern']) == by_cards(DECKS)
+    assert offline_dates == dates
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:15:41 2026
+
+@author: ToupinC
+
+Card name search: the order of exact, prefix, word prefix, substring and fuzzy matches, diacritics, and edit
+distances against a plain Levenshtein distance.
+"""
+import numpy as np
+import pytest
+
+from search import CardNameIndex, edit_distance, normalize_name
+
+NAMES = ['Opt', 'Optimistic Scavenger', 'Opt Out', 'Ornithopter', 'Sublime Epiphany', 'Thopter Foundry',
+         "Lim-Dûl's Vault", 'Lim-Dûl the Necromancer', 'Lightning Bolt', 'Lightning Helix', 'Counterspell',
+         'Force of Will', 'Thoughtseize', 'Thought Scour', 'Fatal Push']
+
+@pytest.fixture
+def index():
+    # Later names are played in more decks, so that ties are not broken by name alone
+    return CardNameIndex(['id-{}'.format(i) for i in range(len(NAMES))], NAMES, np.arange(len(NAMES)))
+
+# Names of the keys returned by a search
+def search(index, query, **kwargs):
+    return [NAMES[int(key[3:])] for key in index.search(query, **kwargs)]
+
+# Levenshtein distance by the full dynamic program
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            current.append(min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (a[i-1] != b[j-1])))
+        previous = current
+    return previous[-1]
+
+def test_exact_before_prefix(index):
+    assert search(index, 'Opt', limit = None) == ['Opt', 'Opt Out', 'Optimistic Scavenger', 'Thopter Foundry', 'Ornithopter']
+    assert search(index, 'opt', limit = 1) == ['Opt']
+    assert search(index, 'OPT', mode = 'prefix', limit = None) == ['Opt', 'Opt Out', 'Optimistic Scavenger']
+
+def test_ranks(index):
+    # Names starting with the query, then names with a word starting with it, then names containing it, each by weight
+    assert search(index, 'thought', limit = None) == ['Thought Scour', 'Thoughtseize']
+    assert search(index, 'bolt', limit = None) == ['Lightning Bolt']
+    assert search(index, 'lightning', limit = None) == ['Lightning Helix', 'Lightning Bolt']
+    assert search(index, 'hopt', mode = 'substring', limit = None) == ['Thopter Foundry', 'Ornithopter']
+    assert search(index, 'ning', limit = None) == ['Lightning Helix', 'Lightning Bolt']
+
+def test_diacritics_and_punctuation(index):
+    assert normalize_name("Lim-Dûl's Vault") == "lim dul's vault"
+    assert search(index, 'lim-dul', limit = None) == ['Lim-Dûl the Necromancer', "Lim-Dûl's Vault"]
+    assert search(index, 'LIM DÛL THE', limit = None) == ['Lim-Dûl the Necromancer']
+    assert search(index, "dul's vault") == ["Lim-Dûl's Vault"]
+
+def test_substring_by_trigrams(index):
+    assert search(index, 'piph', mode = 'substring', limit = None) == ['Sublime Epiphany']
+    assert search(index, 'of wi', mode = 'substring', limit = None) == ['Force of Will']
+    # Queries too short for trigrams inside a word are scanned for instead
+    assert search(index, 'x', mode = 'substring', limit = None) == ['Lightning Helix']
+    assert search(index, 'zz', limit = None) == []
+
+def test_fuzzy(index):
+    # One typo in queries of fewer than eight characters, two in longer ones
+    assert search(index, 'Forse') == ['Force of Will']
+    assert search(index, 'Fatl Push') == ['Fatal Push']
+    assert search(index, 'Fotce', mode = 'substring') == []
+    assert search(index, 'Frse') == []
+    assert search(index, 'Conterspel') == ['Counterspell']
+    assert search(index, 'Cntrspell') == []
+    assert search(index, 'Lightnig Bolt', limit = None) == ['Lightning Bolt']
+    # Queries of fewer than four characters are never fuzzy
+    assert search(index, 'Opx') == []
+
+def test_fuzzy_only_fills_the_limit():
+    index = CardNameIndex(['fight', 'light', 'bolt'], ['Fight', 'Light', 'Lightning Bolt'], [3, 2, 1])
+    # Enough exact and prefix matches leave no room for fuzzy ones, which rank last however often they are played
+    assert index.search('light', limit = 2) == ['light', 'bolt']
+    assert index.search('light', limit = 3) == ['light', 'bolt', 'fight']
+    assert index.search('light', limit = None) == ['light', 'bolt', 'fight']
+
+def test_empty_queries(index):
+    assert search(index, '') == []
+    assert search(index, None) == []
+    assert search(index, ' -- ') == []
+
+@pytest.mark.parametrize('max_distance', [1, 2, 3])
+def test_edit_distance(max_distance):
+    rng = np.random.default_rng(max_distance)
+    for _ in range(2000):
+        a = ''.join(rng.choice(list('abc'), rng.integers(0, 7)))
+        b = ''.join(rng.choice(list('abc'), rng.integers(0, 7)))
+        assert edit_distance(a, b, max_distance) == min(levenshtein(a, b), max_distance + 1)
+    assert edit_distance('thoughtseize', 'thoughtseise', max_distance) == 1
+    assert edit_distance('counterspell', 'conterspel', max_distance) == min(2, max_distance + 1)
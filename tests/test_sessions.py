@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:31:12 2026
+
+@author: ToupinC
+
+Session stores: every store keeps the state of each session apart from the others and from the default state, the
+in-process store forgets its least recently used sessions, and the shared stores forget sessions after their TTL.
+"""
+import pytest
+
+import sessions
+from sessions import (DEFAULT_SESSION_TTL, LRUSessionStore, LocalRedis, RedisSessionStore, SQLiteSessionStore,
+                      create_session_store, default_session_state)
+
+# Stands in for the time module of the session stores, so that sessions expire without waiting
+class Clock:
+    def __init__(self):
+        self.now = 1.8e9
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, 'time', clock)
+    return clock
+
+@pytest.fixture(params = ['memory', 'sqlite', 'redis'])
+def store(request, tmp_path, clock):
+    if request.param == 'memory':
+        return LRUSessionStore(max_sessions = 3)
+    if request.param == 'sqlite':
+        return SQLiteSessionStore(str(tmp_path/'sessions.sqlite'))
+    return RedisSessionStore(LocalRedis())
+
+def test_get_and_set(store):
+    assert store.get('a') == default_session_state()
+    assert store.get(None) == default_session_state()
+    store.set('a', {'format': 'Modern', 'expanded': [3]})
+    store.set('b', {**default_session_state(), 'format': 'Pauper'})
+    assert store.get('a') == {**default_session_state(), 'format': 'Modern', 'expanded': [3]}
+    assert store.get('b')['format'] == 'Pauper'
+    # States are copies, so changing what was set or got does not change the session
+    state = store.get('a')
+    state['expanded'].append(4)
+    assert store.get('a')['expanded'] == [3]
+    store.set('a', {'format': 'Legacy'})
+    assert store.get('a') == {**default_session_state(), 'format': 'Legacy'}
+    # Sessions without an id are never stored
+    store.set('', {'format': 'Legacy'})
+    assert store.get('') == default_session_state()
+
+def test_lru_eviction(clock):
+    store = LRUSessionStore(max_sessions = 3)
+    for session_id in 'abc':
+        store.set(session_id, {'format': session_id})
+    # Getting a session makes it the most recently used
+    store.get('a')
+    store.set('d', {'format': 'd'})
+    assert [store.get(session_id)['format'] for session_id in 'abcd'] == ['a', 'All', 'c', 'd']
+
+@pytest.mark.parametrize('backend', ['sqlite', 'redis'])
+def test_expiry(backend, tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path/'sessions.sqlite'), ttl = 60) if backend == 'sqlite' else RedisSessionStore(LocalRedis(), ttl = 60)
+    store.set('a', {'format': 'Modern'})
+    clock.now += 30
+    store.set('b', {'format': 'Pauper'})
+    clock.now += 31
+    assert store.get('a') == default_session_state()
+    assert store.get('b')['format'] == 'Pauper'
+    clock.now += 30
+    assert store.get('b') == default_session_state()
+
+def test_sqlite_sessions_are_shared(tmp_path, clock):
+    fp = str(tmp_path/'sessions.sqlite')
+    SQLiteSessionStore(fp).set('a', {'format': 'Modern'})
+    assert SQLiteSessionStore(fp).get('a')['format'] == 'Modern'
+    # Expired sessions are deleted by the next write
+    clock.now += DEFAULT_SESSION_TTL + 1
+    store = SQLiteSessionStore(fp)
+    store.set('b', {'format': 'Pauper'})
+    assert store._connection().execute('SELECT id FROM sessions').fetchall() == [('b',)]
+
+def test_create_session_store(monkeypatch, tmp_path):
+    monkeypatch.delenv('MAVIS_SESSION_STORE', raising = False)
+    assert isinstance(create_session_store(), LRUSessionStore)
+    assert isinstance(create_session_store('memory'), LRUSessionStore)
+    store = create_session_store('local-redis')
+    assert isinstance(store, RedisSessionStore) and isinstance(store.client, LocalRedis)
+    monkeypatch.setenv('MAVIS_SESSION_STORE', 'sqlite')
+    monkeypatch.setenv('MAVIS_SESSION_DB', str(tmp_path/'sessions.sqlite'))
+    store = create_session_store()
+    assert isinstance(store, SQLiteSessionStore)
+    assert store.fp == str(tmp_path/'sessions.sqlite')
+    with pytest.raises(ValueError, match = 'memcached'):
+        create_session_store('memcached')
+    monkeypatch.setenv('MAVIS_SESSION_STORE', 'shelve')
+    with pytest.raises(ValueError, match = 'shelve'):
+        create_session_store()
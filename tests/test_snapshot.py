@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:03:55 2026
+
+@author: ToupinC
+
+Snapshots of the default metagame against its JSON files: a snapshot of every edge, loaded without the edges in fewer
+than min_count decks, has the cards and edges of the JSON files loaded with the same min_count, in every format.
+"""
+import pytest
+
+from metagame import ArrayMetagame, Metagame
+
+@pytest.fixture(scope = 'module')
+def snapshot_fp(tmp_path_factory):
+    snapshot_fp = str(tmp_path_factory.mktemp('snapshot')/'metagame.snapshot')
+    Metagame.from_json('data/cards.json', 'data/edges.json', min_count = 1).save_snapshot(snapshot_fp)
+    return snapshot_fp
+
+# Name, type and counts of every card by ID
+def card_counts(metagame):
+    return {card.id: (card.name, card.type, dict(card.count), dict(card.total)) for card in metagame.cards.values()}
+
+# Deck count and copies of every edge of a format by the IDs of the cards it connects
+def edge_counts(meta_format):
+    return {frozenset((edge.source.id, edge.target.id)): (edge.count, edge.total) for edge in meta_format.edges.values()}
+
+@pytest.mark.parametrize('metagame_class', [ArrayMetagame, Metagame])
+@pytest.mark.parametrize('min_count', [1, 6, 20])
+def test_snapshot_matches_json(snapshot_fp, metagame_class, min_count):
+    expected = Metagame.from_json('data/cards.json', 'data/edges.json', min_count = min_count)
+    loaded = metagame_class.load_snapshot(snapshot_fp, min_count = min_count)
+    assert card_counts(loaded) == card_counts(expected)
+    assert list(loaded.formats) == list(expected.formats)
+    for format_name, meta_format in expected.formats.items():
+        loaded_format = loaded.formats[format_name]
+        assert len(loaded_format.edges) == len(meta_format.edges)
+        assert edge_counts(loaded_format) == edge_counts(meta_format)
+        assert sorted(loaded_format.node_stats()) == sorted(meta_format.node_stats())
+        for card_id in list(meta_format.node_stats())[:20]:
+            assert sorted([edge.id for edge in loaded_format.edges_at(card_id)]) == sorted([edge.id for edge in meta_format.edges_at(card_id)])
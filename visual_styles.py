@@ -4,10 +4,13 @@ Created on Wed Dec  8 23:21:28 2021
 
 Adapted from the Jaal package.
 """
+from functools import lru_cache
 import visdcc
 from dash import dcc, html
 import dash_bootstrap_components as dbc
-import pandas as pd
+import numpy as np
+from palette import extend_palette
+from pruning import PRUNING_PRESETS
 
 # Constants
 
@@ -40,6 +43,16 @@ DEFAULT_NODE_SIZE = 7
 DEFAULT_NODE_COLOR = DEFAULT_COLOR
 DEFAULT_EDGE_WIDTH = 1
 DEFAULT_EDGE_COLOR = DEFAULT_COLOR
+# Number of cards that can be shown at once for level of detail, with the default
+NODE_BUDGETS = ['100', '250', '500', '1000']
+DEFAULT_NODE_BUDGET = '500'
+# Most dates labelled under the date window slider
+MAX_DATE_MARKS = 6
+# Colors of the changes in deck share when comparing, from the largest fall to the largest rise, and the bounds between
+# them as fractions of the largest change
+DELTA_LABELS = ['Strong fall', 'Fall', 'Steady', 'Rise', 'Strong rise']
+DELTA_COLORS = ['#C0392B', '#F1948A', '#BBBBBB', '#82E0AA', '#1E8449']
+DELTA_THRESHOLDS = [-0.5, -0.1, 0.1, 0.5]
 
 # Taken from https://stackoverflow.com/questions/470690/how-to-automatically-generate-n-distinct-colors
 KELLY_COLORS_HEX = [
@@ -72,16 +85,8 @@ DEFAULT_OPTIONS = {
     'width': '100%',
     'interaction':{'hover': True},
     # 'edges': {'scaling': {'min': 1, 'max': 5}},
-    'physics':{'solver': 'forceAtlas2Based',
-               'stabilization':{'iterations': 1},
-               'barnesHut':{'damping': 0.4,
-                            'centralGravity': 0.2},
-               'repulsion':{'damping': 0.3,
-                            'springConstant': 0.2},
-               'forceAtlas2Based': {'springLength':1,
-                                    'springConstant': 0.09,
-                                    'damping': 0.6,
-                                    'centralGravity':0.03}}
+    # Node positions are computed on the server (see layout.py), so the browser does not simulate any physics
+    'physics':{'enabled': False}
 }
 
 DEFAULT_FLEX_ROW_STYLE = {'display': 'flex', 
@@ -89,55 +94,42 @@ DEFAULT_FLEX_ROW_STYLE = {'display': 'flex',
                           'justify-content': 'center', 
                           'align-items': 'center'}
 
-def get_categorical_features(df_, blacklist_features=['shape', 'label', 'id', 'deck_count', 'total_copies', 'true_color', 'lighten']):
-    """Identify categorical features for edge or node data and return their names
-        Cardinality should be within 'unique_limit'
-    """
+def column_stats(values):
+    """Return the type, min, max and cardinality of one attribute of the nodes or edges, given its value in each
     
-    cat_features = ['None'] + df_.columns[(df_.dtypes == 'object')].tolist()
-    try:
-        #try to remove irrelevant cols
-        for col in blacklist_features:
-            cat_features.remove(col)
-    except:
-        pass
+    Parameters
+    ------------
+    values: list
+        value of the attribute for every node or edge
         
-    return cat_features
+    The type is 'numerical' if every value is a number, 'categorical' if every value is a string or None, and 'other'
+    otherwise. min and max are only given for numerical attributes and cardinality is None for other attributes.
+    """
+    if all([isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)) for value in values]):
+        array = np.asarray(values, dtype=float)
+        return {'type': 'numerical', 'min': min(values, default=None), 'max': max(values, default=None),
+                'cardinality': len(np.unique(array))}
+    if all([value is None or isinstance(value, str) for value in values]):
+        return {'type': 'categorical', 'min': None, 'max': None, 'cardinality': len(set(values))}
+    return {'type': 'other', 'min': None, 'max': None, 'cardinality': None}
 
-def get_numerical_features(df_, unique_limit=20):
-    """Identify numerical features for edge or node data and return their names"""
-    
-    #supported numerical cols
-    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
-    #identify numerical features
-    numeric_features = ['None'] + df_.select_dtypes(include=numerics).columns.tolist()
-    #try to remove blacklist cols (for nodes)
-    try:
-        numeric_features.remove('size')
-    except:
-        pass
-    
-    return numeric_features
+def get_column_stats(records):
+    """Return the column_stats of every attribute of a list of node or edge dicts, by attribute name"""
+    columns = {}
+    for record in records:
+        for name, value in record.items():
+            columns.setdefault(name, []).append(value)
+    return {name: column_stats(values) for name, values in columns.items()}
 
-def compute_scaling_vars_for_numerical_cols(df):
-    """Identify and scale numerical cols"""
-    # identify numerical cols
-    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
-    numeric_cols = df.select_dtypes(include=numerics).columns.tolist()
-    # var to hold the scaling function
-    scaling_vars = {}
-    # scale numerical cols
-    for col in numeric_cols:
-        minn, maxx = df[col].min(), df[col].max()
-        scaling_vars[col] = {'min': minn, 'max': maxx} 
-    # return
-    return scaling_vars
+def get_categorical_features(stats, blacklist_features=['shape', 'label', 'id', 'deck_count', 'total_copies', 'true_color', 'color', 'lighten']):
+    """Identify categorical features for edge or node data, given their column stats, and return their names"""
+    return ['None'] + [name for name, stat in stats.items() if stat['type'] == 'categorical' and name not in blacklist_features]
 
-def get_node_and_edge_scaling_vars(data):
-    scaling_vars = {'node': None, 'edge': None}
-    scaling_vars['node'] = compute_scaling_vars_for_numerical_cols(pd.DataFrame(data['nodes']))
-    scaling_vars['edge'] = compute_scaling_vars_for_numerical_cols(pd.DataFrame(data['edges']))
-    return scaling_vars
+def get_numerical_features(stats, blacklist_features=['size', 'x', 'y']):
+    """Identify numerical features for edge or node data, given their column stats, and return their names
+        Node sizes and layout positions are left out
+    """
+    return ['None'] + [name for name, stat in stats.items() if stat['type'] == 'numerical' and name not in blacklist_features]
     
 def get_options(directed, opts_args):
     opts = DEFAULT_OPTIONS.copy()
@@ -147,10 +139,14 @@ def get_options(directed, opts_args):
     return opts
 
 def get_distinct_colors(n):
-    """Return (at most 20) distinct colors."""
-    if n > len(KELLY_COLORS_HEX):
-        raise ValueError("Unable to provide more than 20 unique colors.")
-    return KELLY_COLORS_HEX[:n]
+    """Return n distinct colors: the Kelly colors, then as many more as needed, far from each other and from the
+    background and default colors (see palette.extend_palette)."""
+    return list(_distinct_colors(n))
+
+# Palettes are cached by size, as the same attributes are colored over and over
+@lru_cache(maxsize=None)
+def _distinct_colors(n):
+    return tuple(extend_palette(KELLY_COLORS_HEX, n, avoid=[WHITE, DEFAULT_COLOR]))
 
 def create_row(children, style=DEFAULT_FLEX_ROW_STYLE):
     return dbc.Row(children,
@@ -173,6 +169,14 @@ search_form = dbc.FormGroup([
     ),
 ])
 
+jump_to_card_form = dbc.FormGroup([
+    dcc.Dropdown(id='jump_to_card', options=[], placeholder='Jump to card...', searchable=True, clearable=True),
+    dbc.FormText(
+        'Select a card by name, typos allowed',
+        color='secondary',
+    ),
+])
+
 filter_node_form = dbc.FormGroup([
     dbc.Textarea(id="filter_nodes", placeholder="Enter filter node query here..."),
     dbc.FormText(
@@ -221,21 +225,55 @@ def get_select_form_layout(id, options, label, description, default = None):
             ),])
         ,])
 
-def get_app_layout(graph_data, formats, color_legends=[], directed=False, vis_opts = None):
+def get_date_window_layout(periods):
+    """Creates a range slider over the periods of the metagame's history, labelled with the first day of some of them.
+    The slider is disabled when there are fewer than two periods.
+
+    Parameters
+    ------------
+    periods: list
+        first day of every period, as ISO dates
+    """
+    last = max(len(periods) - 1, 0)
+    step = -(-len(periods)//MAX_DATE_MARKS) or 1
+    return html.Div([
+        dcc.RangeSlider(id='date_window',
+                        min=0,
+                        max=last,
+                        step=1,
+                        value=[0, last],
+                        marks={i: periods[i] for i in sorted(set(list(range(0, len(periods), step)) + [last])) if i < len(periods)},
+                        allowCross=False,
+                        disabled=len(periods) < 2),
+    ], style={'padding-bottom': 10})
+
+def get_app_layout(graph_data, formats, color_legends=[], directed=False, vis_opts = None, column_stats = None, detail_metrics = {},
+                   periods = [], similarity_measures = {}, node_metrics = {}):
     """Create and return the layout of the app
         
     Parameters
     -------------
     graph_data: dict{nodes, edges}
         network data in fromat of visdcc
+    column_stats: dict{node, edge}
+        column stats of the node and edge attributes (see get_column_stats), computed from graph_data if not given
+    detail_metrics: dict
+        labels of the metrics cards can be ranked by for level of detail
+    periods: list
+        first day of every period of the metagame's history, for the date window slider
+    similarity_measures: dict
+        labels of the measures similar cards can be found by
+    node_metrics: dict
+        labels of the node metrics that are not in graph_data, as they are only computed for the view nodes are sized by
     """
-    
+    if column_stats is None:
+        column_stats = {'node': get_column_stats(graph_data['nodes']), 'edge': get_column_stats(graph_data['edges'])}
     #Step 1-2: find categorical features of nodes and edges
-    cat_node_features = get_categorical_features(pd.DataFrame(graph_data['nodes']).drop(columns=['true_color', 'color', 'visibility', 'lighten']))
-    cat_edge_features = get_categorical_features(pd.DataFrame(graph_data['edges']).drop(columns=['color']), ['color', 'from', 'to', 'id', 'visibility', 'lighten'])
+    cat_node_features = get_categorical_features(column_stats['node'])
+    cat_edge_features = get_categorical_features(column_stats['edge'], ['color', 'from', 'to', 'id', 'name', 'true_color', 'lighten'])
     #Step 3-4: Get numerical features of nodes and edges
-    num_node_features = get_numerical_features(pd.DataFrame(graph_data['nodes']))
-    num_edge_features = get_numerical_features(pd.DataFrame(graph_data['edges']))
+    num_node_features = get_numerical_features(column_stats['node']) + list(node_metrics.values())
+    num_edge_features = get_numerical_features(column_stats['edge'])
     #Step 5: create and return the layout
     return html.Div([
             create_row(html.Img(src='https://i.imgur.com/7sqCsZt.png', width='200px')),
@@ -258,6 +296,30 @@ def get_app_layout(graph_data, formats, color_legends=[], directed=False, vis_op
                                     default = 'All'
                                 ),
                             ], id='sector-show-toggle', is_open=True),
+                            #---date window section---
+                            create_row([
+                                html.H6('Date Window'), #heading
+                            ], {**DEFAULT_FLEX_ROW_STYLE, 'margin-left': 0, 'margin-right': 0, 'justify-content': 'space-between'}),
+                            dbc.Collapse([
+                                html.Hr(className='my-2'),
+                                get_date_window_layout(periods),
+                            ], id='date-window-show-toggle', is_open=True),
+                            #---compare section---
+                            create_row([
+                                html.H6('Compare'), #heading
+                            ], {**DEFAULT_FLEX_ROW_STYLE, 'margin-left': 0, 'margin-right': 0, 'justify-content': 'space-between'}),
+                            dbc.Collapse([
+                                html.Hr(className='my-2'),
+                                get_select_form_layout(
+                                    id='compare_with',
+                                    options=[{'label': 'Nothing', 'value': 'none'},
+                                             {'label': 'Previous date window', 'value': 'previous', 'disabled': len(periods) < 2}]
+                                            + [{'label': format_name, 'value': format_name} for format_name in formats],
+                                    label='Compare with',
+                                    description='Color and size cards by how much their deck share rose or fell compared with another format, or with the same format over the previous date window.',
+                                    default = 'none'
+                                ),
+                            ], id='compare-show-toggle', is_open=True),
                             #---neighbourhood section---
                             create_row([
                                 html.H6('Neighbourhood'), #heading
@@ -274,11 +336,76 @@ def get_app_layout(graph_data, formats, color_legends=[], directed=False, vis_op
                                     default = 'None'
                                 ),
                             ], id='nbhd-show-toggle', is_open=True),
+                            #---pruning section---
+                            create_row([
+                                html.H6('Edge Pruning'), #heading
+                            ], {**DEFAULT_FLEX_ROW_STYLE, 'margin-left': 0, 'margin-right': 0, 'justify-content': 'space-between'}),
+                            dbc.Collapse([
+                                html.Hr(className='my-2'),
+                                get_select_form_layout(
+                                    id='pruning',
+                                    options=[{'label': label, 'value': key} for key, (label, _, _, _) in PRUNING_PRESETS.items()],
+                                    label='Keep edges',
+                                    description='Select which edges to keep, by statistical significance or as a backbone of the strongest edges of each card.',
+                                    default = 'none'
+                                ),
+                            ], id='pruning-show-toggle', is_open=True),
+                            #---archetype section---
+                            create_row([
+                                html.H6('Archetypes'), #heading
+                            ], {**DEFAULT_FLEX_ROW_STYLE, 'margin-left': 0, 'margin-right': 0, 'justify-content': 'space-between'}),
+                            dbc.Collapse([
+                                html.Hr(className='my-2'),
+                                get_select_form_layout(
+                                    id='archetype_view',
+                                    options=[{'label': 'Cards', 'value': 'cards'},
+                                             {'label': 'Archetypes', 'value': 'archetypes'}],
+                                    label='Show',
+                                    description='Show every card, or collapse the cards of each archetype into a single node. Color nodes by Archetype to see the archetype of each card.',
+                                    default = 'cards'
+                                ),
+                            ], id='archetype-show-toggle', is_open=True),
+                            #---level of detail section---
+                            create_row([
+                                html.H6('Level of Detail'), #heading
+                                html.Div([
+                                    dbc.Button('Show more', id='more-detail-button', outline=True, color='secondary', size='sm'),
+                                ]),
+                            ], {**DEFAULT_FLEX_ROW_STYLE, 'margin-left': 0, 'margin-right': 0, 'justify-content': 'space-between'}),
+                            dbc.Collapse([
+                                html.Hr(className='my-2'),
+                                get_select_form_layout(
+                                    id='node_budget',
+                                    options=[{'label': 'Every card', 'value': 'all'}] + [{'label': budget, 'value': budget} for budget in NODE_BUDGETS],
+                                    label='Cards shown',
+                                    description='Limit the number of cards shown at once. Show more adds as many cards again, and selecting a card adds its neighbours.',
+                                    default = DEFAULT_NODE_BUDGET
+                                ),
+                                get_select_form_layout(
+                                    id='detail_metric',
+                                    options=[{'label': label, 'value': metric} for metric, label in detail_metrics.items()],
+                                    label='Most important by',
+                                    description='Select how to rank cards when only some of them are shown.',
+                                    default = 'deck_count'
+                                ),
+                            ], id='detail-show-toggle', is_open=True),
                             
                             #---search section---
                             html.H6("Search"),
                             html.Hr(className='my-2'),
                             search_form,
+                            jump_to_card_form,
+                            #---similar cards section---
+                            html.H6("Similar Cards", title="Similarity over the whole format, among the cards shown"),
+                            html.Hr(className='my-2'),
+                            get_select_form_layout(
+                                id='similarity_measure',
+                                options=[{'label': label, 'value': measure} for measure, label in similarity_measures.items()],
+                                label='Similar by',
+                                description='Select how to find the cards played like the selected card.',
+                                default = 'cosine'
+                            ),
+                            html.Div(id='similar-cards', style={'font-size': 'small', 'padding-bottom': 10}),
                         ], id='igor-show-toggle', is_open=True),
                         #---color section---
                         create_row([